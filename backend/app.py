@@ -1,11 +1,9 @@
 import os
-import srt
-from flask import Flask, request, jsonify, send_file, send_from_directory, make_response
+from flask import Flask, request, jsonify, send_file, make_response, g, has_request_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import jwt
 import datetime
 from datetime import timedelta
@@ -20,28 +18,248 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import re
+import time
+from sentence_cache import SentenceCache
+from ttl_cache import TTLCache
+from shared_state import create_state_backend
+from db_config import engine_options, normalize_database_url, register_sqlite_pragmas, sqlite_pragmas
+from hearts import regenerate_hearts, next_recovery_time, seconds_until_change
+from audio_segments import extract_segments
+from upload_sessions import UploadError, UploadStore
+from blob_store import BlobStore, blob_extension
+from srt_import import find_course_files, iter_srt_cues, prepare_course_files
+from dictation import normalize_text, normalize_tokens, score_answer
+from review_scheduler import DEFAULT_EASE, answer_quality, balance_due_dates, sm2_update
+from captcha_pool import CaptchaPool
+from password_hashing import HashingBusy, PasswordHasher, hash_limits
+from metrics import RequestMetrics, merge_snapshots, register_sql_metrics, render_prometheus
+from slow_queries import SlowQueryRecorder
+from course_stats import ANALYSIS_VERSION, LENGTH_BUCKETS, CourseAnalyzer, analyze_cues
+from search_index import (DROP_STATEMENTS as SEARCH_INDEX_DROP_STATEMENTS, REBUILD_STATEMENT as SEARCH_INDEX_REBUILD,
+                          build_match_query, ensure_search_index, highlight)
+import hmac
+import html
+import itertools
+import json
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True)
+CORS(app, supports_credentials=True, expose_headers=['X-Next-Cursor', 'X-Search-Truncated'])
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Database Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'app.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_url(
+    os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'app.db')))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'uploads')
-app.config['SECRET_KEY'] = 'your_secret_key'  # Change this to a random secret key
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_secret_key')  # 生产环境请通过环境变量设置随机密钥
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# 确保上传目录存在
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
-
-# 验证码存储（生产环境建议使用Redis）
-captcha_store = {}
-
+# 分块上传（/api/uploads）：大文件分成多个不超过 UPLOAD_CHUNK_MAX_BYTES 的请求上传
+app.config['UPLOAD_SESSION_FOLDER'] = os.environ.get('UPLOAD_SESSION_FOLDER',
+                                                     os.path.join(basedir, 'instance', 'incoming'))
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 512 * 1024 * 1024))
+app.config['UPLOAD_CHUNK_MAX_BYTES'] = 8 * 1024 * 1024
+app.config['UPLOAD_SESSION_TTL'] = 24 * 3600  # 未完成的上传会话保留秒数
+# 新写入的文件在这段时间内不会因为引用计数为0被删除（等待创建课程的事务提交）
+app.config['BLOB_GRACE_SECONDS'] = 10 * 60
+app.config['SENTENCE_CACHE_MAX_BYTES'] = 32 * 1024 * 1024  # 句子缓存内存上限
+app.config['SENTENCE_CACHE_MAX_AGE'] = 0  # 浏览器缓存秒数，0表示每次用ETag重新验证
+app.config['USER_CACHE_TTL'] = 60  # 轻量认证模式下用户信息的缓存秒数
+app.config['HEARTS_CACHE_MAX_TTL'] = 300  # 生命值查询结果最长缓存秒数
+# 多worker共享状态（验证码、缓存版本号、计数器），多进程部署时使用 sqlite:////path/state.db
+app.config['STATE_BACKEND_URL'] = os.environ.get('STATE_BACKEND_URL', 'memory://')
+app.config['CAPTCHA_TTL'] = 5 * 60  # 验证码有效期（秒）
+# 注册时必须提交 /api/captcha 的验证码（captcha_id + captcha_text），设置为0时不校验（如内部测试环境）
+app.config['REGISTER_CAPTCHA_REQUIRED'] = os.environ.get('REGISTER_CAPTCHA_REQUIRED', '1') != '0'
+# 每个worker预先生成的验证码图片数，0表示每次请求时现场生成
+app.config['CAPTCHA_POOL_SIZE'] = int(os.environ.get('CAPTCHA_POOL_SIZE', '200'))
+# 上传文件（音频）的缓存：文件名为SHA-256内容哈希的文件内容不会变化，可长期缓存
+app.config['UPLOADS_MAX_AGE'] = 0  # 普通文件每次用ETag/Last-Modified重新验证
+app.config['UPLOADS_IMMUTABLE_MAX_AGE'] = 365 * 24 * 3600
+# 设置为nginx的internal location（例如 /_protected_uploads/）后由nginx直接发送文件，见 nginx.conf
+app.config['UPLOADS_ACCEL_REDIRECT'] = os.environ.get('UPLOADS_ACCEL_REDIRECT', '')
+# 句子音频切片：thread 表示在后台线程池中处理，off 表示只排队、由 flask process-segments 处理
+app.config['AUDIO_SEGMENT_MODE'] = os.environ.get('AUDIO_SEGMENT_MODE', 'thread')
+app.config['AUDIO_SEGMENT_WORKERS'] = int(os.environ.get('AUDIO_SEGMENT_WORKERS', '2'))
+# /api/metrics 的访问令牌（Authorization: Bearer <令牌>），为空时不校验
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+app.config['METRICS_PUBLISH_INTERVAL'] = 5  # 每个worker把指标快照写入共享状态的最短间隔（秒）
+app.config['METRICS_WORKER_TTL'] = 6 * 3600  # 被强制结束的worker的快照保留秒数
+# 慢查询记录阈值（毫秒），0为关闭；开启时每个新的慢查询指纹会执行一次 EXPLAIN QUERY PLAN
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', '0'))
+app.config['SLOW_QUERY_EXPLAIN'] = os.environ.get('SLOW_QUERY_EXPLAIN', '1') != '0'
+# 密码哈希方法（Werkzeug格式，如 scrypt、scrypt:65536:8:1、pbkdf2:sha256:1000000），修改后用户下次登录时自动重新计算
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+# 每个进程的请求线程数（与 gunicorn.conf.py 的 threads 相同），哈希线程池据此留出至少一个线程给其它接口
+app.config['REQUEST_THREADS'] = int(os.environ.get('GUNICORN_THREADS', '2'))
+# 每个进程同时计算哈希的线程数和排队上限，为空时由 hash_limits 按 REQUEST_THREADS 计算，超出名额时被截断
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ['PASSWORD_HASH_WORKERS']) if os.environ.get('PASSWORD_HASH_WORKERS') else None
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ['PASSWORD_HASH_QUEUE']) if os.environ.get('PASSWORD_HASH_QUEUE') else None
+app.config['HEALTH_CACHE_SECONDS'] = 1  # 就绪检查结果的缓存秒数，高频探测时每秒最多检查一次
+app.config['HEALTH_DB_TIMEOUT_MS'] = int(os.environ.get('HEALTH_DB_TIMEOUT_MS', '1000'))  # 等待数据库写锁的上限
+app.config['HEALTH_MIN_FREE_MB'] = int(os.environ.get('HEALTH_MIN_FREE_MB', '1024'))  # UPLOAD_FOLDER 所在磁盘的最小剩余空间
+
+# 以下依赖配置的组件由 build_components 按 app.config 创建，create_app 覆盖配置后重新调用；
+# 每个组件记录创建时用到的配置，配置未变的组件保持原样（已缓存的数据不丢失）
+_component_settings = {}
+
+def _settings_changed(name, *keys):
+    settings = tuple(app.config[key] for key in keys)
+    if _component_settings.get(name) == settings:
+        return False
+    _component_settings[name] = settings
+    return True
+
+def build_components():
+    global state_backend, blob_store, upload_store, sentence_cache, user_cache, hearts_cache
+    global segment_executor, _segment_pool, _segment_pool_pid, password_hasher, health_cache
+
+    # 共享状态存储（验证码等），多worker部署时所有进程看到同一份数据
+    if _settings_changed('state_backend', 'STATE_BACKEND_URL'):
+        state_backend = create_state_backend(app.config['STATE_BACKEND_URL'])
+
+    # 上传文件的内容寻址存储（UPLOAD_FOLDER/<sha256>.<扩展名>，相同内容只保存一份）
+    if _settings_changed('blob_store', 'UPLOAD_FOLDER'):
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        blob_store = BlobStore(app.config['UPLOAD_FOLDER'])
+
+    # 分块上传会话（数据直接写入磁盘，多个worker共享同一目录）
+    if _settings_changed('upload_store', 'UPLOAD_SESSION_FOLDER', 'UPLOAD_MAX_BYTES', 'UPLOAD_SESSION_TTL'):
+        upload_store = UploadStore(app.config['UPLOAD_SESSION_FOLDER'], app.config['UPLOAD_MAX_BYTES'],
+                                   app.config['UPLOAD_SESSION_TTL'])
+
+    # 课程句子缓存（按课程ID缓存序列化后的JSON）
+    if _settings_changed('sentence_cache', 'SENTENCE_CACHE_MAX_BYTES'):
+        sentence_cache = SentenceCache(app.config['SENTENCE_CACHE_MAX_BYTES'])
+
+    # 认证用户信息缓存（按用户ID缓存，用户被修改/删除/改密码时主动失效）
+    if _settings_changed('user_cache', 'USER_CACHE_TTL'):
+        user_cache = TTLCache(ttl=app.config['USER_CACHE_TTL'])
+
+    # 生命值查询结果缓存（按用户ID，缓存到下次恢复时间为止，心数被修改时主动失效）
+    if _settings_changed('hearts_cache', 'HEARTS_CACHE_MAX_TTL'):
+        hearts_cache = TTLCache(ttl=app.config['HEARTS_CACHE_MAX_TTL'])
+
+    # 句子音频切片的后台线程池：线程只负责认领任务、写库和等待ffmpeg子进程。
+    # 没有ffmpeg时按MP3帧切片是纯Python的逐字节解析，会一直持有GIL，交给 segment_process_pool 的子进程执行
+    if _settings_changed('segment_executor', 'AUDIO_SEGMENT_WORKERS'):
+        if segment_executor is not None:
+            segment_executor.shutdown(wait=False)
+        if _segment_pool is not None and _segment_pool_pid == os.getpid():
+            _segment_pool.shutdown(wait=False)
+        segment_executor = ThreadPoolExecutor(max_workers=app.config['AUDIO_SEGMENT_WORKERS'],
+                                              thread_name_prefix='audio-segments')
+        _segment_pool = _segment_pool_pid = None
+
+    # 密码哈希线程池（见 password_hashing.py），登录/注册/改密码的哈希计算不占用请求线程的CPU
+    if _settings_changed('password_hasher', 'PASSWORD_HASH_METHOD', 'REQUEST_THREADS',
+                         'PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_QUEUE'):
+        password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'],
+                                         *hash_limits(app.config['REQUEST_THREADS'],
+                                                      app.config['PASSWORD_HASH_WORKERS'],
+                                                      app.config['PASSWORD_HASH_QUEUE']))
+
+    # 就绪检查结果缓存
+    if _settings_changed('health_cache', 'HEALTH_CACHE_SECONDS'):
+        health_cache = TTLCache(ttl=app.config['HEALTH_CACHE_SECONDS'], max_entries=1)
+
+segment_executor = _segment_pool = _segment_pool_pid = None
+build_components()
+# 本进程已提交但尚未完成的切片任务数（排队中+处理中），由就绪检查报告
+segment_queue_depth = 0
+segment_queue_lock = threading.Lock()
+health_lock = threading.Lock()
+
+def cache_version(namespace, key):
+    """共享的缓存版本号，其它worker修改数据后版本号递增，本进程的缓存条目随之失效"""
+    return state_backend.get(f'{namespace}:version:{key}') or 0
+
+def invalidate_course_cache(course_id):
+    sentence_cache.invalidate(course_id)
+    state_backend.incr(f'sentences:version:{course_id}')
+
+def invalidate_user_cache(user_id):
+    user_cache.invalidate(user_id)
+    state_backend.incr(f'users:version:{user_id}')
+
+def invalidate_hearts_cache(user_id):
+    hearts_cache.invalidate(user_id)
+    state_backend.incr(f'hearts:version:{user_id}')
+
+
+# 请求指标（按路由的延迟直方图、状态码、SQL语句数和耗时），见 metrics.py
+request_metrics = RequestMetrics()
+register_sql_metrics()
+
+def publish_metrics(force=False):
+    """把本进程的指标快照写入共享状态，供其它worker的 /api/metrics 合并"""
+    if state_backend.url == 'memory://':
+        return
+    now = time.time()
+    if not force and now - request_metrics.last_published < app.config['METRICS_PUBLISH_INTERVAL']:
+        return
+    request_metrics.last_published = now
+    state_backend.set(f'metrics:worker:{os.getpid()}', request_metrics.snapshot(),
+                      ttl=app.config['METRICS_WORKER_TTL'])
+
+def retire_worker_metrics():
+    """worker退出时把本进程的计数并入 metrics:retired，worker重启后计数器不回退"""
+    if state_backend.url == 'memory://':
+        return
+    locked = False
+    for _ in range(50):
+        if state_backend.incr('metrics:lock', ttl=10) == 1:
+            locked = True
+            break
+        time.sleep(0.1)
+    try:
+        snapshot = request_metrics.snapshot()
+        snapshot['in_flight'] = 0
+        state_backend.set('metrics:retired', merge_snapshots([state_backend.get('metrics:retired'), snapshot]))
+        state_backend.delete(f'metrics:worker:{os.getpid()}')
+    finally:
+        if locked:
+            state_backend.delete('metrics:lock')
+
+def current_query_source():
+    """慢查询的来源：请求的方法和路由规则，命令行为 cli:<命令名>，后台线程为 -"""
+    if has_request_context():
+        return f"{request.method} {request.url_rule.rule if request.url_rule is not None else 'unmatched'}"
+    ctx = click.get_current_context(silent=True)
+    return f'cli:{ctx.info_name}' if ctx is not None else '-'
+
+# 慢查询记录（见 slow_queries.py），汇总保存在共享状态中
+slow_query_recorder = SlowQueryRecorder(state_backend, threshold_ms=app.config['SLOW_QUERY_MS'],
+                                        explain=app.config['SLOW_QUERY_EXPLAIN'],
+                                        route=current_query_source, logger=app.logger)
+slow_query_recorder.register()
+
+# 必须在其它 before_request 之前注册，预检请求等提前返回的请求也会被计入
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = request_metrics.start_request()
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    # 按路由规则（如 /api/courses/<int:course_id>）而不是实际路径统计，没有匹配的路由统一记为 unmatched
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_metrics.finish_request(request.method, route, g.pop('metrics_status', 500), started)
+    try:
+        publish_metrics()
+    except Exception as e:
+        app.logger.warning(f'Failed to publish metrics: {e}')
 
 @app.after_request
 def add_headers(response):
+    g.metrics_status = response.status_code
+
     # 为所有响应添加安全头
     response.headers['X-Content-Type-Options'] = 'nosniff'
 
@@ -53,6 +271,7 @@ def add_headers(response):
 
     return response
 
+register_sqlite_pragmas(sqlite_pragmas())
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
@@ -80,10 +299,10 @@ class User(db.Model):
     bonus_hearts = db.Column(db.Integer, default=0)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
     
 
 
@@ -97,6 +316,10 @@ class Course(db.Model):
     description = db.Column(db.Text)
     original_audio_path = db.Column(db.String(200))
     srt_path = db.Column(db.String(200))
+    # 句子音频切片状态：pending / processing / ready / failed，没有音频时为空
+    segments_status = db.Column(db.String(20))
+    segments_error = db.Column(db.Text)
+    segments_started_at = db.Column(db.DateTime)  # 最近一次认领切片任务（进入 processing）的时间
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     creator = db.relationship('User', backref=db.backref('courses', lazy=True))
     sentences = db.relationship('Sentence', backref='course', lazy=True)
@@ -105,16 +328,46 @@ class Course(db.Model):
         return f'<Course {self.title}>'
 
 class Sentence(db.Model):
+    # 按课程和开始时间查找句子（时间窗口、当前播放的句子），同时覆盖按course_id的查询
+    __table_args__ = (db.Index('ix_sentence_course_start', 'course_id', 'start_ms'),)
+
     id = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     text = db.Column(db.Text, nullable=False)
-    start_time = db.Column(db.String(50))
-    end_time = db.Column(db.String(50))
+    start_ms = db.Column(db.Integer, nullable=False)  # 毫秒
+    end_ms = db.Column(db.Integer, nullable=False)
     audio_segment_path = db.Column(db.String(200))
+    # 规范化后的词（空格分隔，见 dictation.py），写入句子时预先计算，检查听写答案时使用
+    normalized_text = db.Column(db.Text)
 
     def __repr__(self):
         return f'<Sentence {self.id} of Course {self.course_id}>'
 
+class CourseStats(db.Model):
+    """课程难度统计，导入字幕时计算（见 course_stats.py），课程列表按这些列排序/过滤"""
+    __tablename__ = 'course_stats'
+    __table_args__ = (db.Index('ix_course_stats_score', 'difficulty_score'),)
+
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    analysis_version = db.Column(db.Integer, nullable=False)
+    sentence_count = db.Column(db.Integer, nullable=False)
+    word_count = db.Column(db.Integer, nullable=False)
+    unique_words = db.Column(db.Integer, nullable=False)
+    duration_seconds = db.Column(db.Float, nullable=False)
+    speech_seconds = db.Column(db.Float, nullable=False)
+    words_per_second = db.Column(db.Float, nullable=False)  # 语速（不含句间停顿）
+    rare_word_ratio = db.Column(db.Float, nullable=False)  # 常用词表以外的词所占比例
+    avg_sentence_words = db.Column(db.Float, nullable=False)
+    sentence_words_p50 = db.Column(db.Integer, nullable=False)
+    sentence_words_p90 = db.Column(db.Integer, nullable=False)
+    sentence_words_max = db.Column(db.Integer, nullable=False)
+    length_histogram = db.Column(db.Text, nullable=False)  # JSON：按句子词数分桶的句子数
+    difficulty_score = db.Column(db.Float, nullable=False)  # 0~100
+    computed_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CourseStats Course:{self.course_id} Score:{self.difficulty_score}>'
+
 class UserProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -139,6 +392,46 @@ class LevelCompletion(db.Model):
     def __repr__(self):
         return f'<LevelCompletion User:{self.user_id} Course:{self.course_id} Level:{self.level_index}>'
 
+class SentenceAttempt(db.Model):
+    """登录用户每次听写检查的结果"""
+    __tablename__ = 'sentence_attempt'
+    __table_args__ = (db.Index('ix_sentence_attempt_user_sentence', 'user_id', 'sentence_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sentence_id = db.Column(db.Integer, db.ForeignKey('sentence.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False, index=True)
+    answer = db.Column(db.Text, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    quality = db.Column(db.Integer, nullable=False)  # SM-2 回忆质量 0~5
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SentenceAttempt User:{self.user_id} Sentence:{self.sentence_id} Score:{self.score}>'
+
+class ReviewItem(db.Model):
+    """需要复习的句子及其 SM-2 状态（见 review_scheduler.py），按 (user_id, due_at) 取出到期的复习项"""
+    __tablename__ = 'review_item'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'sentence_id', name='unique_user_sentence_review'),
+        db.Index('ix_review_item_user_due', 'user_id', 'due_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sentence_id = db.Column(db.Integer, db.ForeignKey('sentence.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False, index=True)
+    ease = db.Column(db.Float, nullable=False, default=DEFAULT_EASE)
+    interval_days = db.Column(db.Float, nullable=False, default=0.0)
+    repetitions = db.Column(db.Integer, nullable=False, default=0)  # 连续答对次数
+    lapses = db.Column(db.Integer, nullable=False, default=0)  # 答错次数
+    due_at = db.Column(db.DateTime, nullable=False)
+    last_reviewed_at = db.Column(db.DateTime)
+    last_score = db.Column(db.Float)
+
+    def __repr__(self):
+        return f'<ReviewItem User:{self.user_id} Sentence:{self.sentence_id} Due:{self.due_at}>'
+
 # 生成验证码图片
 def generate_captcha():
     # 生成随机验证码文本
@@ -187,27 +480,23 @@ def generate_captcha():
     
     return captcha_text, f"data:image/png;base64,{image_base64}"
 
-def clean_expired_captchas():
-    """清理过期的验证码"""
-    current_time = datetime.datetime.utcnow()
-    expired_keys = [key for key, value in captcha_store.items() 
-                   if current_time > value['expires']]
-    for key in expired_keys:
-        del captcha_store[key]
+# 预先生成的验证码图片（后台线程补充），见 captcha_pool.py
+captcha_pool = CaptchaPool(generate_captcha, size=app.config['CAPTCHA_POOL_SIZE'])
+
+def verify_captcha(captcha_id, captcha_text):
+    """校验验证码，无论成功与否验证码都只能使用一次"""
+    if not captcha_id or not captcha_text:
+        return False
+    expected = state_backend.pop(f'captcha:{captcha_id}')
+    return expected is not None and expected == captcha_text.strip().lower()
 
 @app.route('/api/captcha', methods=['GET'])
 def get_captcha():
-    # 清理过期验证码
-    clean_expired_captchas()
-    
-    captcha_text, captcha_image = generate_captcha()
+    captcha_text, captcha_image = captcha_pool.take()
     captcha_id = str(uuid.uuid4())
     
-    # 存储验证码（5分钟过期）
-    captcha_store[captcha_id] = {
-        'text': captcha_text.lower(),
-        'expires': datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
-    }
+    # 存储验证码（过期由共享状态存储负责清理）
+    state_backend.set(f'captcha:{captcha_id}', captcha_text.lower(), ttl=app.config['CAPTCHA_TTL'])
     
     return jsonify({
         'id': captcha_id,
@@ -224,15 +513,93 @@ def handle_preflight():
         response.headers.add('Access-Control-Allow-Methods', "*")
         return response
 
-# 健康检查接口
+# Prometheus 指标（合并所有worker）
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'message': 'Token is missing or invalid!'}), 401
+    snapshots = [request_metrics.snapshot()]
+    if state_backend.url != 'memory://':
+        own_key = f'metrics:worker:{os.getpid()}'
+        snapshots.extend(snapshot for key, snapshot in state_backend.items('metrics:worker:').items()
+                         if key != own_key)
+        snapshots.append(state_backend.get('metrics:retired'))
+    return app.response_class(render_prometheus(merge_snapshots(snapshots)),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def check_database():
+    started = time.perf_counter()
+    with db.engine.connect() as conn:
+        # 由SQLAlchemy生成语句，表名按方言加引号（PostgreSQL中 user 是保留字）
+        conn.execute(db.select(User.id).limit(1))
+        result = {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+        if conn.dialect.name == 'sqlite':
+            # WAL模式下读不受写锁影响，用 BEGIN IMMEDIATE 检查能否在限定时间内拿到写锁
+            raw = conn.connection.dbapi_connection
+            raw.execute(f"PRAGMA busy_timeout = {app.config['HEALTH_DB_TIMEOUT_MS']}")
+            try:
+                started = time.perf_counter()
+                raw.execute('BEGIN IMMEDIATE')
+                raw.execute('ROLLBACK')
+                result['write_lock_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            finally:
+                raw.execute(f"PRAGMA busy_timeout = {sqlite_pragmas().get('busy_timeout', 5000)}")
+    return result
+
+def check_upload_folder():
+    folder = app.config['UPLOAD_FOLDER']
+    with tempfile.NamedTemporaryFile(dir=folder, prefix='.health-') as f:
+        f.write(b'ok')
+        f.flush()
+    free_mb = shutil.disk_usage(folder).free // (1024 * 1024)
+    return {'ok': free_mb >= app.config['HEALTH_MIN_FREE_MB'], 'writable': True, 'free_mb': free_mb,
+            'min_free_mb': app.config['HEALTH_MIN_FREE_MB']}
+
+def check_state_backend():
+    started = time.perf_counter()
+    state_backend.get('health:probe')
+    return {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+
+def readiness_report():
+    """执行各项依赖检查，结果缓存 HEALTH_CACHE_SECONDS 秒；同一时刻只有一个线程执行检查"""
+    with health_lock:
+        report = health_cache.get('ready')
+        if report is not None:
+            return report
+        checks = {}
+        for name, check in (('database', check_database), ('uploads', check_upload_folder),
+                            ('shared_state', check_state_backend)):
+            try:
+                checks[name] = check()
+            except Exception as e:
+                checks[name] = {'ok': False, 'error': str(e)}
+        ready = all(check['ok'] for check in checks.values())
+        report = {
+            'status': 'ready' if ready else 'unavailable',
+            'timestamp': datetime.datetime.now().isoformat(),
+            'version': '1.0.0',
+            'checks': checks,
+            'queues': {
+                'audio_segments': {'mode': app.config['AUDIO_SEGMENT_MODE'], 'depth': segment_queue_depth,
+                                   'workers': app.config['AUDIO_SEGMENT_WORKERS']},
+                'captcha_pool': captcha_pool.stats()['available'],
+            },
+        }
+        health_cache.set('ready', report)
+        return report
+
+# 存活检查：只说明进程能处理请求，不检查依赖（依赖故障时重启进程无济于事）
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    return jsonify({'status': 'alive', 'pid': os.getpid()}), 200
+
+# 就绪检查：数据库往返和写锁、上传目录可写及剩余空间、共享状态，失败时返回503让负载均衡摘除该实例
+@app.route('/api/health/ready', methods=['GET'])
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.datetime.now().isoformat(),
-        'version': '1.0.0',
-        'database': 'connected'
-    }), 200
+    report = readiness_report()
+    return jsonify(report), 200 if report['status'] == 'ready' else 503
 
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -266,13 +633,19 @@ def register():
         app.logger.warning(f'Password for user "{username}" is too short.')
         return jsonify({'error': '密码长度至少为6位'}), 400
     
+    # 校验验证码（先于用户名检查，避免被用来批量探测用户名）
+    if app.config['REGISTER_CAPTCHA_REQUIRED'] and \
+            not verify_captcha(data.get('captcha_id'), data.get('captcha_text')):
+        app.logger.warning(f'Invalid captcha for registration of "{username}".')
+        return jsonify({'error': '验证码错误或已过期'}), 400
+    
     # 检查用户名是否已存在
     if User.query.filter_by(username=username).first():
         app.logger.warning(f'Username "{username}" already exists.')
         return jsonify({'error': '用户名已存在'}), 400
     
     # 创建新用户
-    hashed_password = generate_password_hash(password)
+    hashed_password = password_hasher.hash(password)
     new_user = User(username=username, password_hash=hashed_password)
     
     try:
@@ -301,6 +674,10 @@ def login():
     user = User.query.filter_by(username=username).first()
 
     if user and user.check_password(password):
+        if password_hasher.needs_rehash(user.password_hash):
+            # 哈希参数已修改，用本次登录的明文密码按新参数重新计算
+            user.set_password(password)
+            db.session.commit()
         token = jwt.encode({
             'user_id': user.id,
             'username': user.username,
@@ -312,24 +689,67 @@ def login():
     else:
         return jsonify({'message': 'Invalid username or password'}), 401
 
+def get_token_claims():
+    """从Authorization头解析并校验JWT，失败返回None"""
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    try:
+        data = jwt.decode(auth_header.split(' ')[1], app.config['SECRET_KEY'], algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return None
+    return data if 'user_id' in data else None
+
 def token_required(f):
+    """加载完整的User对象，用于需要修改当前用户数据的接口"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
+        if not request.headers.get('Authorization', '').startswith('Bearer '):
+            return jsonify({'message': 'Token is missing or invalid!'}), 401
 
-        if not token:
+        data = get_token_claims()
+        current_user = db.session.get(User, data['user_id']) if data else None
+        if current_user is None:
+            return jsonify({'message': 'Token is invalid!'}), 401
+
+        return f(current_user, *args, **kwargs)
+
+    return decorated
+
+class AuthUser:
+    """轻量认证模式下的当前用户，只包含身份和权限信息"""
+    __slots__ = ('id', 'username', 'is_admin', 'is_vip')
+
+    def __init__(self, id, username, is_admin, is_vip):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+        self.is_vip = bool(is_vip)
+
+def token_claims_required(f):
+    """信任已验证的JWT身份，不加载User对象，用于只读等轻量接口
+
+    用户的存在性和权限从 user_cache 读取，缓存未命中时才查询一次用户表。
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not request.headers.get('Authorization', '').startswith('Bearer '):
             return jsonify({'message': 'Token is missing or invalid!'}), 401
 
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
-        except:
+        data = get_token_claims()
+        if not data:
             return jsonify({'message': 'Token is invalid!'}), 401
 
+        version = cache_version('users', data['user_id'])
+        current_user = user_cache.get(data['user_id'], version)
+        if current_user is None:
+            row = db.session.query(User.id, User.username, User.is_admin, User.is_vip) \
+                .filter(User.id == data['user_id']).first()
+            if row is None:
+                return jsonify({'message': 'Token is invalid!'}), 401
+            current_user = AuthUser(*row)
+            user_cache.set(current_user.id, current_user, version=version)
+
         return f(current_user, *args, **kwargs)
 
     return decorated
@@ -341,15 +761,25 @@ def create_course(current_user):
     if not current_user.is_vip and not current_user.is_admin:
         return jsonify({'message': '只有VIP用户或管理员才能创建课程'}), 403
     
-    if 'audio_file' not in request.files:
-        return jsonify({'message': 'No audio file part'}), 400
-    audio_file = request.files['audio_file']
-    if audio_file.filename == '':
-        return jsonify({'message': 'No selected audio file'}), 400
+    # 音频/字幕可以直接作为multipart文件上传，也可以先通过 /api/uploads 分块上传后传入upload_id
+    form = request.form if request.form else (request.get_json(silent=True) or {})
+    audio_upload_id = form.get('audio_upload_id')
+    subtitle_upload_id = form.get('subtitle_upload_id')
+
+    audio_file = None
+    if audio_upload_id:
+        audio_upload = get_owned_upload(current_user, audio_upload_id, 'audio')
+    else:
+        if 'audio_file' not in request.files:
+            return jsonify({'message': 'No audio file part'}), 400
+        audio_file = request.files['audio_file']
+        if audio_file.filename == '':
+            return jsonify({'message': 'No selected audio file'}), 400
+    subtitle_upload = get_owned_upload(current_user, subtitle_upload_id, 'subtitle') if subtitle_upload_id else None
 
-    title = request.form.get('title')
-    description = request.form.get('description')
-    difficulty = request.form.get('difficulty', 'normal')  # 默认为普通难度
+    title = form.get('title')
+    description = form.get('description')
+    difficulty = form.get('difficulty', 'normal')  # 默认为普通难度
 
     if not title:
         return jsonify({'message': 'Title is required'}), 400
@@ -358,19 +788,20 @@ def create_course(current_user):
     if difficulty not in ['easy', 'normal', 'hard']:
         return jsonify({'message': 'Invalid difficulty level'}), 400
 
+    # 文件按内容哈希保存，同名文件不会互相覆盖，相同内容只保存一份
     audio_filepath = None
-    if audio_file:
-        audio_filename = audio_file.filename
-        audio_filepath = os.path.join(app.config['UPLOAD_FOLDER'], audio_filename)
-        audio_file.save(audio_filepath)
+    if audio_upload_id:
+        audio_filepath = store_upload(audio_upload)
+    elif audio_file:
+        audio_filepath = store_blob(audio_file.stream, audio_file.filename)
 
     subtitle_filepath = None
-    if 'subtitle_file' in request.files:
+    if subtitle_upload_id:
+        subtitle_filepath = store_upload(subtitle_upload)
+    elif 'subtitle_file' in request.files:
         subtitle_file = request.files['subtitle_file']
         if subtitle_file.filename != '':
-            subtitle_filename = subtitle_file.filename
-            subtitle_filepath = os.path.join(app.config['UPLOAD_FOLDER'], subtitle_filename)
-            subtitle_file.save(subtitle_filepath)
+            subtitle_filepath = store_blob(subtitle_file.stream, subtitle_file.filename)
 
     new_course = Course(
         title=title,
@@ -383,67 +814,270 @@ def create_course(current_user):
     db.session.add(new_course)
     db.session.commit()
     
-    # 解析SRT文件并创建句子记录
+    # 解析SRT文件并创建句子记录，写入的同时计算课程难度统计
     if subtitle_filepath and os.path.exists(subtitle_filepath):
         try:
-            with open(subtitle_filepath, 'r', encoding='utf-8') as f:
-                subtitle_content = f.read()
-            
-            subs = list(srt.parse(subtitle_content))
-            for sub in subs:
-                sentence = Sentence(
-                    course_id=new_course.id,
-                    text=sub.content,
-                    start_time=str(sub.start.total_seconds()),
-                    end_time=str(sub.end.total_seconds())
-                )
-                db.session.add(sentence)
-            
+            analyzer = CourseAnalyzer()
+            import_sentences(new_course.id, analyzer.observe(iter_srt_cues(subtitle_filepath)))
+            save_course_stats(new_course.id, analyzer.result())
             db.session.commit()
         except Exception as e:
+            db.session.rollback()
             print(f"Error parsing SRT file: {e}")
 
-    return jsonify({'message': 'Course created successfully', 'course_id': new_course.id}), 201
+    # 在后台把课程音频切成每句一个的小文件
+    if audio_filepath and Sentence.query.filter_by(course_id=new_course.id).first():
+        queue_segment_job(new_course.id)
+
+    return jsonify({'message': 'Course created successfully', 'course_id': new_course.id,
+                    'segments_status': new_course.segments_status}), 201
+
 
+def mark_blob_in_use(path):
+    """标记刚写入/复用的blob，宽限期内即使还没有课程引用也不会被删除
+
+    标记就是文件的修改时间（复用已有blob时更新为当前时间）：所有worker和 flask gc-uploads 等命令行进程
+    都能看到，不依赖 STATE_BACKEND_URL 是否配置为共享存储。
+    """
+    os.utime(path)
+    return path
+
+def blob_in_grace(path):
+    try:
+        return time.time() - os.path.getmtime(path) < app.config['BLOB_GRACE_SECONDS']
+    except FileNotFoundError:
+        return False
+
+def store_blob(stream, filename):
+    return mark_blob_in_use(blob_store.put_stream(stream, blob_extension(filename)))
+
+def store_upload(upload):
+    """把已finalize的分块上传存入内容寻址存储，返回文件路径"""
+    path = blob_store.put_file(upload_store.data_path(upload['upload_id']),
+                               blob_extension(upload['filename']), upload['sha256'])
+    upload_store.discard(upload['upload_id'])
+    return mark_blob_in_use(path)
+
+def course_file_ref_count(path):
+    return Course.query.filter(db.or_(Course.original_audio_path == path, Course.srt_path == path)).count()
+
+def release_course_files(paths):
+    """删除不再被任何课程引用的上传文件，返回释放的字节数
+
+    需在删除课程记录并提交之后调用。只处理上传目录中的文件（示例课程的 sample.srt 等不删除），
+    宽限期内刚写入的blob留给 flask gc-uploads 处理。
+    """
+    upload_folder = os.path.abspath(app.config['UPLOAD_FOLDER'])
+    freed = 0
+    for path in set(p for p in paths if p):
+        if os.path.dirname(os.path.abspath(path)) != upload_folder:
+            continue
+        if course_file_ref_count(path):
+            continue
+        if blob_store.is_blob(path) and blob_in_grace(path):
+            continue
+        freed += blob_store.delete(path)
+    return freed
+
+@app.errorhandler(UploadError)
+def handle_upload_error(e):
+    return jsonify(dict(e.extra, message=e.message)), e.status
+
+@app.errorhandler(HashingBusy)
+def handle_hashing_busy(e):
+    response = jsonify({'message': 'Server is busy, please retry later'})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+def get_owned_upload(current_user, upload_id, kind=None):
+    """读取上传会话，检查归属；指定kind时要求已finalize且类型一致"""
+    upload = upload_store.get(upload_id)
+    if upload['user_id'] != current_user.id and not current_user.is_admin:
+        raise UploadError('Upload not found', 404)
+    if kind is not None:
+        if upload['kind'] != kind:
+            raise UploadError(f'Upload {upload_id} is not a {kind} file')
+        if upload['status'] != 'complete':
+            raise UploadError(f'Upload {upload_id} is not finalized', 409, offset=upload['offset'])
+    return upload
+
+def upload_payload(upload):
+    return {
+        'upload_id': upload['upload_id'],
+        'kind': upload['kind'],
+        'filename': upload['filename'],
+        'size': upload['size'],
+        'offset': upload['offset'],
+        'status': upload['status'],
+        'sha256': upload['sha256'],
+        'chunk_size': app.config['UPLOAD_CHUNK_MAX_BYTES'],
+    }
+
+@app.route('/api/uploads', methods=['POST'])
+@token_claims_required
+def init_upload(current_user):
+    """创建分块上传会话：{"kind": "audio"|"subtitle", "filename": ..., "size": 字节数}"""
+    if not current_user.is_vip and not current_user.is_admin:
+        return jsonify({'message': '只有VIP用户或管理员才能创建课程'}), 403
+    data = request.get_json(silent=True) or {}
+    upload = upload_store.create(current_user.id, data.get('kind'), data.get('filename'), data.get('size'))
+    return jsonify(upload_payload(upload)), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@token_claims_required
+def get_upload(current_user, upload_id):
+    """查询已接收的字节数，断线后从 offset 继续上传"""
+    return jsonify(upload_payload(get_owned_upload(current_user, upload_id))), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@token_claims_required
+def append_upload_chunk(current_user, upload_id):
+    """追加一个分块：请求体为原始字节，Upload-Offset 头为该分块在文件中的起始位置"""
+    get_owned_upload(current_user, upload_id)
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.args.get('offset', '')))
+    except ValueError:
+        return jsonify({'message': 'Upload-Offset header is required'}), 400
+    if (request.content_length or 0) > app.config['UPLOAD_CHUNK_MAX_BYTES']:
+        return jsonify({'message': f"Chunk is larger than {app.config['UPLOAD_CHUNK_MAX_BYTES']} bytes"}), 413
+
+    # 同一上传同一时间只允许一个分块写入（跨worker）
+    lock_key = f'upload-lock:{upload_id}'
+    if state_backend.incr(lock_key, ttl=300) != 1:
+        return jsonify({'message': 'Another chunk is being uploaded'}), 409
+    try:
+        new_offset = upload_store.append(upload_id, offset, request.stream)
+    finally:
+        state_backend.delete(lock_key)
+    return jsonify({'upload_id': upload_id, 'offset': new_offset}), 200
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@token_claims_required
+def finalize_upload(current_user, upload_id):
+    """所有分块上传完成后调用，可传入 sha256 校验完整性"""
+    get_owned_upload(current_user, upload_id)
+    data = request.get_json(silent=True) or {}
+    upload = upload_store.finalize(upload_id, data.get('sha256'))
+    return jsonify(upload_payload(upload)), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@token_claims_required
+def cancel_upload(current_user, upload_id):
+    get_owned_upload(current_user, upload_id)
+    upload_store.discard(upload_id)
+    return jsonify({'message': 'Upload cancelled'}), 200
+
+
+# 课程列表可选返回的字段
+COURSE_LIST_FIELDS = ('id', 'title', 'description', 'difficulty', 'user_id', 'completed')
+# 来自 course_stats 的字段：可以通过 fields 返回，也可以用于 sort=字段 / sort=-字段 排序
+# 和 min_字段 / max_字段 过滤（排序或过滤时不包含还没有统计的课程）
+COURSE_STATS_FIELDS = ('difficulty_score', 'words_per_second', 'rare_word_ratio', 'avg_sentence_words',
+                       'sentence_count', 'word_count', 'duration_seconds')
+COURSE_LIST_MAX_LIMIT = 200
 
 @app.route('/api/courses/all', methods=['GET'])
 def get_courses():
     # 获取当前用户ID（如果已登录）
-    token = request.headers.get('Authorization')
-    current_user_id = None
-    if token and token.startswith('Bearer '):
-        try:
-            token = token.split(' ')[1]
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user_id = data['user_id']
-        except:
-            pass
-    
-    courses = Course.query.all()
+    data = get_token_claims()
+    current_user_id = data['user_id'] if data else None
+
+    # 可选参数：fields=id,title 只返回指定字段；difficulty 过滤；limit + cursor 分页
+    fields = request.args.get('fields')
+    fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(COURSE_LIST_FIELDS)
+    allowed_fields = COURSE_LIST_FIELDS + COURSE_STATS_FIELDS
+    if any(f not in allowed_fields for f in fields):
+        return jsonify({'message': f'Invalid fields, allowed: {", ".join(allowed_fields)}'}), 400
+
+    sort = request.args.get('sort')
+    sort_field = sort.lstrip('-') if sort else None
+    if sort_field is not None and sort_field not in COURSE_STATS_FIELDS:
+        return jsonify({'message': f'Invalid sort, allowed: {", ".join(COURSE_STATS_FIELDS)}'}), 400
+    descending = bool(sort) and sort.startswith('-')
+
+    stats_filters = []
+    try:
+        for name in COURSE_STATS_FIELDS:
+            if request.args.get(f'min_{name}') is not None:
+                stats_filters.append(getattr(CourseStats, name) >= float(request.args[f'min_{name}']))
+            if request.args.get(f'max_{name}') is not None:
+                stats_filters.append(getattr(CourseStats, name) <= float(request.args[f'max_{name}']))
+    except ValueError:
+        return jsonify({'message': 'Invalid stats filter value'}), 400
+
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    try:
+        limit = int(limit) if limit is not None else None
+        if cursor is not None:
+            # 按统计字段排序时游标为 "排序值:课程ID"
+            if sort_field:
+                cursor_value, _, cursor_id = cursor.rpartition(':')
+                cursor = (float(cursor_value), int(cursor_id))
+            else:
+                cursor = int(cursor)
+    except ValueError:
+        return jsonify({'message': 'Invalid limit or cursor'}), 400
+    if limit is not None and not 1 <= limit <= COURSE_LIST_MAX_LIMIT:
+        return jsonify({'message': f'limit must be between 1 and {COURSE_LIST_MAX_LIMIT}'}), 400
+
+    # 一次查询取出课程、统计及当前用户的进度（LEFT JOIN），避免逐个课程查询
+    columns = [('id', Course.id)]
+    columns += [(f, getattr(Course, f)) for f in fields if f in COURSE_LIST_FIELDS and f not in ('id', 'completed')]
+    columns += [(f, getattr(CourseStats, f)) for f in fields if f in COURSE_STATS_FIELDS]
+    sort_column = getattr(CourseStats, sort_field) if sort_field else None
+    if sort_column is not None:
+        columns.append(('_sort', sort_column))
+    with_progress = 'completed' in fields and current_user_id is not None
+    if with_progress:
+        columns.append(('completed', UserProgress.completed))
+
+    query = db.session.query(*[column for _, column in columns]).select_from(Course)
+    if sort_column is not None or stats_filters:
+        query = query.join(CourseStats, CourseStats.course_id == Course.id).filter(*stats_filters)
+    elif any(f in COURSE_STATS_FIELDS for f in fields):
+        query = query.outerjoin(CourseStats, CourseStats.course_id == Course.id)
+    if with_progress:
+        query = query.outerjoin(
+            UserProgress,
+            db.and_(UserProgress.course_id == Course.id, UserProgress.user_id == current_user_id)
+        )
+
+    difficulty = request.args.get('difficulty')
+    if difficulty:
+        query = query.filter(Course.difficulty == difficulty)
+    if sort_column is None:
+        if cursor is not None:
+            query = query.filter(Course.id > cursor)
+        query = query.order_by(Course.id)
+    else:
+        if cursor is not None:
+            cursor_value, cursor_id = cursor
+            after = sort_column < cursor_value if descending else sort_column > cursor_value
+            query = query.filter(db.or_(after, db.and_(sort_column == cursor_value, Course.id > cursor_id)))
+        query = query.order_by(sort_column.desc() if descending else sort_column, Course.id)
+    if limit is not None:
+        # 多取一条用于判断是否还有下一页
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+    has_more = limit is not None and len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+
     result = []
-    
-    for course in courses:
-        course_data = {
-            'id': course.id, 
-            'title': course.title, 
-            'description': course.description,
-            'difficulty': course.difficulty,
-            'user_id': course.user_id,
-            'completed': False
-        }
-        
-        # 如果用户已登录，检查学习进度
-        if current_user_id:
-            progress = UserProgress.query.filter_by(
-                user_id=current_user_id, 
-                course_id=course.id
-            ).first()
-            if progress:
-                course_data['completed'] = progress.completed
-        
-        result.append(course_data)
-    
-    return jsonify(result)
+    names = [name for name, _ in columns]
+    for row in rows:
+        values = dict(zip(names, row))
+        if 'completed' in fields:
+            values['completed'] = bool(values.get('completed'))
+        result.append({f: values[f] for f in fields})
+
+    response = jsonify(result)
+    if has_more:
+        last = dict(zip(names, rows[-1]))
+        response.headers['X-Next-Cursor'] = f"{last['_sort']}:{last['id']}" if sort_field else str(last['id'])
+    return response
 
 @app.route('/api/courses/<int:course_id>', methods=['GET'])
 def get_course(course_id):
@@ -454,9 +1088,23 @@ def get_course(course_id):
         'description': course.description,
         'difficulty': course.difficulty,
         'audio_filename': os.path.basename(course.original_audio_path) if course.original_audio_path else None,
-        'srt_filename': os.path.basename(course.srt_path) if course.srt_path else None
+        'srt_filename': os.path.basename(course.srt_path) if course.srt_path else None,
+        'segments_status': course.segments_status,
+        'stats': course_stats_payload(db.session.get(CourseStats, course_id))
     })
 
+def course_stats_payload(stats):
+    if stats is None:
+        return None
+    payload = {column: getattr(stats, column) for column in (
+        'difficulty_score', 'words_per_second', 'rare_word_ratio', 'sentence_count', 'word_count', 'unique_words',
+        'duration_seconds', 'speech_seconds', 'avg_sentence_words', 'sentence_words_p50', 'sentence_words_p90',
+        'sentence_words_max')}
+    # 句长分布：length_histogram[i] 为词数不超过 length_buckets[i] 的句子数，最后一项为更长的句子
+    payload['length_buckets'] = list(LENGTH_BUCKETS)
+    payload['length_histogram'] = json.loads(stats.length_histogram)
+    return payload
+
 @app.route('/api/courses/<int:course_id>', methods=['PUT'])
 @token_required
 def update_course(current_user, course_id):
@@ -467,7 +1115,10 @@ def update_course(current_user, course_id):
 
     course.title = request.form.get('title', course.title)
     course.description = request.form.get('description', course.description)
+    db.session.commit()
+    invalidate_course_cache(course_id)
 
+    return jsonify({'message': 'Course updated successfully'}), 200
 
 
 
@@ -484,46 +1135,682 @@ def delete_course(current_user, course_id):
             return jsonify({'message': 'Permission denied'}), 403
 
         # Delete associated sentences first
+        segment_paths = [path for (path,) in db.session.query(Sentence.audio_segment_path)
+                         .filter(Sentence.course_id == course_id, Sentence.audio_segment_path.isnot(None))]
         Sentence.query.filter_by(course_id=course_id).delete()
+        CourseStats.query.filter_by(course_id=course_id).delete()
+        SentenceAttempt.query.filter_by(course_id=course_id).delete()
+        ReviewItem.query.filter_by(course_id=course_id).delete()
+        remove_files(segment_paths)
 
-        # Optional: Delete associated files from the server
-        if course.original_audio_path and os.path.exists(course.original_audio_path):
-            os.remove(course.original_audio_path)
-        if course.srt_path and os.path.exists(course.srt_path):
-            os.remove(course.srt_path)
-
+        file_paths = [course.original_audio_path, course.srt_path]
         db.session.delete(course)
         db.session.commit()
+        invalidate_course_cache(course_id)
+
+        # 其它课程仍引用同一文件时保留
+        release_course_files(file_paths)
 
         return jsonify({'message': 'Course deleted successfully'}), 200
     except Exception as e:
         return jsonify({'message': f'Error deleting course: {str(e)}'}), 500
 
 
+# 批量写入句子时每条INSERT语句的行数
+SENTENCE_INSERT_BATCH = 1000
+
+def import_sentences(course_id, cues):
+    """把 (文本, 开始毫秒, 结束毫秒) 批量写入Sentence表（不提交事务），返回写入条数
+
+    使用Core INSERT + executemany，不创建ORM对象，长字幕也只占用一批数据的内存。
+    """
+    insert = db.insert(Sentence)
+    count = 0
+    batch = []
+    for text, start_ms, end_ms in cues:
+        batch.append({'course_id': course_id, 'text': text, 'start_ms': start_ms, 'end_ms': end_ms,
+                      'normalized_text': normalize_text(text)})
+        if len(batch) >= SENTENCE_INSERT_BATCH:
+            db.session.execute(insert, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert, batch)
+        count += len(batch)
+    return count
+
+def save_course_stats(course_id, stats):
+    """写入或覆盖课程统计（不提交事务），stats 为 None（没有句子）时只删除旧记录"""
+    CourseStats.query.filter_by(course_id=course_id).delete()
+    if stats:
+        db.session.add(CourseStats(course_id=course_id, computed_at=datetime.datetime.utcnow(), **stats))
+
+# 时间窗口查询最多返回的句子数
+SENTENCE_WINDOW_MAX_ROWS = 500
+
+SENTENCE_COLUMNS = (Sentence.id, Sentence.text, Sentence.start_ms, Sentence.end_ms, Sentence.audio_segment_path)
+
+def sentence_payload(position, sentence_id, text, start_ms, end_ms, segment_path):
+    """接口中的句子：id为在课程中的序号（从1开始），sentence_id为句子记录的ID，时间单位为秒
+
+    已切好音频的句子额外带 audio_url，客户端可直接播放单句音频。
+    """
+    sentence = {
+        'id': position,
+        'sentence_id': sentence_id,  # 数据库中的句子ID，用于 /api/sentences/<id>/check 等接口
+        'text': text,
+        'start_time': start_ms / 1000,
+        'end_time': end_ms / 1000
+    }
+    if segment_path:
+        sentence['audio_url'] = f'/api/sentences/{sentence_id}/audio'
+    return sentence
+
+def load_sentences_from_db(course_id):
+    """从Sentence表读取课程句子，返回与字幕解析结果相同的结构"""
+    rows = db.session.query(*SENTENCE_COLUMNS) \
+        .filter(Sentence.course_id == course_id) \
+        .order_by(Sentence.start_ms, Sentence.id) \
+        .all()
+    return [sentence_payload(position, *row) for position, row in enumerate(rows, start=1)]
+
+def load_sentence_window(course_id, from_ms, to_ms):
+    """返回 from_ms 时刻正在播放的句子，以及在 [from_ms, to_ms) 内开始的句子
+
+    两次查询都走 (course_id, start_ms) 索引，不需要读取整门课程。
+    """
+    base = db.session.query(*SENTENCE_COLUMNS).filter(Sentence.course_id == course_id)
+    rows = []
+    active = base.filter(Sentence.start_ms < from_ms) \
+        .order_by(Sentence.start_ms.desc(), Sentence.id.desc()) \
+        .first()
+    if active is not None and active.end_ms > from_ms:
+        rows.append(active)
+    rows.extend(base.filter(Sentence.start_ms >= from_ms, Sentence.start_ms < to_ms)
+                .order_by(Sentence.start_ms, Sentence.id)
+                .limit(SENTENCE_WINDOW_MAX_ROWS)
+                .all())
+    if not rows:
+        return []
+
+    # 第一句之前的句子数即为序号偏移，保证与完整列表中的id一致
+    first = rows[0]
+    offset = base.filter(db.or_(
+        Sentence.start_ms < first.start_ms,
+        db.and_(Sentence.start_ms == first.start_ms, Sentence.id < first.id)
+    )).count()
+    return [sentence_payload(position, *row) for position, row in enumerate(rows, start=offset + 1)]
+
+def load_sentences_from_srt(srt_path):
+    """直接解析SRT文件（仅用于尚未写入Sentence表的旧课程）
+
+    与 load_sentences_from_db 结构相同：按开始时间排序编号，没有句子记录所以 sentence_id 为 None、不带 audio_url。
+    """
+    cues = sorted(iter_srt_cues(srt_path), key=lambda cue: cue[1])
+    return [sentence_payload(position, None, text, start_ms, end_ms, None)
+            for position, (text, start_ms, end_ms) in enumerate(cues, start=1)]
+
 @app.route('/api/courses/<int:course_id>/sentences', methods=['GET'])
 def get_course_sentences(course_id):
+    # ?from=&to=（秒）只返回该时间窗口内的句子，?at= 返回该时刻正在播放的句子
+    if any(name in request.args for name in ('from', 'to', 'at')):
+        return get_course_sentence_window(course_id)
+
+    # 命中缓存时不访问数据库，If-None-Match匹配直接返回304
+    version = cache_version('sentences', course_id)
+    entry = sentence_cache.get(course_id, version)
+    if entry is None:
+        course = Course.query.get_or_404(course_id)
+
+        sentences = load_sentences_from_db(course.id)
+        if not sentences:
+            # 旧课程没有句子记录，回退到解析SRT文件
+            if not course.srt_path or not os.path.exists(course.srt_path):
+                return jsonify({'message': 'SRT file not found'}), 404
+            sentences = load_sentences_from_srt(course.srt_path)
+
+        body = (app.json.dumps(sentences) + '\n').encode('utf-8')
+        entry = sentence_cache.put(course_id, body, course.srt_path, version)
+
+    response = make_response(entry.body)
+    response.mimetype = 'application/json'
+    response.set_etag(entry.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['SENTENCE_CACHE_MAX_AGE']
+    response.cache_control.must_revalidate = True
+    return response.make_conditional(request)
+
+def parse_seconds_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    seconds = float(value)
+    if not seconds >= 0:  # 同时排除 nan
+        raise ValueError(name)
+    return int(round(seconds * 1000))
+
+def get_course_sentence_window(course_id):
+    try:
+        at_ms = parse_seconds_arg('at')
+        from_ms = parse_seconds_arg('from')
+        to_ms = parse_seconds_arg('to')
+    except ValueError:
+        return jsonify({'message': 'from, to and at must be non-negative numbers of seconds'}), 400
+    if at_ms is not None:
+        from_ms, to_ms = at_ms, at_ms + 1
+    from_ms = from_ms or 0
+    to_ms = to_ms if to_ms is not None else 2 ** 62
+    if to_ms <= from_ms:
+        return jsonify({'message': 'to must be greater than from'}), 400
+
     course = Course.query.get_or_404(course_id)
-    if not course.srt_path or not os.path.exists(course.srt_path):
-        return jsonify({'message': 'SRT file not found'}), 404
-
-    with open(course.srt_path, 'r', encoding='utf-8') as f:
-        subtitle_content = f.read()
-
-    subs = list(srt.parse(subtitle_content))
-    sentences = []
-    for sub in subs:
-        sentences.append({
-            'id': sub.index,
-            'text': sub.content,
-            'start_time': sub.start.total_seconds(),
-            'end_time': sub.end.total_seconds()
+    sentences = load_sentence_window(course.id, from_ms, to_ms)
+    if not sentences and not db.session.query(Sentence.id).filter(Sentence.course_id == course.id).first():
+        # 旧课程没有句子记录，回退到解析SRT文件后按时间过滤
+        if not course.srt_path or not os.path.exists(course.srt_path):
+            return jsonify({'message': 'SRT file not found'}), 404
+        sentences = [s for s in load_sentences_from_srt(course.srt_path)
+                     if from_ms <= s['start_time'] * 1000 < to_ms
+                     or s['start_time'] * 1000 < from_ms < s['end_time'] * 1000]
+
+    response = jsonify(sentences)
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['SENTENCE_CACHE_MAX_AGE']
+    response.cache_control.must_revalidate = True
+    return response.make_conditional(request)
+
+# 一次批量检查最多的答案数，以及每个答案的最大长度（词级编辑距离的耗时与两边词数的乘积成正比）
+DICTATION_BATCH_MAX = 200
+DICTATION_ANSWER_MAX_CHARS = 1000
+
+def load_expected_tokens(sentence_ids):
+    """返回 {句子ID: (课程ID, 规范化的词列表)}；旧数据还没有 normalized_text 时现场计算"""
+    rows = db.session.query(Sentence.id, Sentence.course_id, Sentence.normalized_text, Sentence.text) \
+        .filter(Sentence.id.in_(sentence_ids))
+    return {sentence_id: (course_id, normalized.split() if normalized is not None else normalize_tokens(text))
+            for sentence_id, course_id, normalized, text in rows}
+
+def validate_answer(answer):
+    if not isinstance(answer, str):
+        return 'answer must be a string'
+    if len(answer) > DICTATION_ANSWER_MAX_CHARS:
+        return f'answer must be at most {DICTATION_ANSWER_MAX_CHARS} characters'
+    return None
+
+@app.route('/api/sentences/<int:sentence_id>/check', methods=['POST'])
+def check_sentence_answer(sentence_id):
+    """检查一句听写答案，请求体: {"answer": "..."}
+
+    返回得分、是否正确和逐词差异（见 dictation.score_answer）；生命值和关卡进度仍由
+    /api/courses/<id>/answers/batch 等接口根据结果更新。
+    """
+    answer = (request.get_json(silent=True) or {}).get('answer')
+    error = validate_answer(answer)
+    if error:
+        return jsonify({'message': error}), 400
+    expected = load_expected_tokens([sentence_id]).get(sentence_id)
+    if expected is None:
+        return jsonify({'message': 'Sentence not found'}), 404
+    result = dict(score_answer(expected[1], answer), sentence_id=sentence_id)
+    record_checked_answers([(sentence_id, expected[0], answer, result)])
+    return jsonify(result)
+
+@app.route('/api/courses/<int:course_id>/check', methods=['POST'])
+def check_course_answers(course_id):
+    """批量检查一关或整门课程的听写答案，一次查询取出全部句子
+
+    请求体: {"answers": [{"sentence_id": 12, "answer": "..."}, ...]}
+    返回每句的结果（顺序与请求相同）以及平均分和正确句数。
+    """
+    answers = (request.get_json(silent=True) or {}).get('answers')
+    if not isinstance(answers, list) or not answers:
+        return jsonify({'message': 'answers must be a non-empty list'}), 400
+    if len(answers) > DICTATION_BATCH_MAX:
+        return jsonify({'message': f'At most {DICTATION_BATCH_MAX} answers per batch'}), 400
+    for index, item in enumerate(answers):
+        if not isinstance(item, dict) or not isinstance(item.get('sentence_id'), int):
+            return jsonify({'message': f'sentence_id is required for answer at index {index}'}), 400
+        error = validate_answer(item.get('answer'))
+        if error:
+            return jsonify({'message': f'{error} (index {index})'}), 400
+
+    expected = load_expected_tokens({item['sentence_id'] for item in answers})
+    missing = [item['sentence_id'] for item in answers
+               if item['sentence_id'] not in expected or expected[item['sentence_id']][0] != course_id]
+    if missing:
+        return jsonify({'message': 'Sentences not found in this course', 'sentence_ids': missing}), 404
+
+    results = [dict(score_answer(expected[item['sentence_id']][1], item['answer']), sentence_id=item['sentence_id'])
+               for item in answers]
+    record_checked_answers([(item['sentence_id'], course_id, item['answer'], result)
+                            for item, result in zip(answers, results)])
+    return jsonify({
+        'results': results,
+        'average_score': round(sum(result['score'] for result in results) / len(results), 1),
+        'correct_count': sum(1 for result in results if result['correct']),
+        'total': len(results),
+    })
+
+def record_checked_answers(scored):
+    """已登录时记录听写结果并更新复习计划，在每个结果中加上 review_due_at（不在复习中时为 None）
+
+    scored 为 [(句子ID, 课程ID, 答案, 检查结果), ...]；未登录时只返回检查结果，不记录。
+    """
+    claims = get_token_claims()
+    if not claims:
+        return
+    due = record_sentence_attempts(claims['user_id'], scored)
+    db.session.commit()
+    for sentence_id, _, _, result in scored:
+        result['review_due_at'] = due[sentence_id].isoformat() if sentence_id in due else None
+
+def record_sentence_attempts(user_id, scored):
+    """写入作答记录并按 SM-2 更新复习项（不提交事务），返回 {句子ID: 下次复习时间}
+
+    第一次作答就完全正确的句子不进入复习；已在复习中的句子每次作答都重新安排。
+    """
+    now = datetime.datetime.utcnow()
+    db.session.execute(db.insert(SentenceAttempt), [
+        {'user_id': user_id, 'sentence_id': sentence_id, 'course_id': course_id, 'answer': answer,
+         'score': result['score'], 'quality': answer_quality(result), 'created_at': now}
+        for sentence_id, course_id, answer, result in scored
+    ])
+
+    items = {item.sentence_id: item for item in ReviewItem.query.filter(
+        ReviewItem.user_id == user_id, ReviewItem.sentence_id.in_({row[0] for row in scored}))}
+    due = {}
+    for sentence_id, course_id, _, result in scored:
+        quality = answer_quality(result)
+        item = items.get(sentence_id)
+        if item is None:
+            if quality == 5:
+                continue
+            item = ReviewItem(user_id=user_id, sentence_id=sentence_id, course_id=course_id,
+                              ease=DEFAULT_EASE, interval_days=0.0, repetitions=0, lapses=0)
+            db.session.add(item)
+            items[sentence_id] = item
+        if quality < 3:
+            item.lapses += 1
+        item.ease, item.interval_days, item.repetitions, item.due_at = sm2_update(
+            item.ease, item.interval_days, item.repetitions, quality, now)
+        item.last_reviewed_at = now
+        item.last_score = result['score']
+        due[sentence_id] = item.due_at
+    return due
+
+REVIEW_NEXT_MAX_LIMIT = 50
+
+@app.route('/api/review/next', methods=['GET'])
+@token_claims_required
+def get_next_reviews(current_user):
+    """返回当前用户最早到期的N个复习句子（?limit=10，可选 ?course_id= 只复习一门课程）
+
+    沿 (user_id, due_at) 索引顺序读取前N条，不需要排序全部复习项。
+    """
+    try:
+        limit = int(request.args.get('limit', 10))
+        course_id = int(request.args['course_id']) if request.args.get('course_id') else None
+    except ValueError:
+        return jsonify({'message': 'Invalid limit or course_id'}), 400
+    if not 1 <= limit <= REVIEW_NEXT_MAX_LIMIT:
+        return jsonify({'message': f'limit must be between 1 and {REVIEW_NEXT_MAX_LIMIT}'}), 400
+
+    now = datetime.datetime.utcnow()
+    due_filter = [ReviewItem.user_id == current_user.id, ReviewItem.due_at <= now]
+    if course_id is not None:
+        due_filter.append(ReviewItem.course_id == course_id)
+    rows = db.session.query(ReviewItem, Sentence.text, Sentence.start_ms, Sentence.end_ms,
+                            Sentence.audio_segment_path) \
+        .join(Sentence, Sentence.id == ReviewItem.sentence_id) \
+        .filter(*due_filter) \
+        .order_by(ReviewItem.due_at) \
+        .limit(limit) \
+        .all()
+
+    items = []
+    for item, text, start_ms, end_ms, segment_path in rows:
+        sentence = sentence_payload(None, item.sentence_id, text, start_ms, end_ms, segment_path)
+        del sentence['id']
+        sentence.update({
+            'course_id': item.course_id,
+            'due_at': item.due_at.isoformat(),
+            'last_score': item.last_score,
+            'repetitions': item.repetitions,
+            'lapses': item.lapses,
         })
+        items.append(sentence)
+
+    due_count = db.session.query(db.func.count(ReviewItem.id)).filter(*due_filter).scalar()
+    next_due_at = None
+    if not items:
+        next_due_at = db.session.query(db.func.min(ReviewItem.due_at)) \
+            .filter(ReviewItem.user_id == current_user.id).scalar()
+    return jsonify({
+        'sentences': items,
+        'due_count': due_count,
+        'next_due_at': next_due_at.isoformat() if next_due_at else None,
+    })
+
+# 搜索结果每页最多条数
+SEARCH_MAX_LIMIT = 100
+# 不限课程的搜索只在最新的这么多条命中中按相关度排序和分页：bm25 要逐条计算得分，极常见的词也能保持毫秒级。
+# 命中数少于该值时结果是完整、精确的；超过时更早的命中不会出现，响应带 X-Search-Truncated: 1
+SEARCH_RANK_WINDOW = 2000
+
+def uses_fts_search():
+    return db.engine.dialect.name == 'sqlite'
+
+@app.route('/api/search', methods=['GET'])
+def search_sentences():
+    """全文搜索课程句子，按相关度排序
+
+    参数：q（必填，用双引号括起来按短语搜索）、limit、cursor（上一页返回的 X-Next-Cursor）、
+    course_id（只搜索一门课程）、group=course（按课程汇总命中次数）
+    不限课程时只在最新的 SEARCH_RANK_WINDOW 条命中中排序，所有分页使用同一个范围，因此顺序不变；
+    命中数超过该范围时响应带 X-Search-Truncated: 1
+    """
+    match_query = build_match_query(request.args.get('q'))
+    if match_query is None:
+        return jsonify({'message': 'q is required'}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+        offset = int(request.args.get('cursor', 0))
+        course_id = int(request.args['course_id']) if request.args.get('course_id') else None
+    except ValueError:
+        return jsonify({'message': 'Invalid limit, cursor or course_id'}), 400
+    if not 1 <= limit <= SEARCH_MAX_LIMIT or offset < 0:
+        return jsonify({'message': f'limit must be between 1 and {SEARCH_MAX_LIMIT}'}), 400
+    group_by_course = request.args.get('group') == 'course'
+
+    params = {'q': match_query, 'limit': limit + 1, 'offset': offset, 'course_id': course_id}
+    truncated = False
+    if uses_fts_search():
+        course_filter = 'AND s.course_id = :course_id' if course_id is not None else ''
+        if group_by_course:
+            sql = f"""
+                SELECT s.course_id, c.title, count(*) AS matches
+                FROM sentence_fts JOIN sentence s ON s.id = sentence_fts.rowid JOIN course c ON c.id = s.course_id
+                WHERE sentence_fts MATCH :q {course_filter}
+                GROUP BY s.course_id ORDER BY matches DESC, s.course_id
+                LIMIT :limit OFFSET :offset"""
+        elif course_id is None:
+            # 第 SEARCH_RANK_WINDOW 条最新命中的rowid作为下界，FTS5把rowid范围下推到倒排表扫描；
+            # 窗口对所有分页固定不变，再多取一条判断是否还有更早的命中被截掉
+            boundary = db.session.execute(db.text(
+                'SELECT rowid FROM sentence_fts WHERE sentence_fts MATCH :q ORDER BY rowid DESC LIMIT 2 OFFSET :window'
+            ), {'q': match_query, 'window': SEARCH_RANK_WINDOW - 1}).scalars().all()
+            params['min_rowid'] = boundary[0] if boundary else 0
+            truncated = len(boundary) > 1
+            # 先在索引内排序分页，只对当前页的结果回表
+            sql = """
+                SELECT s.id, s.course_id, c.title, s.start_ms, s.end_ms, s.audio_segment_path, hits.snippet
+                FROM (SELECT rowid, rank, snippet(sentence_fts, 0, char(2), char(3), '…', 16) AS snippet
+                      FROM sentence_fts WHERE sentence_fts MATCH :q AND rowid >= :min_rowid
+                      ORDER BY rank LIMIT :limit OFFSET :offset) AS hits
+                JOIN sentence s ON s.id = hits.rowid JOIN course c ON c.id = s.course_id
+                ORDER BY hits.rank"""
+        else:
+            sql = f"""
+                SELECT s.id, s.course_id, c.title, s.start_ms, s.end_ms, s.audio_segment_path,
+                       snippet(sentence_fts, 0, char(2), char(3), '…', 16) AS snippet
+                FROM sentence_fts JOIN sentence s ON s.id = sentence_fts.rowid JOIN course c ON c.id = s.course_id
+                WHERE sentence_fts MATCH :q {course_filter}
+                ORDER BY sentence_fts.rank LIMIT :limit OFFSET :offset"""
+    else:
+        # 其它数据库没有FTS5，退化为逐词 LIKE 匹配
+        terms = re.findall(r'\w+', request.args.get('q'))
+        params.update({f'term{i}': f'%{term}%' for i, term in enumerate(terms)})
+        conditions = ' AND '.join(f's.text ILIKE :term{i}' for i in range(len(terms)))
+        if course_id is not None:
+            conditions += ' AND s.course_id = :course_id'
+        if group_by_course:
+            sql = f"""
+                SELECT s.course_id, c.title, count(*) AS matches
+                FROM sentence s JOIN course c ON c.id = s.course_id WHERE {conditions}
+                GROUP BY s.course_id, c.title ORDER BY matches DESC, s.course_id LIMIT :limit OFFSET :offset"""
+        else:
+            sql = f"""
+                SELECT s.id, s.course_id, c.title, s.start_ms, s.end_ms, s.audio_segment_path, s.text
+                FROM sentence s JOIN course c ON c.id = s.course_id WHERE {conditions}
+                ORDER BY s.course_id, s.start_ms LIMIT :limit OFFSET :offset"""
+
+    rows = db.session.execute(db.text(sql), params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if group_by_course:
+        result = [{'course_id': row[0], 'course_title': row[1], 'matches': row[2]} for row in rows]
+    else:
+        result = [{
+            'sentence_id': sentence_id,
+            'course_id': row_course_id,
+            'course_title': title,
+            'start_time': start_ms / 1000,
+            'end_time': end_ms / 1000,
+            'snippet': highlight(snippet) if uses_fts_search() else html.escape(snippet),
+            'audio_url': f'/api/sentences/{sentence_id}/audio' if segment_path else None
+        } for sentence_id, row_course_id, title, start_ms, end_ms, segment_path, snippet in rows]
+
+    response = jsonify(result)
+    if has_more:
+        response.headers['X-Next-Cursor'] = str(offset + limit)
+    if truncated:
+        response.headers['X-Search-Truncated'] = '1'
+    return response
 
-    return jsonify(sentences)
+@app.route('/api/search/duplicates', methods=['GET'])
+@token_claims_required
+def find_duplicate_courses(current_user):
+    """找出包含相同句子的课程对，用于发现重复上传的素材（仅管理员）"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Permission denied'}), 403
+    try:
+        min_shared = int(request.args.get('min_shared', 5))
+    except ValueError:
+        return jsonify({'message': 'Invalid min_shared'}), 400
+
+    rows = db.session.execute(db.text("""
+        SELECT a.course_id, b.course_id, count(DISTINCT a.text) AS shared
+        FROM sentence a JOIN sentence b ON b.text = a.text AND b.course_id > a.course_id
+        GROUP BY a.course_id, b.course_id HAVING count(DISTINCT a.text) >= :min_shared
+        ORDER BY shared DESC LIMIT 100"""), {'min_shared': min_shared}).fetchall()
+    totals = dict(db.session.query(Sentence.course_id, db.func.count(Sentence.id))
+                  .filter(Sentence.course_id.in_({r[0] for r in rows} | {r[1] for r in rows}))
+                  .group_by(Sentence.course_id).all()) if rows else {}
+    return jsonify([{
+        'course_ids': [first, second],
+        'shared_sentences': shared,
+        'sentence_counts': [totals.get(first, 0), totals.get(second, 0)]
+    } for first, second, shared in rows]), 200
+
+@app.route('/api/cache/stats', methods=['GET'])
+@token_claims_required
+def get_cache_stats(current_user):
+    """查看句子缓存和验证码池的命中/未命中等计数（仅管理员）"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Permission denied'}), 403
+    return jsonify({'sentences': sentence_cache.stats(), 'captcha_pool': captcha_pool.stats(),
+                    'password_hasher': password_hasher.stats()}), 200
+
+SLOW_QUERY_SORTS = ('total', 'max', 'count')
+
+@app.route('/api/slow-queries', methods=['GET'])
+@token_claims_required
+def get_slow_queries(current_user):
+    """慢查询汇总（仅管理员），sort=total|max|count"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Permission denied'}), 403
+    sort = request.args.get('sort', 'total')
+    if sort not in SLOW_QUERY_SORTS:
+        return jsonify({'message': 'Invalid sort'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 200)
+    except ValueError:
+        return jsonify({'message': 'Invalid limit'}), 400
+    return jsonify({
+        'enabled': slow_query_recorder.enabled,
+        'threshold_ms': slow_query_recorder.threshold_ms,
+        'queries': slow_query_recorder.report(limit, sort)
+    }), 200
+
+@app.route('/api/slow-queries', methods=['DELETE'])
+@token_claims_required
+def reset_slow_queries(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Permission denied'}), 403
+    return jsonify({'deleted': slow_query_recorder.reset()}), 200
+
+def remove_files(paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+def queue_segment_job(course_id):
+    """把课程标记为待切片，并在后台线程池中处理（AUDIO_SEGMENT_MODE=off 时只标记）"""
+    Course.query.filter_by(id=course_id).update({'segments_status': 'pending', 'segments_error': None})
+    db.session.commit()
+    if app.config['AUDIO_SEGMENT_MODE'] == 'thread':
+        global segment_queue_depth
+        with segment_queue_lock:
+            segment_queue_depth += 1
+        segment_executor.submit(run_segment_job, course_id)
+
+def segment_process_pool():
+    """按MP3帧切片用的进程池，第一次使用时在当前进程中创建（gunicorn master 中不创建，fork 出的worker各自创建）"""
+    global _segment_pool, _segment_pool_pid
+    with segment_queue_lock:
+        if _segment_pool_pid != os.getpid():
+            _segment_pool = ProcessPoolExecutor(max_workers=app.config['AUDIO_SEGMENT_WORKERS'])
+            _segment_pool_pid = os.getpid()
+        return _segment_pool
+
+def run_segment_job(course_id):
+    global segment_queue_depth
+    with app.app_context():
+        try:
+            process_segment_job(course_id)
+        except Exception:
+            app.logger.exception('Audio segment job for course %s failed', course_id)
+        finally:
+            with segment_queue_lock:
+                segment_queue_depth -= 1
+
+def process_segment_job(course_id):
+    """切出课程每句的音频并写入 Sentence.audio_segment_path，返回切好的句子数
+
+    用条件UPDATE把状态从 pending 改为 processing 来认领任务，
+    多个worker或命令行同时处理时同一课程只会被处理一次。
+    """
+    claimed = Course.query.filter_by(id=course_id, segments_status='pending') \
+        .update({'segments_status': 'processing', 'segments_started_at': datetime.datetime.utcnow()})
+    db.session.commit()
+    if not claimed:
+        return 0
 
-@app.route('/uploads/<filename>')
+    try:
+        course = db.session.get(Course, course_id)
+        if not course.original_audio_path or not os.path.exists(course.original_audio_path):
+            raise FileNotFoundError('Audio file not found')
+
+        cues = [(sentence_id, start_ms / 1000, end_ms / 1000) for sentence_id, start_ms, end_ms in
+                db.session.query(Sentence.id, Sentence.start_ms, Sentence.end_ms)
+                .filter(Sentence.course_id == course_id).order_by(Sentence.start_ms, Sentence.id)]
+        output_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'segments', str(course_id))
+        if shutil.which('ffmpeg'):
+            paths = extract_segments(course.original_audio_path, cues, output_dir)
+        else:
+            paths = segment_process_pool().submit(
+                extract_segments, course.original_audio_path, cues, output_dir, False).result()
+
+        if paths:
+            db.session.execute(db.update(Sentence), [
+                {'id': sentence_id, 'audio_segment_path': path} for sentence_id, path in paths.items()
+            ])
+        course.segments_status = 'ready'
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        Course.query.filter_by(id=course_id).update({'segments_status': 'failed', 'segments_error': str(e)})
+        db.session.commit()
+        raise
+    finally:
+        invalidate_course_cache(course_id)
+    return len(paths)
+
+@app.route('/api/courses/<int:course_id>/segments', methods=['POST'])
+@token_claims_required
+def requeue_course_segments(current_user, course_id):
+    """重新切分课程的句子音频（课程创建者或管理员）"""
+    course = Course.query.get_or_404(course_id)
+    if not current_user.is_admin and course.user_id != current_user.id:
+        return jsonify({'message': 'Permission denied'}), 403
+    if not course.original_audio_path:
+        return jsonify({'message': 'Course has no audio file'}), 400
+    if course.segments_status == 'processing':
+        return jsonify({'message': 'Segments are being processed', 'segments_status': 'processing'}), 409
+
+    queue_segment_job(course_id)
+    return jsonify({'message': 'Segment job queued', 'segments_status': 'pending'}), 202
+
+@app.route('/api/sentences/<int:sentence_id>/audio', methods=['GET'])
+def get_sentence_audio(sentence_id):
+    """单句音频切片，支持Range请求和ETag缓存"""
+    segment_path = db.session.query(Sentence.audio_segment_path).filter(Sentence.id == sentence_id).scalar()
+    if not segment_path or not os.path.exists(segment_path):
+        return jsonify({'message': 'Audio segment not found'}), 404
+    return send_media_file(segment_path, 'audio/mpeg')
+
+# 内容寻址文件名：64位SHA-256十六进制 + 可选扩展名
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}(\.[A-Za-z0-9]+)?$')
+MEDIA_FILE_BLOCK_SIZE = 64 * 1024
+
+def send_media_file(path, mimetype=None):
+    """发送上传目录中的媒体文件
+
+    - 支持Range/206、If-Range、ETag/Last-Modified和304（由werkzeug处理）
+    - 配置了 UPLOADS_ACCEL_REDIRECT 时只返回 X-Accel-Redirect 头，由nginx发送文件
+    - 在gunicorn下Range响应也交给 file_wrapper，gunicorn会用 sendfile 零拷贝发送
+    - 文件名是内容哈希的文件设置 immutable 长期缓存
+    """
+    if CONTENT_ADDRESSED_NAME.match(os.path.basename(path)):
+        cache_control = f"public, max-age={app.config['UPLOADS_IMMUTABLE_MAX_AGE']}, immutable"
+    else:
+        cache_control = f"public, max-age={app.config['UPLOADS_MAX_AGE']}, must-revalidate"
+
+    accel_prefix = app.config['UPLOADS_ACCEL_REDIRECT']
+    if accel_prefix:
+        relative_path = os.path.relpath(path, app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + relative_path
+        if mimetype:
+            response.headers['Content-Type'] = mimetype
+        else:
+            # 交给nginx按扩展名判断
+            del response.headers['Content-Type']
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    response = send_file(path, mimetype=mimetype, conditional=True)
+    response.headers['Cache-Control'] = cache_control
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if response.status_code == 206 and file_wrapper is not None and request.method != 'HEAD' \
+            and request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+        # werkzeug按块读取Range内容；改为从起始位置开始的file_wrapper。file_wrapper会一直读到文件末尾，
+        # 只有gunicorn会按Content-Length截断（sendfile只发送这一段），其它服务器保留werkzeug的范围迭代器
+        response.response.close()
+        f = open(path, 'rb')
+        f.seek(response.content_range.start)
+        response.response = file_wrapper(f, MEDIA_FILE_BLOCK_SIZE)
+    return response
+
+@app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    # 以点开头的目录（如 .partial）是写入中的临时文件
+    if path is None or any(part.startswith('.') for part in filename.split('/')) or not os.path.isfile(path):
+        return jsonify({'message': 'File not found'}), 404
+    return send_media_file(path)
 
 @app.route('/')
 def hello_world():
@@ -543,6 +1830,9 @@ def seed_data():
         # 获取当前文件所在目录的绝对路径
         current_dir = os.path.dirname(os.path.abspath(__file__))
         sample_srt_path = os.path.join(current_dir, 'sample.srt')
+        if os.path.exists(sample_srt_path):
+            # 示例字幕复制到内容寻址存储，两门示例课程共用一份
+            sample_srt_path = blob_store.put_file(sample_srt_path, '.srt', copy=True)
         
         course1 = Course(title='基础英语听力', description='适合初学者的日常对话练习', creator=user, difficulty='easy', srt_path=sample_srt_path)
         course2 = Course(title='商务英语', description='涵盖常见商务场景的听力材料', creator=user, difficulty='normal', srt_path=sample_srt_path)
@@ -554,21 +1844,12 @@ def seed_data():
         for course in [course1, course2]:
             if course.srt_path and os.path.exists(course.srt_path):
                 try:
-                    with open(course.srt_path, 'r', encoding='utf-8') as f:
-                        subtitle_content = f.read()
-                    
-                    subs = list(srt.parse(subtitle_content))
-                    for sub in subs:
-                        sentence = Sentence(
-                            course_id=course.id,
-                            text=sub.content,
-                            start_time=str(sub.start.total_seconds()),
-                            end_time=str(sub.end.total_seconds())
-                        )
-                        db.session.add(sentence)
-                    
+                    analyzer = CourseAnalyzer()
+                    import_sentences(course.id, analyzer.observe(iter_srt_cues(course.srt_path)))
+                    save_course_stats(course.id, analyzer.result())
                     db.session.commit()
                 except Exception as e:
+                    db.session.rollback()
                     print(f"Error parsing SRT file for course {course.id}: {e}")
 
 import click
@@ -578,16 +1859,276 @@ from flask.cli import with_appcontext
 @with_appcontext
 def init_db_command():
     """Clear the existing data and create new tables."""
+    drop_search_index()
     db.drop_all()
     db.create_all()
+    create_search_index()
     seed_data()
     click.echo('Initialized and seeded the database.')
 
 app.cli.add_command(init_db_command)
 
+@click.command('process-segments')
+@click.option('--retry', is_flag=True,
+              help='同时重试失败的课程，以及处于 processing 状态超过 --stale-minutes 的课程（处理进程已退出）')
+@click.option('--stale-minutes', type=int, default=60, show_default=True,
+              help='processing 状态持续多久视为处理进程已退出')
+@with_appcontext
+def process_segments_command(retry, stale_minutes):
+    """处理待切片的课程（AUDIO_SEGMENT_MODE=off 时由定时任务调用）"""
+    if retry:
+        # 正在被其它worker处理的课程不能重置，否则同一课程会被处理两次、同时写同一个切片文件
+        stale_before = datetime.datetime.utcnow() - datetime.timedelta(minutes=stale_minutes)
+        reset = Course.query.filter(db.or_(
+            Course.segments_status == 'failed',
+            db.and_(Course.segments_status == 'processing',
+                    db.or_(Course.segments_started_at.is_(None), Course.segments_started_at < stale_before))
+        )).update({'segments_status': 'pending'}, synchronize_session=False)
+        db.session.commit()
+        click.echo(f'Reset {reset} failed or stale courses')
+    course_ids = [course_id for (course_id,) in
+                  db.session.query(Course.id).filter(Course.segments_status == 'pending')]
+    for course_id in course_ids:
+        try:
+            count = process_segment_job(course_id)
+            click.echo(f'Course {course_id}: {count} segments')
+        except Exception as e:
+            click.echo(f'Course {course_id}: failed ({e})')
+
+app.cli.add_command(process_segments_command)
+
+@click.command('migrate-uploads')
+@with_appcontext
+def migrate_uploads_command():
+    """把旧课程按原文件名保存的音频/字幕迁移到内容寻址存储，相同内容合并为一份"""
+    old_paths = []
+    for course in Course.query.all():
+        for column in ('original_audio_path', 'srt_path'):
+            path = getattr(course, column)
+            if not path or blob_store.is_blob(path) or not os.path.exists(path):
+                continue
+            blob_path = mark_blob_in_use(blob_store.put_file(path, blob_extension(path), copy=True))
+            setattr(course, column, blob_path)
+            old_paths.append(path)
+            click.echo(f'Course {course.id}: {os.path.basename(path)} -> {os.path.basename(blob_path)}')
+        db.session.commit()
+        invalidate_course_cache(course.id)
+    freed = release_course_files(old_paths)
+    click.echo(f'Migrated {len(old_paths)} files, freed {freed / 1024 / 1024:.1f}MB')
+
+app.cli.add_command(migrate_uploads_command)
+
+@click.command('gc-uploads')
+@with_appcontext
+def gc_uploads_command():
+    """删除没有任何课程引用的blob（跳过宽限期内刚写入的文件）"""
+    freed = release_course_files(blob_store.list_blobs())
+    click.echo(f'Freed {freed / 1024 / 1024:.1f}MB')
+
+app.cli.add_command(gc_uploads_command)
+
+@click.command('import-courses')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--username', default=None, help='课程创建者，默认为第一个管理员')
+@click.option('--difficulty', default='normal', type=click.Choice(['easy', 'normal', 'hard']))
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='解析字幕和计算哈希的进程数')
+@with_appcontext
+def import_courses_command(directory, username, difficulty, workers):
+    """批量导入目录中的 MP3+SRT 课程（如 uploads/englishpod_*），输出吞吐量
+
+    解析字幕和计算哈希在进程池中并行执行，写库在主进程中按课程逐个提交。
+    已导入过的音频（内容相同）会跳过。
+    """
+    if username:
+        user = User.query.filter_by(username=username).first()
+    else:
+        user = User.query.filter_by(is_admin=True).order_by(User.id).first()
+    if user is None:
+        raise click.ClickException('User not found')
+
+    pairs = find_course_files(directory)
+    if not pairs:
+        click.echo('No MP3+SRT pairs found')
+        return
+
+    started = time.perf_counter()
+    imported = skipped = cue_total = byte_total = 0
+    insert_seconds = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(prepare_course_files, *pair) for pair in pairs]
+        for future in futures:
+            prepared = future.result()
+            audio_path = blob_store.path_for(prepared['audio_sha256'], blob_extension(prepared['audio_path']))
+            if Course.query.filter_by(original_audio_path=audio_path).first():
+                skipped += 1
+                click.echo(f"{prepared['name']}: already imported")
+                continue
+
+            insert_started = time.perf_counter()
+            course = Course(
+                title=prepared['name'],
+                difficulty=difficulty,
+                creator=user,
+                original_audio_path=mark_blob_in_use(blob_store.put_file(
+                    prepared['audio_path'], blob_extension(prepared['audio_path']),
+                    prepared['audio_sha256'], copy=True)),
+                srt_path=mark_blob_in_use(blob_store.put_file(
+                    prepared['srt_path'], '.srt', prepared['srt_sha256'], copy=True)),
+                segments_status='pending' if prepared['cues'] else None
+            )
+            db.session.add(course)
+            db.session.flush()
+            count = import_sentences(course.id, prepared['cues'])
+            save_course_stats(course.id, prepared['stats'])
+            db.session.commit()
+            insert_seconds += time.perf_counter() - insert_started
+
+            imported += 1
+            cue_total += count
+            byte_total += prepared['bytes']
+            click.echo(f"{prepared['name']}: course {course.id}, {count} sentences")
+
+    elapsed = time.perf_counter() - started
+    click.echo(f'Imported {imported} courses ({skipped} skipped), {cue_total} sentences, '
+               f'{byte_total / 1024 / 1024:.1f}MB in {elapsed:.2f}s')
+    if elapsed > 0:
+        click.echo(f'  {imported / elapsed:.1f} courses/s, {cue_total / elapsed:.0f} sentences/s, '
+                   f'{byte_total / 1024 / 1024 / elapsed:.1f}MB/s (database writes {insert_seconds:.2f}s)')
+    if imported:
+        click.echo('Run "flask process-segments" to cut per-sentence audio for the imported courses')
+
+app.cli.add_command(import_courses_command)
+
+@click.command('backfill-course-stats')
+@click.option('--all', 'recompute_all', is_flag=True, help='重新计算全部课程（默认只计算缺少统计或统计版本过旧的课程）')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='计算统计的进程数')
+@click.option('--batch-size', default=200, show_default=True, help='每批读取和提交的课程数')
+@with_appcontext
+def backfill_course_stats_command(recompute_all, workers, batch_size):
+    """为已有课程计算难度统计
+
+    主进程按批读取句子，统计在进程池中并行计算；读取下一批句子时上一批仍在计算。
+    """
+    query = db.session.query(Course.id).outerjoin(CourseStats, CourseStats.course_id == Course.id)
+    if not recompute_all:
+        query = query.filter(db.or_(CourseStats.course_id.is_(None), CourseStats.analysis_version < ANALYSIS_VERSION))
+    course_ids = [course_id for (course_id,) in query.order_by(Course.id)]
+    if not course_ids:
+        click.echo('All courses are up to date')
+        return
+
+    def load_batch(batch):
+        cues = {course_id: [] for course_id in batch}
+        rows = db.session.query(Sentence.course_id, Sentence.text, Sentence.start_ms, Sentence.end_ms) \
+            .filter(Sentence.course_id.in_(batch)).order_by(Sentence.course_id, Sentence.start_ms, Sentence.id)
+        for course_id, text, start_ms, end_ms in rows:
+            cues[course_id].append((text, start_ms, end_ms))
+        return [cues[course_id] for course_id in batch]
+
+    started = time.perf_counter()
+    analyzed = empty = sentence_total = 0
+    batches = [course_ids[i:i + batch_size] for i in range(0, len(course_ids), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, batch_size // (workers * 4))
+        pending = None
+        for batch in batches + [None]:
+            submitted = None
+            if batch is not None:
+                cue_lists = load_batch(batch)
+                sentence_total += sum(len(cues) for cues in cue_lists)
+                submitted = (batch, pool.map(analyze_cues, cue_lists, chunksize=chunksize))
+            if pending is not None:
+                pending_batch, results = pending
+                for course_id, stats in zip(pending_batch, results):
+                    save_course_stats(course_id, stats)
+                    if stats:
+                        analyzed += 1
+                    else:
+                        empty += 1
+                db.session.commit()
+                click.echo(f'{analyzed + empty}/{len(course_ids)} courses')
+            pending = submitted
+
+    elapsed = time.perf_counter() - started
+    click.echo(f'Analyzed {analyzed} courses ({empty} without sentences), {sentence_total} sentences in {elapsed:.2f}s')
+    if elapsed > 0:
+        click.echo(f'  {(analyzed + empty) / elapsed:.1f} courses/s, {sentence_total / elapsed:.0f} sentences/s')
+
+app.cli.add_command(backfill_course_stats_command)
+
+@click.command('schedule-reviews')
+@click.option('--daily-limit', default=200, show_default=True, help='每个用户每天最多的复习句子数')
+@click.option('--days', default=7, show_default=True, help='均衡未来多少天的复习量')
+@with_appcontext
+def schedule_reviews_command(daily_limit, days):
+    """每晚运行一次：把超出每日上限的复习项顺延到之后的日子（定时任务调用）
+
+    按 (user_id, due_at) 索引顺序读取全部用户未来几天内到期的复习项，逐个用户计算，
+    最后按主键批量更新被顺延的项。
+    """
+    started = time.perf_counter()
+    now = datetime.datetime.utcnow()
+    rows = db.session.query(ReviewItem.user_id, ReviewItem.id, ReviewItem.due_at, ReviewItem.interval_days) \
+        .filter(ReviewItem.due_at < now + timedelta(days=days)) \
+        .order_by(ReviewItem.user_id, ReviewItem.due_at) \
+        .yield_per(10000)
+
+    moves = []
+    user_count = item_count = 0
+    for _, user_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        items = [(item_id, due_at, interval) for _, item_id, due_at, interval in user_rows]
+        user_count += 1
+        item_count += len(items)
+        moves.extend(balance_due_dates(items, now, daily_limit, days))
+
+    for i in range(0, len(moves), SENTENCE_INSERT_BATCH):
+        db.session.execute(db.update(ReviewItem), [{'id': item_id, 'due_at': due_at}
+                                                   for item_id, due_at in moves[i:i + SENTENCE_INSERT_BATCH]])
+    db.session.commit()
+    click.echo(f'Scanned {item_count} review items of {user_count} users, postponed {len(moves)} '
+               f'in {time.perf_counter() - started:.2f}s')
+
+app.cli.add_command(schedule_reviews_command)
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """从sentence表重建全文索引"""
+    if not uses_fts_search():
+        raise click.ClickException('Full-text index is only available on SQLite')
+    create_search_index()
+    db.session.execute(db.text(SEARCH_INDEX_REBUILD))
+    db.session.commit()
+    click.echo(f'Indexed {Sentence.query.count()} sentences')
+
+app.cli.add_command(rebuild_search_index_command)
+
+@click.command('slow-queries')
+@click.option('--limit', default=20, show_default=True)
+@click.option('--sort', default='total', type=click.Choice(SLOW_QUERY_SORTS), show_default=True)
+@click.option('--reset', is_flag=True, help='输出后清空汇总')
+@with_appcontext
+def slow_queries_command(limit, sort, reset):
+    """输出慢查询汇总（需开启 SLOW_QUERY_MS，并与服务使用同一个 STATE_BACKEND_URL）"""
+    entries = slow_query_recorder.report(limit, sort)
+    if not entries:
+        click.echo('没有慢查询记录')
+    for rank, entry in enumerate(entries, 1):
+        click.echo(f"#{rank} {entry['route']}  次数 {entry['count']}  总计 {entry['total_ms']:.1f}ms  "
+                   f"平均 {entry['avg_ms']:.1f}ms  最长 {entry['max_ms']:.1f}ms")
+        click.echo(f"    {entry['sql']}")
+        for line in entry['plan'] or []:
+            click.echo(f'    | {line}')
+        for scan in entry['table_scans']:
+            click.echo(f'    ! 全表扫描: {scan}')
+    if reset:
+        click.echo(f'已清空 {slow_query_recorder.reset()} 条记录')
+
+app.cli.add_command(slow_queries_command)
+
 # User Management APIs
 @app.route('/api/users', methods=['GET'])
-@token_required
+@token_claims_required
 def get_all_users(current_user):
     """获取所有用户列表（仅管理员可访问）"""
     users = User.query.all()
@@ -603,7 +2144,7 @@ def get_all_users(current_user):
     return jsonify(users_data), 200
 
 @app.route('/api/users/<int:user_id>', methods=['GET'])
-@token_required
+@token_claims_required
 def get_user(current_user, user_id):
     """获取单个用户详情"""
     user = User.query.get_or_404(user_id)
@@ -640,6 +2181,7 @@ def update_user(current_user, user_id):
         user.is_vip = data['is_vip']
     
     db.session.commit()
+    invalidate_user_cache(user_id)
     return jsonify({'message': 'User updated successfully'}), 200
 
 @app.route('/api/users/<int:user_id>', methods=['DELETE'])
@@ -659,33 +2201,43 @@ def delete_user(current_user, user_id):
     user = User.query.get_or_404(user_id)
     
     # 删除用户创建的所有课程及相关数据
+    file_paths = []
     for course in user.courses:
-        # 删除课程相关的句子
+        # 删除句子音频文件（需在删除句子记录之前取出路径）
+        segment_paths = [path for (path,) in db.session.query(Sentence.audio_segment_path)
+                         .filter(Sentence.course_id == course.id, Sentence.audio_segment_path.isnot(None))]
+        remove_files(segment_paths)
+
+        # 删除课程相关的句子和统计
         Sentence.query.filter_by(course_id=course.id).delete()
+        CourseStats.query.filter_by(course_id=course.id).delete()
+        SentenceAttempt.query.filter_by(course_id=course.id).delete()
+        ReviewItem.query.filter_by(course_id=course.id).delete()
         
-        # 删除音频文件
-        if course.original_audio_path and os.path.exists(course.original_audio_path):
-            os.remove(course.original_audio_path)
-        if course.srt_path and os.path.exists(course.srt_path):
-            os.remove(course.srt_path)
-        
-        # 删除句子音频文件
-        sentences = Sentence.query.filter_by(course_id=course.id).all()
-        for sentence in sentences:
-            if sentence.audio_segment_path and os.path.exists(sentence.audio_segment_path):
-                os.remove(sentence.audio_segment_path)
+        # 音频和字幕文件在提交后按引用计数删除
+        file_paths.extend([course.original_audio_path, course.srt_path])
     
+    # 删除用户的作答记录和复习计划
+    SentenceAttempt.query.filter_by(user_id=user_id).delete()
+    ReviewItem.query.filter_by(user_id=user_id).delete()
+
     # 删除用户的所有课程
+    course_ids = [course.id for course in user.courses]
     Course.query.filter_by(user_id=user_id).delete()
     
     # 删除用户
     db.session.delete(user)
     db.session.commit()
+    release_course_files(file_paths)
+    invalidate_user_cache(user_id)
+    invalidate_hearts_cache(user_id)
+    for course_id in course_ids:
+        invalidate_course_cache(course_id)
     
     return jsonify({'message': 'User deleted successfully'}), 200
 
 @app.route('/api/users/stats', methods=['GET'])
-@token_required
+@token_claims_required
 def get_user_stats(current_user):
     """获取用户统计信息"""
     total_users = User.query.count()
@@ -703,51 +2255,61 @@ def get_user_stats(current_user):
     return jsonify(stats), 200
 
 @app.route('/api/courses/<int:course_id>/levels/completed', methods=['GET'])
-@token_required
+@token_claims_required
 def get_completed_levels(current_user, course_id):
     completions = LevelCompletion.query.filter_by(user_id=current_user.id, course_id=course_id).all()
     completed_levels = [comp.level_index for comp in completions]
     return jsonify(completed_levels)
 
-@app.route('/api/courses/<int:course_id>/levels/<int:level_index>/complete', methods=['POST'])
-@token_required
-def mark_level_complete(current_user, course_id, level_index):
+def record_level_completion(user_id, course_id, level_index):
+    """记录关卡完成（不提交事务），返回 (响应内容, 状态码)"""
     # 检查是否已完成
     existing_completion = LevelCompletion.query.filter_by(
-        user_id=current_user.id,
+        user_id=user_id,
         course_id=course_id,
         level_index=level_index
     ).first()
 
     if existing_completion:
-        return jsonify({'message': 'Level already completed'}), 200
+        return {'message': 'Level already completed'}, 200
 
     new_completion = LevelCompletion(
-        user_id=current_user.id,
+        user_id=user_id,
         course_id=course_id,
         level_index=level_index
     )
     db.session.add(new_completion)
-    db.session.commit()
+    return {'message': 'Level marked as complete'}, 201
 
-    return jsonify({'message': 'Level marked as complete'}), 201
+@app.route('/api/courses/<int:course_id>/levels/<int:level_index>/complete', methods=['POST'])
+@token_claims_required
+def mark_level_complete(current_user, course_id, level_index):
+    result, status = record_level_completion(current_user.id, course_id, level_index)
+    db.session.commit()
+    return jsonify(result), status
 
 @app.route('/api/courses/<int:course_id>/complete', methods=['POST'])
-@token_required
+@token_claims_required
 def mark_course_complete(current_user, course_id):
     """标记课程为已完成"""
     # 检查课程是否存在
     course = Course.query.get_or_404(course_id)
     
-    # 查找或创建用户进度记录
+    result = record_course_completion(current_user.id, course_id)
+    db.session.commit()
+    
+    return jsonify(result), 200
+
+def record_course_completion(user_id, course_id):
+    """查找或创建用户进度记录并标记为已完成（不提交事务）"""
     progress = UserProgress.query.filter_by(
-        user_id=current_user.id,
+        user_id=user_id,
         course_id=course_id
     ).first()
     
     if not progress:
         progress = UserProgress(
-            user_id=current_user.id,
+            user_id=user_id,
             course_id=course_id,
             completed=True,
             completed_at=datetime.datetime.now()
@@ -757,16 +2319,14 @@ def mark_course_complete(current_user, course_id):
         progress.completed = True
         progress.completed_at = datetime.datetime.now()
     
-    db.session.commit()
-    
-    return jsonify({
+    return {
         'message': 'Course marked as completed',
         'completed': True,
         'completed_at': progress.completed_at.isoformat()
-    }), 200
+    }
 
 @app.route('/api/users/progress', methods=['GET'])
-@token_required
+@token_claims_required
 def get_user_progress(current_user):
     """获取用户的学习进度"""
     progress_records = UserProgress.query.filter_by(user_id=current_user.id).all()
@@ -806,207 +2366,425 @@ def change_password(current_user):
     # 更新密码
     current_user.set_password(new_password)
     db.session.commit()
+    invalidate_user_cache(current_user.id)
     
     return jsonify({'message': 'Password changed successfully'}), 200
 
-@app.route('/api/user/hearts', methods=['GET'])
-@token_required
-def get_user_hearts(current_user):
+def load_hearts_state(user_id):
+    """读取用户当前的生命值状态（恢复的心数按时间计算，不写数据库）
+
+    返回 (payload, 结果保持不变的秒数)，用户不存在时返回 (None, 0)。
+    """
+    row = db.session.execute(db.select(
+        User.hearts, User.max_hearts, User.bonus_hearts, User.last_heart_update, User.last_daily_reset,
+        User.is_newbie, User.newbie_protection_count, User.consecutive_correct
+    ).where(User.id == user_id)).first()
+    if row is None:
+        return None, 0
+
     now = datetime.datetime.utcnow()
-    today = datetime.date.today()
-    
-    # 检查是否需要每日重置
-    if current_user.last_daily_reset < today:
-        current_user.hearts = current_user.max_hearts
-        current_user.last_daily_reset = today
-        current_user.last_heart_update = now
-        db.session.commit()
-    else:
-        # 计算离线期间应该恢复的心数（每小时恢复1颗心）
-        time_diff_seconds = (now - current_user.last_heart_update).total_seconds()
-        hearts_to_recover = int(time_diff_seconds // (60 * 60))
+    hearts, last_heart_update, _ = regenerate_hearts(
+        row.hearts, row.max_hearts, row.last_heart_update, row.last_daily_reset,
+        now, datetime.date.today()
+    )
 
-        if hearts_to_recover > 0 and current_user.hearts < current_user.max_hearts:
-            current_user.hearts = min(current_user.max_hearts, current_user.hearts + hearts_to_recover)
-            current_user.last_heart_update = now
-            db.session.commit()
-    
     # 计算下次恢复时间
-    next_recovery_time = None
-    if current_user.hearts < current_user.max_hearts:
-        next_recovery_time = (current_user.last_heart_update + datetime.timedelta(hours=1)).isoformat()
+    recovery_time = next_recovery_time(hearts, row.max_hearts, last_heart_update)
+
+    payload = {
+        'current_hearts': hearts,
+        'max_hearts': row.max_hearts,
+        'bonus_hearts': row.bonus_hearts,
+        'total_hearts': hearts + row.bonus_hearts,
+        'last_heart_update': last_heart_update.isoformat(),
+        'next_recovery_time': recovery_time.isoformat() if recovery_time else None,
+        'is_newbie': row.is_newbie,
+        'newbie_protection_count': row.newbie_protection_count,
+        'consecutive_correct': row.consecutive_correct
+    }
+    return payload, seconds_until_change(hearts, row.max_hearts, last_heart_update, now, datetime.datetime.now())
 
-    return jsonify({
-        'current_hearts': current_user.hearts,
-        'max_hearts': current_user.max_hearts,
-        'bonus_hearts': current_user.bonus_hearts,
-        'total_hearts': current_user.hearts + current_user.bonus_hearts,
-        'last_heart_update': current_user.last_heart_update.isoformat(),
-        'next_recovery_time': next_recovery_time,
-        'is_newbie': current_user.is_newbie,
-        'newbie_protection_count': current_user.newbie_protection_count,
-        'consecutive_correct': current_user.consecutive_correct
-    })
+@app.route('/api/user/hearts', methods=['GET'])
+@token_claims_required
+def get_user_hearts(current_user):
+    # 只读接口：不写数据库，结果缓存到下次恢复时间
+    version = cache_version('hearts', current_user.id)
+    payload = hearts_cache.get(current_user.id, version)
+    if payload is None:
+        payload, seconds = load_hearts_state(current_user.id)
+        if payload is None:
+            return jsonify({'message': 'Token is invalid!'}), 401
+        hearts_cache.set(current_user.id, payload, ttl=min(app.config['HEARTS_CACHE_MAX_TTL'], seconds),
+                         version=version)
+
+    response = jsonify(payload)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
+
+def column_matches(column, value):
+    return column.is_(None) if value is None else column == value
+
+# 条件UPDATE被其它请求抢先修改时的最大重试次数
+USER_UPDATE_MAX_RETRIES = 5
+
+def materialize_heart_regeneration(user_id):
+    """把按时间计算出的恢复结果写回数据库，在真正修改心数之前调用
+
+    使用比较后写入（条件中带上读到的旧值），被其它请求抢先修改时重新计算（最多 USER_UPDATE_MAX_RETRIES 次）。
+    """
+    for _ in range(USER_UPDATE_MAX_RETRIES):
+        row = db.session.execute(db.select(
+            User.hearts, User.max_hearts, User.last_heart_update, User.last_daily_reset
+        ).where(User.id == user_id)).first()
+        if row is None:
+            return
+
+        state = regenerate_hearts(row.hearts, row.max_hearts, row.last_heart_update, row.last_daily_reset,
+                                  datetime.datetime.utcnow(), datetime.date.today())
+        if state == (row.hearts, row.last_heart_update, row.last_daily_reset):
+            return
+
+        result = db.session.execute(
+            db.update(User)
+            .where(User.id == user_id,
+                   column_matches(User.hearts, row.hearts),
+                   column_matches(User.last_heart_update, row.last_heart_update),
+                   column_matches(User.last_daily_reset, row.last_daily_reset))
+            .values(hearts=state[0], last_heart_update=state[1], last_daily_reset=state[2])
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            return
 
-@app.route('/api/user/hearts/lose', methods=['POST'])
-@token_required
-def lose_user_heart(current_user):
-    data = request.get_json() or {}
-    difficulty = data.get('difficulty', 'normal')  # easy, normal, hard
-    is_practice_mode = data.get('is_practice_mode', False)
-    action_type = data.get('action_type', 'wrong_answer')  # wrong_answer, view_original
-    
+# 心数相关字段，原子更新后通过RETURNING（或同一事务内的查询）取回
+HEARTS_COLUMNS = (User.hearts, User.bonus_hearts, User.max_hearts, User.consecutive_correct,
+                  User.is_newbie, User.newbie_protection_count)
+
+def update_user_returning(user_id, values, *conditions):
+    """单条条件UPDATE：条件满足时原子地修改用户行并返回修改后的心数字段，否则返回None
+
+    所有计算都在SQL中基于行的当前值完成，并发请求不会互相覆盖（没有先读后写）。
+    """
+    stmt = db.update(User).where(User.id == user_id, *conditions).values(**values) \
+        .execution_options(synchronize_session=False)
+    if db.engine.dialect.update_returning:
+        return db.session.execute(stmt.returning(*HEARTS_COLUMNS)).first()
+
+    # 不支持RETURNING的旧版SQLite：UPDATE已持有写锁，同一事务内再读取即可
+    if db.session.execute(stmt).rowcount == 0:
+        return None
+    return db.session.execute(db.select(*HEARTS_COLUMNS).where(User.id == user_id)).first()
+
+def user_exists(user_id):
+    return db.session.execute(db.select(User.id).where(User.id == user_id)).first() is not None
+
+def user_not_found():
+    # 用户在认证之后被删除（或其它worker的用户缓存尚未失效）
+    return {'success': False, 'message': 'User not found'}, 404
+
+def apply_heart_loss(user_id, action_type='wrong_answer', is_practice_mode=False):
+    """扣心规则（不提交事务），返回 (响应内容, 状态码)
+
+    调用前需先执行 materialize_heart_regeneration。
+    """
     # 查看原文不重置连续答对次数
-    if action_type != 'view_original':
-        current_user.consecutive_correct = 0
+    streak_values = {} if action_type == 'view_original' else {'consecutive_correct': 0}
     
     # 新手保护期逻辑
-    if current_user.is_newbie and current_user.newbie_protection_count > 0:
-        current_user.newbie_protection_count -= 1
-        if current_user.newbie_protection_count <= 0:
-            current_user.is_newbie = False
-        db.session.commit()
-        return jsonify({
+    state = update_user_returning(
+        user_id,
+        dict(streak_values,
+             newbie_protection_count=User.newbie_protection_count - 1,
+             is_newbie=db.case((User.newbie_protection_count - 1 <= 0, db.false()), else_=User.is_newbie)),
+        User.is_newbie == db.true(),
+        User.newbie_protection_count > 0
+    )
+    if state:
+        return {
             'success': True, 
             'hearts_lost': 0,
-            'remaining_hearts': current_user.hearts + current_user.bonus_hearts,
+            'remaining_hearts': state.hearts + state.bonus_hearts,
             'message': '新手保护期，本次错误不扣心',
-            'newbie_protection_remaining': current_user.newbie_protection_count
-        })
+            'newbie_protection_remaining': state.newbie_protection_count
+        }, 200
     
     # 练习模式不扣心
     if is_practice_mode:
-        db.session.commit()
-        return jsonify({
+        if streak_values:
+            state = update_user_returning(user_id, streak_values)
+        else:
+            state = db.session.execute(db.select(*HEARTS_COLUMNS).where(User.id == user_id)).first()
+        if state is None:
+            return user_not_found()
+        return {
             'success': True, 
             'hearts_lost': 0,
-            'remaining_hearts': current_user.hearts + current_user.bonus_hearts,
+            'remaining_hearts': state.hearts + state.bonus_hearts,
             'message': '练习模式，不扣除生命值'
-        })
-    
-    # 根据动作类型和难度决定扣心数量
-    if action_type == 'view_original':
-        hearts_to_lose = 1  # 查看原文固定扣1心
-    else:
-        # 答题错误统一扣1心（不再根据难度区分）
-        hearts_to_lose = 1  # 做错一题扣1心
-    
-    # 处理扣心逻辑，支持小数扣心
-    if hearts_to_lose == 0:
-        db.session.commit()
-        return jsonify({
-            'success': True, 
-            'hearts_lost': 0,
-            'remaining_hearts': current_user.hearts + current_user.bonus_hearts,
-            'message': '无需扣除生命值'
-        })
-    
-    # 扣除生命值（优先扣除额外心数）
-    total_hearts = current_user.hearts + current_user.bonus_hearts
-    if total_hearts > 0:
-        if current_user.bonus_hearts > 0:
-            current_user.bonus_hearts -= hearts_to_lose
-            if current_user.bonus_hearts < 0:
-                current_user.hearts += current_user.bonus_hearts
-                current_user.bonus_hearts = 0
-        else:
-            current_user.hearts -= hearts_to_lose
-        
-        current_user.last_heart_update = datetime.datetime.utcnow()
-        db.session.commit()
-        
-        return jsonify({
+        }, 200
+    
+    # 查看原文和答题错误都固定扣1心（不再根据难度区分）
+    hearts_to_lose = 1
+    
+    # 扣除生命值（优先扣除额外心数），没有剩余生命值时不做任何修改
+    state = update_user_returning(
+        user_id,
+        dict(streak_values,
+             bonus_hearts=db.case((User.bonus_hearts > 0, User.bonus_hearts - hearts_to_lose), else_=User.bonus_hearts),
+             hearts=db.case((User.bonus_hearts > 0, User.hearts), else_=User.hearts - hearts_to_lose),
+             last_heart_update=datetime.datetime.utcnow()),
+        User.hearts + User.bonus_hearts > 0
+    )
+    if state:
+        return {
             'success': True, 
             'hearts_lost': hearts_to_lose,
-            'remaining_hearts': current_user.hearts + current_user.bonus_hearts,
-            'current_hearts': current_user.hearts,
-            'bonus_hearts': current_user.bonus_hearts
-        })
+            'remaining_hearts': state.hearts + state.bonus_hearts,
+            'current_hearts': state.hearts,
+            'bonus_hearts': state.bonus_hearts
+        }, 200
+    if not user_exists(user_id):
+        return user_not_found()
     
-    return jsonify({'success': False, 'message': 'No hearts left'}), 400
+    return {'success': False, 'message': 'No hearts left'}, 400
 
-@app.route('/api/user/hearts/reward', methods=['POST'])
-@token_required
-def reward_user_heart(current_user):
-    data = request.get_json() or {}
-    reward_type = data.get('type', 'correct_answer')  # correct_answer, achievement, perfect_course
-    
+def apply_heart_reward(user_id, reward_type='correct_answer'):
+    """奖励规则（不提交事务），返回 (响应内容, 状态码)
+
+    调用前需先执行 materialize_heart_regeneration。
+    """
     if reward_type == 'correct_answer':
-        # 连续答对奖励
-        current_user.consecutive_correct += 1
-        
-        hearts_rewarded = 0
-        message = ''
-        
-        # 每连续答对10题奖励1颗心
-        if current_user.consecutive_correct % 10 == 0:
-            if current_user.hearts < current_user.max_hearts:
-                current_user.hearts += 1
-                hearts_rewarded = 1
-                message = f'连续答对{current_user.consecutive_correct}题！奖励1颗生命值'
-            else:
-                current_user.bonus_hearts += 1
+        # 连续答对奖励：每连续答对10题奖励1颗心，心数已满时奖励额外心数
+        reaches_reward = (User.consecutive_correct + 1) % 10 == 0
+        for _ in range(USER_UPDATE_MAX_RETRIES):
+            state = update_user_returning(
+                user_id,
+                {'consecutive_correct': User.consecutive_correct + 1, 'hearts': User.hearts + 1},
+                reaches_reward,
+                User.hearts < User.max_hearts
+            )
+            if state:
                 hearts_rewarded = 1
-                message = f'连续答对{current_user.consecutive_correct}题！奖励1颗额外生命值'
-        
-        db.session.commit()
+                message = f'连续答对{state.consecutive_correct}题！奖励1颗生命值'
+                break
+
+            state = update_user_returning(
+                user_id,
+                {'consecutive_correct': User.consecutive_correct + 1,
+                 'bonus_hearts': db.case((reaches_reward, User.bonus_hearts + 1), else_=User.bonus_hearts)},
+                db.or_(db.not_(reaches_reward), User.hearts >= User.max_hearts)
+            )
+            if state:
+                hearts_rewarded = 1 if state.consecutive_correct % 10 == 0 else 0
+                message = f'连续答对{state.consecutive_correct}题！奖励1颗额外生命值' if hearts_rewarded else ''
+                break
+            # 两条语句都没有命中：用户已不存在，或两条语句之间心数被其它请求修改，重新判断
+            if not user_exists(user_id):
+                return user_not_found()
+        else:
+            return {'success': False, 'message': 'Hearts were modified concurrently, please retry'}, 409
         
-        return jsonify({
+        return {
             'success': True,
             'hearts_rewarded': hearts_rewarded,
-            'consecutive_correct': current_user.consecutive_correct,
-            'remaining_hearts': current_user.hearts + current_user.bonus_hearts,
-            'current_hearts': current_user.hearts,
-            'bonus_hearts': current_user.bonus_hearts,
+            'consecutive_correct': state.consecutive_correct,
+            'remaining_hearts': state.hearts + state.bonus_hearts,
+            'current_hearts': state.hearts,
+            'bonus_hearts': state.bonus_hearts,
             'message': message
-        })
+        }, 200
     
     elif reward_type == 'perfect_course':
         # 完美通关课程奖励
         reward_hearts = 2
-        current_user.bonus_hearts += reward_hearts
-        db.session.commit()
+        state = update_user_returning(user_id, {'bonus_hearts': User.bonus_hearts + reward_hearts})
+        if state is None:
+            return user_not_found()
         
-        return jsonify({
+        return {
             'success': True,
             'hearts_rewarded': reward_hearts,
-            'remaining_hearts': current_user.hearts + current_user.bonus_hearts,
-            'current_hearts': current_user.hearts,
-            'bonus_hearts': current_user.bonus_hearts,
+            'remaining_hearts': state.hearts + state.bonus_hearts,
+            'current_hearts': state.hearts,
+            'bonus_hearts': state.bonus_hearts,
             'message': f'完美通关！奖励{reward_hearts}颗额外生命值'
-        })
+        }, 200
     
-    return jsonify({'success': False, 'message': 'Invalid reward type'}), 400
+    return {'success': False, 'message': 'Invalid reward type'}, 400
+
+def apply_consecutive_update(user_id, increment=True):
+    """更新连续答对计数（不提交事务）"""
+    state = update_user_returning(
+        user_id,
+        {'consecutive_correct': User.consecutive_correct + 1 if increment else 0}
+    )
+    if state is None:
+        return user_not_found()
+    return {
+        'success': True,
+        'consecutive_correct': state.consecutive_correct
+    }, 200
+
+@app.route('/api/user/hearts/lose', methods=['POST'])
+@token_claims_required
+def lose_user_heart(current_user):
+    data = request.get_json() or {}
+    difficulty = data.get('difficulty', 'normal')  # easy, normal, hard
+    is_practice_mode = data.get('is_practice_mode', False)
+    action_type = data.get('action_type', 'wrong_answer')  # wrong_answer, view_original
+    
+    materialize_heart_regeneration(current_user.id)
+    result, status = apply_heart_loss(current_user.id, action_type, is_practice_mode)
+    db.session.commit()
+    invalidate_hearts_cache(current_user.id)
+    
+    return jsonify(result), status
+
+@app.route('/api/user/hearts/reward', methods=['POST'])
+@token_claims_required
+def reward_user_heart(current_user):
+    data = request.get_json() or {}
+    reward_type = data.get('type', 'correct_answer')  # correct_answer, achievement, perfect_course
+    
+    materialize_heart_regeneration(current_user.id)
+    result, status = apply_heart_reward(current_user.id, reward_type)
+    db.session.commit()
+    invalidate_hearts_cache(current_user.id)
+    
+    return jsonify(result), status
 
 
 @app.route('/api/hearts/consecutive', methods=['POST'])
-@token_required
+@token_claims_required
 def update_consecutive_correct(current_user):
     """更新连续答对计数"""
     try:
         data = request.get_json()
         increment = data.get('increment', True)
         
-        if increment:
-            current_user.consecutive_correct += 1
-        else:
-            current_user.consecutive_correct = 0
-        
+        result, status = apply_consecutive_update(current_user.id, increment)
         db.session.commit()
+        invalidate_hearts_cache(current_user.id)
         
-        return jsonify({
-            'success': True,
-            'consecutive_correct': current_user.consecutive_correct
-        })
+        return jsonify(result), status
     
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# 批量提交的答题事件类型
+ANSWER_EVENT_TYPES = ('correct_answer', 'wrong_answer', 'view_original', 'perfect_course',
+                      'consecutive', 'level_complete', 'course_complete')
+ANSWER_BATCH_MAX_EVENTS = 500
+
+@app.route('/api/courses/<int:course_id>/answers/batch', methods=['POST'])
+@token_claims_required
+def submit_answer_events(current_user, course_id):
+    """按顺序批量处理一关（或一次练习）中的答题事件，一次请求、一次提交
+
+    请求体: {"events": [{"type": "correct_answer"}, {"type": "wrong_answer", "is_practice_mode": false},
+                        {"type": "level_complete", "level_index": 3}, ...]}
+    每个事件的规则与单独调用 /api/user/hearts/lose、/reward、/api/hearts/consecutive、
+    /levels/<i>/complete、/complete 相同。
+    """
+    data = request.get_json(silent=True) or {}
+    events = data.get('events')
+    if not isinstance(events, list) or not events:
+        return jsonify({'message': 'events must be a non-empty list'}), 400
+    if len(events) > ANSWER_BATCH_MAX_EVENTS:
+        return jsonify({'message': f'At most {ANSWER_BATCH_MAX_EVENTS} events per batch'}), 400
+
+    # 先校验全部事件，任何一个无效则整批不处理
+    for index, event in enumerate(events):
+        if not isinstance(event, dict) or event.get('type') not in ANSWER_EVENT_TYPES:
+            return jsonify({'message': f'Invalid event at index {index}'}), 400
+        if event['type'] == 'level_complete' and not isinstance(event.get('level_index'), int):
+            return jsonify({'message': f'level_index is required for event at index {index}'}), 400
+
+    if db.session.get(Course, course_id) is None:
+        return jsonify({'message': 'Course not found'}), 404
+
+    try:
+        materialize_heart_regeneration(current_user.id)
+        results = []
+        for event in events:
+            event_type = event['type']
+            if event_type == 'correct_answer':
+                result, status = apply_heart_reward(current_user.id, 'correct_answer')
+            elif event_type in ('wrong_answer', 'view_original'):
+                result, status = apply_heart_loss(current_user.id, event_type, event.get('is_practice_mode', False))
+            elif event_type == 'perfect_course':
+                result, status = apply_heart_reward(current_user.id, 'perfect_course')
+            elif event_type == 'consecutive':
+                result, status = apply_consecutive_update(current_user.id, event.get('increment', True))
+            elif event_type == 'level_complete':
+                result, status = record_level_completion(current_user.id, course_id, event['level_index'])
+            else:
+                result, status = record_course_completion(current_user.id, course_id), 200
+            if status in (404, 409):
+                # 用户已不存在或重试次数用尽，整批不提交
+                db.session.rollback()
+                return jsonify(result), status
+            results.append(dict(result, type=event_type, status=status))
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    invalidate_hearts_cache(current_user.id)
+    hearts, _ = load_hearts_state(current_user.id)
+    return jsonify({'success': True, 'results': results, 'hearts': hearts}), 200
+
+def create_search_index():
+    """创建句子全文索引（仅SQLite），已存在时不做任何事"""
+    if uses_fts_search():
+        ensure_search_index(lambda sql: db.session.execute(db.text(sql)))
+        db.session.commit()
+
+def drop_search_index():
+    if uses_fts_search():
+        for statement in SEARCH_INDEX_DROP_STATEMENTS:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+
+def init_database():
+    """创建缺失的数据表，空库时写入默认数据（需要在app_context中调用）"""
+    db.create_all()
+    create_search_index()
+    # 检查是否需要创建默认用户
+    if not User.query.first():
+        seed_data()
+
+# Flask-SQLAlchemy 在导入 app 时已按这些配置创建了引擎，create_app 无法再修改
+ENGINE_CONFIG_KEYS = ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ENGINE_OPTIONS', 'SQLALCHEMY_BINDS')
+
+def create_app(config=None):
+    """生产环境入口（见 wsgi.py / gunicorn.conf.py）
+
+    本模块只有一个 app：create_app 把 config 合并进它的配置，并按新配置重新创建受影响的组件
+    （见 build_components），多次调用返回的是同一个对象。数据库地址和连接参数在导入时就已生效，
+    只能通过环境变量 DATABASE_URL 配置，config 中与当前值不同时抛出 ValueError。
+    密钥和共享状态也可以通过环境变量 SECRET_KEY、STATE_BACKEND_URL 配置。
+    """
+    config = config or {}
+    fixed = [key for key in ENGINE_CONFIG_KEYS if key in config and config[key] != app.config.get(key)]
+    if fixed:
+        raise ValueError(f"{', '.join(fixed)} cannot be changed after app is imported; set DATABASE_URL instead")
+    app.config.update(config)
+    build_components()
+    slow_query_recorder.store = state_backend
+    slow_query_recorder.threshold_ms = app.config['SLOW_QUERY_MS']
+    slow_query_recorder.explain = app.config['SLOW_QUERY_EXPLAIN']
+    captcha_pool.size = app.config['CAPTCHA_POOL_SIZE']
+    captcha_pool.low_water = captcha_pool.size // 2
+    if app.config['SECRET_KEY'] == 'your_secret_key':
+        app.logger.warning('SECRET_KEY is not set, using the insecure development key')
+    return app
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-        # 检查是否需要创建默认用户
-        if not User.query.first():
-            seed_data()
+        init_database()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+句子音频切片 - 按字幕时间把课程MP3切成每句一个的小文件
+
+安装了 ffmpeg 时用 ffmpeg 精确切割；否则直接按MP3帧边界复制字节，
+不需要解码，也不依赖任何第三方库。按帧切割时边读边扫描帧头，只在内存中保存紧凑的帧索引，
+切片时定位到起始帧按块复制，不会把整个音频文件读入内存。
+"""
+
+import bisect
+import os
+import shutil
+import subprocess
+from array import array
+
+# (MPEG版本, 层) -> 码率表(kbps)
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+# 切片前后各多保留的秒数，避免句首句尾被截断
+SEGMENT_PADDING = 0.15
+# 扫描帧头和复制切片时每次读取的字节数
+READ_BLOCK_SIZE = 1024 * 1024
+# 扫描时缓冲区中至少保留的字节数：最长的帧（约2.7KB）+ 下一帧帧头，以及检查 Xing/Info 的64字节
+_LOOKAHEAD = 8192
+
+
+def _parse_frame_header(header):
+    """解析4字节帧头，返回 (帧长度, 帧时长秒)，不是合法帧头时返回None"""
+    b1, b2 = header[1], header[2]
+    if header[0] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = {0: 2.5, 2: 2, 3: 1}.get((b1 >> 3) & 0x03)
+    layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or version == 1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples / sample_rate
+
+
+def _skip_id3v2(data):
+    if len(data) >= 10 and data[:3] == b'ID3':
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+class FrameIndex:
+    """MP3帧索引：每帧的字节偏移、帧长度和开始时间（秒），用 array 保存，每帧约24字节"""
+
+    def __init__(self):
+        self.offsets = array('q')
+        self.lengths = array('l')
+        self.starts = array('d')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        return self.offsets[i], self.lengths[i], self.starts[i]
+
+
+def mp3_frame_index(f):
+    """从打开的MP3文件中边读边扫描，返回 FrameIndex"""
+    f.seek(0, os.SEEK_END)
+    end = f.tell() - 4
+    f.seek(0)
+    offset = _skip_id3v2(f.read(10))
+    f.seek(offset)
+    buf = f.read(READ_BLOCK_SIZE)
+    base = offset  # buf[0] 在文件中的位置
+    frames = FrameIndex()
+    elapsed = 0.0
+    while offset <= end:
+        i = offset - base
+        if len(buf) - i < _LOOKAHEAD and base + len(buf) < end + 4:
+            buf = buf[i:] + f.read(READ_BLOCK_SIZE)
+            base, i = offset, 0
+        parsed = _parse_frame_header(buf[i:i + 4])
+        if parsed is not None and offset + parsed[0] <= end:
+            # 下一帧也必须是合法帧头，避免把数据中恰好出现的同步字当成帧
+            if _parse_frame_header(buf[i + parsed[0]:i + parsed[0] + 4]) is None:
+                parsed = None
+        if parsed is None or parsed[0] <= 4:
+            offset += 1  # 跳过垃圾数据，重新寻找帧同步
+            continue
+        length, duration = parsed
+        # 第一帧可能是 Xing/Info 元数据帧，不计入时长
+        if not frames and (b'Xing' in buf[i:i + 64] or b'Info' in buf[i:i + 64]):
+            offset += length
+            continue
+        frames.offsets.append(offset)
+        frames.lengths.append(length)
+        frames.starts.append(elapsed)
+        elapsed += duration
+        offset += length
+    return frames
+
+
+def slice_frames(f, frames, start, end, dest_path):
+    """把 [start, end] 秒范围内的完整帧从打开的文件 f 复制到 dest_path"""
+    first = bisect.bisect_left(frames.starts, max(0.0, start - SEGMENT_PADDING))
+    last = bisect.bisect_left(frames.starts, end + SEGMENT_PADDING) - 1
+    if first > last:
+        return False
+    first_offset = frames.offsets[first]
+    remaining = frames.offsets[last] + frames.lengths[last] - first_offset
+    f.seek(first_offset)
+    with open(dest_path, 'wb') as out:
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            out.write(block)
+            remaining -= len(block)
+    return True
+
+
+def _slice_with_ffmpeg(ffmpeg, audio_path, start, end, dest_path):
+    start = max(0.0, start - SEGMENT_PADDING)
+    result = subprocess.run(
+        [ffmpeg, '-v', 'error', '-y', '-ss', f'{start:.3f}', '-t', f'{end - start + SEGMENT_PADDING:.3f}',
+         '-i', audio_path, '-c:a', 'libmp3lame', '-q:a', '4', dest_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    return result.returncode == 0
+
+
+def extract_segments(audio_path, cues, output_dir, use_ffmpeg=True):
+    """切出每句的音频
+
+    cues: [(sentence_id, start秒, end秒), ...]
+    返回 {sentence_id: 切片文件路径}
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    ffmpeg = shutil.which('ffmpeg') if use_ffmpeg else None
+    paths = {}
+    if ffmpeg is not None:
+        for sentence_id, start, end in cues:
+            dest_path = os.path.join(output_dir, f'{sentence_id}.mp3')
+            if _slice_with_ffmpeg(ffmpeg, audio_path, start, end, dest_path):
+                paths[sentence_id] = dest_path
+        return paths
+
+    with open(audio_path, 'rb') as f:
+        frames = mp3_frame_index(f)
+        for sentence_id, start, end in cues:
+            dest_path = os.path.join(output_dir, f'{sentence_id}.mp3')
+            if slice_frames(f, frames, start, end, dest_path):
+                paths[sentence_id] = dest_path
+    return paths
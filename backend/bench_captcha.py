@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+验证码突发请求基准测试 - 对比现场生成与预生成图片池的验证码发放延迟
+
+模拟集中注册：空闲一段时间后同时发出一批 /api/captcha 请求，重复多轮，
+统计每个请求的延迟和整批完成时间。默认在进程内用测试客户端请求，
+--workers N 时用gunicorn启动N个worker通过HTTP请求（与 loadtest.py 相同的启动方式）。
+
+用法: python bench_captcha.py [--burst 300] [--concurrency 16] [--rounds 5] [--workers 0]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 使用临时数据库和共享状态文件，避免影响app.db
+scratch_dir = tempfile.mkdtemp(prefix='bench_captcha_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'bench.db')
+os.environ['STATE_BACKEND_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'state.db')
+os.environ['AUDIO_SEGMENT_MODE'] = 'off'
+
+from loadtest import request, start_server, wait_until_ready
+
+
+def run_bursts(fetch, burst, concurrency, rounds, idle):
+    latencies = []
+    burst_seconds = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(rounds):
+            # 空闲期间图片池在后台补满
+            time.sleep(idle)
+            started = time.perf_counter()
+            latencies.extend(executor.map(lambda _: fetch(), range(burst)))
+            burst_seconds.append(time.perf_counter() - started)
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return percentile(0.5), percentile(0.95), percentile(0.99), sum(burst_seconds) / len(burst_seconds)
+
+
+def in_process_fetcher(pool_size):
+    from app import app, captcha_pool, create_app
+
+    create_app({'CAPTCHA_POOL_SIZE': pool_size})
+    captcha_pool.warm()
+    client = app.test_client()
+
+    def fetch():
+        started = time.perf_counter()
+        response = client.get('/api/captcha')
+        assert response.status_code == 200
+        return time.perf_counter() - started
+
+    return fetch
+
+
+def http_fetcher(base_url):
+    def fetch():
+        started = time.perf_counter()
+        status, body = request(base_url + '/api/captcha')
+        assert status == 200 and json.loads(body)['id']
+        return time.perf_counter() - started
+
+    return fetch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--burst', type=int, default=300, help='每轮同时发出的请求数')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--idle', type=float, default=2.0, help='两轮之间的空闲秒数')
+    parser.add_argument('--pool-size', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=0, help='大于0时通过gunicorn HTTP请求')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    print(f"{'模式':<14}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'整批(s)':>10}")
+    for label, pool_size in (('现场生成', 0), (f'图片池{args.pool_size}', args.pool_size)):
+        if args.workers:
+            os.environ['CAPTCHA_POOL_SIZE'] = str(pool_size)
+            server = start_server(args.workers, args.port, scratch_dir)
+            try:
+                base_url = f'http://127.0.0.1:{args.port}'
+                wait_until_ready(base_url)
+                result = run_bursts(http_fetcher(base_url), args.burst, args.concurrency, args.rounds, args.idle)
+            finally:
+                server.terminate()
+                server.wait()
+        else:
+            result = run_bursts(in_process_fetcher(pool_size), args.burst, args.concurrency, args.rounds, args.idle)
+        p50, p95, p99, burst_seconds = result
+        print(f'{label:<14}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{burst_seconds:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+听写检查基准测试 - 测量单次答案检查的耗时和批量检查接口的延迟
+
+句子取自 uploads 中的真实字幕，答案在原句基础上随机制造大小写/标点变化、
+拼写错误、漏词、多词和整句答错。目标：单次检查（规范化用户输入 + 词级编辑距离）低于1毫秒。
+
+用法: python bench_dictation.py [--answers 20000] [--repeat 50]
+"""
+
+import argparse
+import glob
+import os
+import random
+import tempfile
+import time
+
+# 使用临时数据库，避免影响app.db
+scratch_dir = tempfile.mkdtemp(prefix='bench_dictation_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'bench.db')
+os.environ['AUDIO_SEGMENT_MODE'] = 'off'
+
+from app import app, db, User, Course, Sentence, import_sentences, init_database
+from dictation import normalize_tokens, score_answer
+from srt_import import iter_srt_cues
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+
+def load_cues():
+    cues = []
+    for path in sorted(glob.glob(os.path.join(basedir, 'uploads', '*.srt'))):
+        cues.extend(iter_srt_cues(path))
+    return cues or [('Hello English learners and welcome to English Pod, my name is Marco.', 0, 3000)]
+
+
+def mutate(rng, text):
+    """在原句基础上制造一种常见的答题错误"""
+    words = text.split()
+    kind = rng.choice(['exact', 'folded', 'typo', 'missing', 'extra', 'wrong'])
+    if kind == 'folded':
+        return ' '.join(words).lower().replace(',', '').replace('.', '').replace("'", '')
+    if kind == 'typo':
+        i = rng.randrange(len(words))
+        word = words[i]
+        if len(word) > 3:
+            j = rng.randrange(len(word) - 1)
+            words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+    elif kind == 'missing' and len(words) > 1:
+        del words[rng.randrange(len(words))]
+    elif kind == 'extra':
+        words.insert(rng.randrange(len(words) + 1), rng.choice(['the', 'really', 'so', 'very']))
+    elif kind == 'wrong':
+        rng.shuffle(words)
+    return ' '.join(words)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return [samples[min(len(samples) - 1, int(len(samples) * p))] for p in (0.5, 0.95, 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answers', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    cues = load_cues()
+    print(f'{len(cues)} 个句子，平均 {sum(len(c[0].split()) for c in cues) / len(cues):.1f} 个词')
+
+    started = time.perf_counter()
+    expected = [normalize_tokens(text) for text, _, _ in cues]
+    elapsed = time.perf_counter() - started
+    print(f'预计算规范化词序列: {elapsed * 1e6 / len(cues):.1f}µs/句')
+
+    cases = []
+    for _ in range(args.answers):
+        index = rng.randrange(len(cues))
+        cases.append((expected[index], mutate(rng, cues[index][0])))
+
+    # 第一轮包含词级缓存未命中（新词的规范化和拼写比较），第二轮为缓存命中
+    for label in ('首次', '重复'):
+        samples = []
+        for tokens, answer in cases:
+            start = time.perf_counter()
+            score_answer(tokens, answer)
+            samples.append((time.perf_counter() - start) * 1e6)
+        p50, p95, p99 = percentiles(samples)
+        print(f'单次检查({label}): p50 {p50:.1f}µs  p95 {p95:.1f}µs  p99 {p99:.1f}µs  '
+              f'{len(samples) / (sum(samples) / 1e6):.0f} 次/s')
+
+    with app.app_context():
+        init_database()
+        course = Course(title='Benchmark', difficulty='normal', creator=User.query.first())
+        db.session.add(course)
+        db.session.flush()
+        import_sentences(course.id, cues)
+        db.session.commit()
+        rows = db.session.query(Sentence.id, Sentence.text).filter_by(course_id=course.id).limit(200).all()
+        course_id = course.id
+
+    client = app.test_client()
+    for size in (1, 20, 200):
+        answers = [{'sentence_id': sentence_id, 'answer': mutate(rng, text)} for sentence_id, text in rows[:size]]
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.post(f'/api/courses/{course_id}/check', json={'answers': answers})
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.get_json()
+        p50, p95, _ = percentiles(samples)
+        print(f'批量检查接口 {size:>3} 句: p50 {p50:.2f}ms  p95 {p95:.2f}ms  ({p50 * 1000 / size:.0f}µs/句)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生命值接口并发写入基准测试
+
+多个线程同时调用 /api/user/hearts/lose、/api/user/hearts/reward 和
+/api/courses/<id>/levels/<i>/complete，统计吞吐量、失败数，并检查同一用户
+并发答对时 consecutive_correct 是否有丢失的更新。
+
+用法: python bench_hearts.py [--threads 16] [--requests 200] [--compare]
+--compare 会分别在默认SQLite配置和调优后的配置下各运行一次。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+def run(threads, requests_per_thread):
+    scratch_dir = tempfile.mkdtemp(prefix='bench_hearts_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'bench.db')
+
+    from app import app, db, User, init_database
+
+    with app.app_context():
+        init_database()
+        usernames = [f'bench_{i}' for i in range(threads)] + ['bench_shared']
+        for username in usernames:
+            user = User(username=username, is_newbie=False, newbie_protection_count=0)
+            user.set_password('password')
+            db.session.add(user)
+        db.session.commit()
+        shared_user_id = User.query.filter_by(username='bench_shared').first().id
+
+    client = app.test_client()
+    tokens = []
+    for username in usernames:
+        response = client.post('/api/login', json={'username': username, 'password': 'password'})
+        tokens.append(response.get_json()['token'])
+
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def learner(n):
+        local = Counter()
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {tokens[n]}'}
+        shared_headers = {'Authorization': f'Bearer {tokens[-1]}'}
+        for i in range(requests_per_thread):
+            step = i % 4
+            if step == 0:
+                response = client.post('/api/user/hearts/lose', json={}, headers=headers)
+            elif step == 1:
+                response = client.post('/api/user/hearts/reward', json={'type': 'correct_answer'}, headers=headers)
+            elif step == 2:
+                response = client.post(f'/api/courses/1/levels/{n * requests_per_thread + i}/complete',
+                                       headers=headers)
+            else:
+                # 所有线程同时给同一个用户加连续答对次数，用于检查丢失更新
+                response = client.post('/api/user/hearts/reward', json={'type': 'correct_answer'},
+                                       headers=shared_headers)
+            local[response.status_code] += 1
+        with lock:
+            statuses.update(local)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=learner, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    total = threads * requests_per_thread
+    expected_streak = threads * len(range(3, requests_per_thread, 4))
+    with app.app_context():
+        streak = db.session.get(User, shared_user_id).consecutive_correct
+
+    tuning = 'off' if os.environ.get('SQLITE_TUNING') == '0' else 'on'
+    print(f'SQLite调优: {tuning}  线程: {threads}  请求总数: {total}')
+    print(f'  吞吐量: {total / elapsed:8.1f} req/s  总耗时: {elapsed:.2f}s')
+    print(f'  状态码: {dict(sorted(statuses.items()))}')
+    print(f'  共享用户连续答对: {streak} / 预期 {expected_streak}  (丢失更新 {expected_streak - streak} 次)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+
+    if not args.compare:
+        run(args.threads, args.requests)
+        return
+
+    # 每种配置在独立进程中运行，保证引擎按各自的环境变量创建
+    for tuning in ('0', '1'):
+        env = dict(os.environ, SQLITE_TUNING=tuning)
+        subprocess.run([sys.executable, __file__, '--threads', str(args.threads),
+                        '--requests', str(args.requests)], env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+集中登录基准测试 - 测量登录突发期间的登录吞吐量和无关接口（/api/user/hearts）的延迟
+
+先单独测量生命值接口的基线延迟，然后在 --login-threads 个线程持续登录的同时再次测量，
+分别使用不限制的哈希线程池（线程数等于登录线程数，相当于在请求线程中直接计算）
+和有上限的线程池（默认按 --request-threads 由 hash_limits 计算线程数和排队上限，与线上默认配置相同；
+也可以用 --hash-workers/--hash-queue 指定，超出时返回503）。
+
+用法: python bench_login.py [--login-threads 16] [--duration 10] [--request-threads 2]
+      [--hash-workers N] [--hash-queue N]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# 使用临时数据库，避免影响app.db
+scratch_dir = tempfile.mkdtemp(prefix='bench_login_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'bench.db')
+os.environ['AUDIO_SEGMENT_MODE'] = 'off'
+
+from app import app, create_app, init_database
+from password_hashing import hash_limits
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return [0.0, 0.0, 0.0]
+    return [samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 for p in (0.5, 0.95, 0.99)]
+
+
+def measure_hearts(token, stop):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    samples = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = client.get('/api/user/hearts', headers=headers)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200
+        time.sleep(0.01)
+    return samples
+
+
+def run(token, login_threads, duration):
+    stop = threading.Event()
+    statuses = Counter()
+    login_samples = []
+    lock = threading.Lock()
+
+    def login():
+        client = app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.post('/api/login', json={'username': 'default_user', 'password': 'password'})
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[response.status_code] += 1
+                if response.status_code == 200:
+                    login_samples.append(elapsed)
+            if response.status_code == 503:
+                # 客户端按 Retry-After 退避
+                stop.wait(int(response.headers['Retry-After']))
+
+    threads = [threading.Thread(target=login) for _ in range(login_threads)]
+    for thread in threads:
+        thread.start()
+    threading.Timer(duration, stop.set).start()
+    hearts = measure_hearts(token, stop)
+    for thread in threads:
+        thread.join()
+    return statuses, login_samples, hearts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--request-threads', type=int, default=app.config['REQUEST_THREADS'],
+                        help='每个进程的请求线程数（默认同 GUNICORN_THREADS）')
+    parser.add_argument('--hash-workers', type=int)
+    parser.add_argument('--hash-queue', type=int)
+    args = parser.parse_args()
+
+    with app.app_context():
+        init_database()
+    token = app.test_client().post('/api/login', json={'username': 'default_user', 'password': 'password'}) \
+        .get_json()['token']
+
+    stop = threading.Event()
+    threading.Timer(min(args.duration, 3), stop.set).start()
+    p50, p95, p99 = percentiles(measure_hearts(token, stop))
+    print(f'生命值接口基线: p50 {p50:.2f}ms  p95 {p95:.2f}ms  p99 {p99:.2f}ms')
+
+    print(f"{'哈希线程池':<22}{'登录/s':>8}{'503':>6}{'登录p50(ms)':>13}{'生命值p50':>11}{'p95':>10}{'p99':>10}")
+    workers, queue = hash_limits(args.request_threads, args.hash_workers, args.hash_queue)
+    for label, config in (
+            ('不限制', {'REQUEST_THREADS': 2 * args.login_threads + 1,
+                        'PASSWORD_HASH_WORKERS': args.login_threads, 'PASSWORD_HASH_QUEUE': args.login_threads}),
+            (f'{workers}线程/排队{queue}', {'REQUEST_THREADS': args.request_threads,
+                                           'PASSWORD_HASH_WORKERS': workers, 'PASSWORD_HASH_QUEUE': queue})):
+        create_app(config)
+        statuses, logins, hearts = run(token, args.login_threads, args.duration)
+        login_p50 = percentiles(logins)[0]
+        p50, p95, p99 = percentiles(hearts)
+        print(f"{label:<22}{statuses[200] / args.duration:>8.1f}{statuses[503]:>6}{login_p50:>13.1f}"
+              f"{p50:>11.2f}{p95:>10.2f}{p99:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
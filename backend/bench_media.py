@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频拖动播放基准测试 - 模拟多个学员同时按句子来回跳转播放
+
+每个线程随机选择字幕中的一句，按句子在音频中的位置计算字节区间，
+用 Range 请求只下载这一段（range 模式），或者像不支持Range的客户端一样
+每次下载整个文件（full 模式）。统计吞吐量、延迟和传输的数据量。
+
+用法: python bench_media.py [--workers 2] [--concurrency 16] [--duration 10] [--file englishpod_B0001pb.mp3]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.request
+
+import srt
+
+from loadtest import basedir, start_server, wait_until_ready
+
+
+def load_cues(srt_path):
+    with open(srt_path, 'r', encoding='utf-8') as f:
+        return [(sub.start.total_seconds(), sub.end.total_seconds()) for sub in srt.parse(f.read())]
+
+
+def fetch(url, byte_range=None):
+    headers = {}
+    if byte_range is not None:
+        headers['Range'] = 'bytes=%d-%d' % byte_range
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return response.status, len(response.read())
+
+
+def run_seeks(url, cues, file_size, mode, concurrency, duration):
+    total_seconds = cues[-1][1]
+    latencies = []
+    transferred = [0]
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def learner(seed):
+        rng = random.Random(seed)
+        local = []
+        local_bytes = 0
+        local_errors = 0
+        while time.time() < deadline:
+            start, end = rng.choice(cues)
+            # 按平均码率把时间换算成字节区间
+            byte_range = (int(start / total_seconds * file_size),
+                          min(file_size - 1, int(end / total_seconds * file_size)))
+            began = time.perf_counter()
+            try:
+                _, size = fetch(url, byte_range if mode == 'range' else None)
+                local.append(time.perf_counter() - began)
+                local_bytes += size
+            except OSError:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            transferred[0] += local_bytes
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=learner, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / duration,
+        'mb_per_seek': transferred[0] / max(1, len(latencies)) / 1024 / 1024,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--file', default='englishpod_B0001pb.mp3', help='uploads目录中的音频文件（需要同名.srt）')
+    args = parser.parse_args()
+
+    audio_path = os.path.join(basedir, 'uploads', args.file)
+    cues = load_cues(os.path.splitext(audio_path)[0] + '.srt')
+    file_size = os.path.getsize(audio_path)
+    url = f'http://127.0.0.1:{args.port}/uploads/{args.file}'
+
+    scratch_dir = tempfile.mkdtemp(prefix='bench_media_')
+    server = start_server(args.workers, args.port, scratch_dir)
+    try:
+        wait_until_ready(f'http://127.0.0.1:{args.port}')
+        print(f'{args.file}: {file_size / 1024 / 1024:.1f}MB, {len(cues)}句, '
+              f'workers={args.workers}, concurrency={args.concurrency}')
+        for mode in ('full', 'range'):
+            result = run_seeks(url, cues, file_size, mode, args.concurrency, args.duration)
+            print(f"{mode:<6} seeks/s={result['rps']:8.1f}  p50={result['p50_ms']:7.2f}ms  "
+                  f"p95={result['p95_ms']:7.2f}ms  每次{result['mb_per_seek']:.3f}MB  errors={result['errors']}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
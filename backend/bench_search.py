@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全文搜索基准测试 - 生成大量句子后测量 /api/search 的延迟
+
+句子由 uploads 中真实字幕的词汇加上按Zipf分布抽取的低频词组成，
+写入时由触发器同步维护FTS5索引。对比同一个词用 LIKE 全表扫描的耗时。
+
+用法: python bench_search.py [--sentences 300000] [--repeat 50]
+"""
+
+import argparse
+import glob
+import itertools
+import os
+import random
+import re
+import tempfile
+import time
+
+# 使用临时数据库，避免影响app.db
+scratch_dir = tempfile.mkdtemp(prefix='bench_search_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'bench.db')
+os.environ['AUDIO_SEGMENT_MODE'] = 'off'
+
+from app import app, db, User, Course, import_sentences, init_database
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+QUERIES = [
+    ('高频词', 'the'),
+    ('常见词', 'report'),
+    ('两个词', 'quarterly report'),
+    ('短语', '"quarterly report"'),
+    ('前缀', 'quart'),
+    ('低频词', 'zeta1234'),
+]
+
+
+def load_vocabulary():
+    words = []
+    for path in glob.glob(os.path.join(basedir, 'uploads', '*.srt')):
+        with open(path, 'r', encoding='utf-8') as f:
+            words.extend(w.lower() for w in re.findall(r"[A-Za-z']+", f.read()))
+    return sorted(set(words)) or ['hello', 'world']
+
+
+def generate(sentence_count, per_course=200):
+    rng = random.Random(42)
+    vocabulary = load_vocabulary() + ['quarterly', 'report', 'meeting', 'budget']
+    # 低频词按Zipf分布抽取，模拟真实语料的长尾
+    rare_words = [f'zeta{i}' for i in range(20000)]
+    rare_cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(rare_words))))
+
+    with app.app_context():
+        init_database()
+        user = User.query.first()
+        started = time.perf_counter()
+        remaining = sentence_count
+        while remaining > 0:
+            course = Course(title=f'Synthetic {remaining}', difficulty='normal', creator=user)
+            db.session.add(course)
+            db.session.flush()
+            count = min(per_course, remaining)
+            cues = []
+            for i in range(count):
+                words = rng.choices(vocabulary, k=rng.randint(5, 14))
+                words += rng.choices(rare_words, cum_weights=rare_cum_weights, k=1)
+                if rng.random() < 0.01:
+                    words[rng.randrange(len(words)):0] = ['quarterly', 'report']
+                cues.append((' '.join(words).capitalize() + '.', i * 3000, i * 3000 + 2500))
+            import_sentences(course.id, cues)
+            db.session.commit()
+            remaining -= count
+        elapsed = time.perf_counter() - started
+    print(f'写入 {sentence_count} 句（含索引维护）: {elapsed:.1f}s, {sentence_count / elapsed:.0f} 句/s')
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sentences', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    generate(args.sentences)
+    client = app.test_client()
+
+    print(f"{'查询':<10}{'q':<24}{'首页条数':>8}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for label, query in QUERIES:
+        first_page = client.get('/api/search', query_string={'q': query}).get_json()
+        p50, p95 = timed(lambda: client.get('/api/search', query_string={'q': query}), args.repeat)
+        print(f'{label:<10}{query:<24}{len(first_page):>8}{p50:>10.2f}{p95:>10.2f}')
+
+    p50, p95 = timed(lambda: client.get('/api/search', query_string={'q': 'report', 'group': 'course'}), args.repeat)
+    print(f"{'按课程汇总':<10}{'report':<24}{'':>8}{p50:>10.2f}{p95:>10.2f}")
+
+    with app.app_context():
+        # 排序需要找出全部命中，LIKE 只能全表扫描
+        like = db.text("SELECT count(*) FROM sentence WHERE text LIKE '%report%'")
+        p50, p95 = timed(lambda: db.session.execute(like).fetchall(), max(5, args.repeat // 10))
+        print(f"{'LIKE扫描':<10}{'report':<24}{'':>8}{p50:>10.2f}{p95:>10.2f}")
+        like = db.text("SELECT id FROM sentence WHERE text LIKE '%zeta1234 %'")
+        p50, p95 = timed(lambda: db.session.execute(like).fetchall(), max(5, args.repeat // 10))
+        print(f"{'LIKE扫描':<10}{'zeta1234':<24}{'':>8}{p50:>10.2f}{p95:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
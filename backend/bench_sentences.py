@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+句子接口基准测试 - 对比解析SRT文件与读取Sentence表两种方式
+
+用法: python bench_sentences.py [字幕条数] [重复次数]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import srt
+
+# 使用临时数据库，避免影响app.db
+scratch_dir = tempfile.mkdtemp(prefix='bench_sentences_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'bench.db')
+
+from app import app, db, User, Course, import_sentences, load_sentences_from_db, load_sentences_from_srt, sentence_cache
+from srt_import import iter_srt_cues
+
+
+def write_srt(path, cue_count):
+    """生成指定条数的字幕文件"""
+    subs = []
+    for i in range(cue_count):
+        start = timedelta(seconds=i * 3)
+        subs.append(srt.Subtitle(
+            index=i + 1,
+            start=start,
+            end=start + timedelta(seconds=2, milliseconds=500),
+            content=f'This is sentence number {i + 1} of the synthetic listening course.'
+        ))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(srt.compose(subs))
+
+
+def timed(func, repeat):
+    """返回每次调用的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def run_benchmark(cue_count=2000, repeat=50):
+    srt_path = os.path.join(scratch_dir, 'bench.srt')
+    write_srt(srt_path, cue_count)
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench_user')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+
+        course = Course(title='Benchmark', difficulty='normal', creator=user, srt_path=srt_path)
+        db.session.add(course)
+        db.session.commit()
+
+        import_sentences(course.id, iter_srt_cues(srt_path))
+        db.session.commit()
+
+        # 两条路径的结果必须一致（SRT回退没有句子记录，sentence_id 为 None）
+        assert [dict(sentence, sentence_id=None) for sentence in load_sentences_from_db(course.id)] \
+            == load_sentences_from_srt(srt_path)
+
+        srt_ms = timed(lambda: load_sentences_from_srt(srt_path), repeat)
+        db_ms = timed(lambda: load_sentences_from_db(course.id), repeat)
+        course_id = course.id
+
+    client = app.test_client()
+    url = f'/api/courses/{course_id}/sentences'
+
+    def uncached_get():
+        sentence_cache.invalidate(course_id)
+        client.get(url)
+
+    uncached_ms = timed(uncached_get, repeat)
+    cached_ms = timed(lambda: client.get(url), repeat)
+    etag = client.get(url).headers['ETag']
+    not_modified_ms = timed(lambda: client.get(url, headers={'If-None-Match': etag}), repeat)
+
+    print(f'字幕条数: {cue_count}, 重复次数: {repeat}')
+    print(f'SRT解析:           {srt_ms:8.2f} ms/次')
+    print(f'Sentence表读取:    {db_ms:8.2f} ms/次')
+    print(f'加速比: {srt_ms / db_ms:.1f}x')
+    print(f'接口(缓存未命中):  {uncached_ms:8.2f} ms/次')
+    print(f'接口(缓存命中):    {cached_ms:8.2f} ms/次')
+    print(f'接口(304):         {not_modified_ms:8.2f} ms/次')
+    print(f'缓存统计: {sentence_cache.stats()}')
+
+
+if __name__ == '__main__':
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run_benchmark(cue_count, repeat)
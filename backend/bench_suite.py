@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端基准测试 - 在合成数据集上模拟学习者会话，统计每个接口的延迟分位数和吞吐量
+
+每个并发线程不断重复一次典型的学习过程：浏览课程列表 → 打开课程 → 加载句子 → 查看生命值 →
+逐句提交听写答案（答错扣心、答对偶尔奖励）→ 完成关卡 → 查看关卡进度，
+并按一定概率查看复习队列、搜索句子和学习进度。默认在进程内用测试客户端请求，
+--workers N 时用gunicorn启动N个worker通过HTTP请求（与 loadtest.py 相同的启动方式）。
+
+数据集由 gen_dataset.py 生成：--dataset 指定已生成的目录（可在多次运行之间复用），
+否则按 --scale 在临时目录中生成。结果（每个接口的 p50/p95/p99、吞吐量、状态码，以及数据集规模和
+当前提交）写入 --output 指定的JSON文件；--compare 指定上一次的结果文件时输出各接口 p95 的变化。
+
+用法: python bench_suite.py [--dataset DIR | --scale small] [--workers 0] [--concurrency 8]
+      [--duration 30] [--learners 50] [--output result.json] [--compare baseline.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+
+import gen_dataset
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+
+class InProcessClient:
+
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def call(self, method, path, token=None, data=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.client.open(path, method=method, json=data, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def call(self, method, path, token=None, data=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                return response.status, json.loads(response.read() or 'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+class Recorder:
+    """按接口名称记录延迟和状态码；5xx 和连接错误计为错误"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.recording = True
+
+    def call(self, client, name, method, path, token=None, data=None):
+        start = time.perf_counter()
+        try:
+            status, body = client.call(method, path, token, data)
+        except OSError:
+            status, body = 'error', None
+        elapsed = time.perf_counter() - start
+        if self.recording:
+            with self._lock:
+                self.latencies[name].append(elapsed)
+                self.statuses[name][status] += 1
+        return status, body
+
+    def summary(self, duration):
+        endpoints = {}
+        for name, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+
+            def percentile(p):
+                return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3)
+
+            statuses = self.statuses[name]
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': sum(count for status, count in statuses.items() if status == 'error' or status >= 500),
+                'rps': round(len(samples) / duration, 1),
+                'p50_ms': percentile(0.50),
+                'p95_ms': percentile(0.95),
+                'p99_ms': percentile(0.99),
+                'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            }
+        total = sum(e['requests'] for e in endpoints.values())
+        return endpoints, {'requests': total, 'errors': sum(e['errors'] for e in endpoints.values()),
+                           'rps': round(total / duration, 1)}
+
+
+def mistype(rng, text):
+    """约三成的答案漏掉一个词"""
+    words = text.split()
+    if len(words) > 2 and rng.random() < 0.3:
+        del words[rng.randrange(len(words))]
+    return ' '.join(words)
+
+
+def learner_session(client, recorder, rng, token, course_ids, search_words):
+    call = recorder.call
+    call(client, 'GET /api/courses/all', 'GET', '/api/courses/all?limit=20&sort=' + rng.choice(
+        ['difficulty_score', '-difficulty_score', 'words_per_second']), token)
+    course_id = rng.choice(course_ids)
+    call(client, 'GET /api/courses/<id>', 'GET', f'/api/courses/{course_id}', token)
+    status, sentences = call(client, 'GET /api/courses/<id>/sentences', 'GET', f'/api/courses/{course_id}/sentences')
+    call(client, 'GET /api/user/hearts', 'GET', '/api/user/hearts', token)
+    if status == 200 and sentences:
+        level = rng.randrange(max(1, len(sentences) // gen_dataset.LEVEL_SIZE))
+        for sentence in sentences[level * gen_dataset.LEVEL_SIZE:][:rng.randint(3, gen_dataset.LEVEL_SIZE)]:
+            status, result = call(client, 'POST /api/sentences/<id>/check', 'POST',
+                                  f"/api/sentences/{sentence['sentence_id']}/check", token,
+                                  {'answer': mistype(rng, sentence['text'])})
+            if status == 200 and not result['correct']:
+                call(client, 'POST /api/user/hearts/lose', 'POST', '/api/user/hearts/lose', token,
+                     {'action_type': 'wrong_answer'})
+            elif rng.random() < 0.2:
+                call(client, 'POST /api/user/hearts/reward', 'POST', '/api/user/hearts/reward', token,
+                     {'type': 'correct_answer'})
+        call(client, 'POST /api/courses/<id>/levels/<i>/complete', 'POST',
+             f'/api/courses/{course_id}/levels/{level}/complete', token, {})
+    call(client, 'GET /api/courses/<id>/levels/completed', 'GET', f'/api/courses/{course_id}/levels/completed', token)
+    if rng.random() < 0.5:
+        call(client, 'GET /api/review/next', 'GET', '/api/review/next?limit=10', token)
+    if rng.random() < 0.2:
+        call(client, 'GET /api/search', 'GET', '/api/search?q=' + rng.choice(search_words), token)
+    if rng.random() < 0.3:
+        call(client, 'GET /api/users/progress', 'GET', '/api/users/progress', token)
+
+
+def run(make_client, learner_count, learners, concurrency, duration, warmup, seed):
+    recorder = Recorder()
+    setup = make_client()
+    course_ids = [course['id'] for course in setup.call('GET', '/api/courses/all?fields=id')[1]]
+    rng = random.Random(seed)
+    # 登录也计入结果（密码哈希是登录接口的主要开销）
+    tokens = []
+    for i in rng.sample(range(learner_count), min(learners, learner_count)):
+        status, body = recorder.call(setup, 'POST /api/login', 'POST', '/api/login', None,
+                                     {'username': f'learner_{i:06d}', 'password': 'password'})
+        if status == 200:
+            tokens.append(body['token'])
+    if not tokens:
+        raise RuntimeError('没有可用的学习者账号')
+    search_words = ['time', 'people', 'work', 'house', 'water', 'friend', 'morning', 'money']
+
+    deadline = time.time() + warmup + duration
+
+    def worker(n):
+        client = make_client()
+        worker_rng = random.Random(seed * 1000 + n)
+        while time.time() < deadline:
+            learner_session(client, recorder, worker_rng, worker_rng.choice(tokens), course_ids, search_words)
+
+    if warmup:
+        recorder.recording = False
+        threading.Timer(warmup, lambda: setattr(recorder, 'recording', True)).start()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(duration)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=basedir, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(endpoints, total, baseline=None):
+    print(f"{'接口':<46}{'请求数':>8}{'错误':>6}{'rps':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+          + (f"{'p95变化':>10}" if baseline else ''))
+    for name, e in endpoints.items():
+        line = (f"{name:<46}{e['requests']:>8}{e['errors']:>6}{e['rps']:>8.1f}"
+                f"{e['p50_ms']:>10.2f}{e['p95_ms']:>10.2f}{e['p99_ms']:>10.2f}")
+        previous = (baseline or {}).get(name)
+        if previous and previous['p95_ms']:
+            line += f"{(e['p95_ms'] / previous['p95_ms'] - 1) * 100:>+9.1f}%"
+        print(line)
+    print(f"合计 {total['requests']} 个请求，{total['errors']} 个错误，{total['rps']} 请求/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', help='gen_dataset.py 生成的目录，不存在时按 --scale 生成到该目录')
+    parser.add_argument('--scale', choices=gen_dataset.SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=0, help='大于0时通过gunicorn HTTP请求')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=2, help='开始统计前的预热秒数')
+    parser.add_argument('--learners', type=int, default=50, help='登录的学习者数量')
+    parser.add_argument('--output', help='结果JSON文件')
+    parser.add_argument('--compare', help='与之前的结果JSON文件比较')
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.dataset or tempfile.mkdtemp(prefix='bench_suite_'))
+    database_path = os.path.join(directory, 'bench.db')
+    scratch_dir = tempfile.mkdtemp(prefix='bench_suite_state_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database_path
+    os.environ['STATE_BACKEND_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'state.db')
+    os.environ['AUDIO_SEGMENT_MODE'] = 'off'
+    if not os.path.exists(database_path):
+        os.makedirs(directory, exist_ok=True)
+        print(f'在 {directory} 中生成 {args.scale} 规模的数据集...')
+        gen_dataset.generate(directory, *gen_dataset.SCALES[args.scale], seed=args.seed)
+    with open(os.path.join(directory, 'dataset.json'), encoding='utf-8') as f:
+        dataset = json.load(f)
+    print(f"数据集: {dataset['users']} 用户, {dataset['courses']} 课程, {dataset['sentences']} 句子")
+    learner_count = dataset['users'] - 1  # 不含 default_user
+
+    if args.workers:
+        from loadtest import start_server, wait_until_ready
+        base_url = f'http://127.0.0.1:{args.port}'
+        server = start_server(args.workers, args.port, scratch_dir, database_path)
+        try:
+            wait_until_ready(base_url)
+            endpoints, total = run(lambda: HttpClient(base_url), learner_count, args.learners, args.concurrency,
+                                   args.duration, args.warmup, args.seed)
+        finally:
+            server.terminate()
+            server.wait()
+    else:
+        endpoints, total = run(InProcessClient, learner_count, args.learners, args.concurrency,
+                               args.duration, args.warmup, args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['endpoints']
+    print_report(endpoints, total, baseline)
+
+    if args.output:
+        result = {
+            'meta': {
+                'timestamp': datetime.datetime.utcnow().isoformat(),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'mode': f'http/{args.workers} workers' if args.workers else 'in-process',
+                'concurrency': args.concurrency,
+                'duration': args.duration,
+                'learners': args.learners,
+                'dataset': dataset,
+            },
+            'total': total,
+            'endpoints': endpoints,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f'结果已写入 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+内容寻址存储 - 上传文件按SHA-256保存为 <root>/<sha256><扩展名>
+
+相同内容只保存一份，文件名即内容哈希，URL可以永久缓存。
+引用计数由调用方根据数据库中引用该路径的记录数计算（见 app.py 中的 release_course_files），
+这里只负责写入、去重和删除。
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import uuid
+
+BLOB_NAME = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]{1,10})?$')
+_EXTENSION = re.compile(r'^\.[a-z0-9]{1,10}$')
+
+# 计算哈希时每次读取的字节数
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def blob_extension(filename):
+    """从原始文件名取扩展名（小写），不合法时返回空字符串"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if _EXTENSION.match(ext) else ''
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+        # 写入中的临时文件，以点开头的目录不会通过 /uploads 对外提供
+        self.partial_dir = os.path.join(root, '.partial')
+
+    def path_for(self, sha256, ext=''):
+        return os.path.join(self.root, sha256 + ext)
+
+    def is_blob(self, path):
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.root) \
+            and BLOB_NAME.match(os.path.basename(path)) is not None
+
+    def put_file(self, src_path, ext='', sha256=None, copy=False):
+        """把已有文件存入，返回blob路径
+
+        copy=False 时源文件被移动（内容已存在时直接删除源文件）；sha256 已知时不再重新计算。
+        """
+        sha256 = sha256 or file_sha256(src_path)
+        dest_path = self.path_for(sha256, ext)
+        if os.path.exists(dest_path):
+            if not copy:
+                os.remove(src_path)
+            return dest_path
+
+        # 先写到临时文件再原子改名，其它进程不会看到写了一半的blob
+        os.makedirs(self.partial_dir, exist_ok=True)
+        tmp_path = os.path.join(self.partial_dir, uuid.uuid4().hex)
+        if copy:
+            shutil.copyfile(src_path, tmp_path)
+        else:
+            shutil.move(src_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+        return dest_path
+
+    def put_stream(self, stream, ext=''):
+        """边写入临时文件边计算哈希（用于multipart上传的文件对象），返回blob路径"""
+        os.makedirs(self.partial_dir, exist_ok=True)
+        tmp_path = os.path.join(self.partial_dir, uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(HASH_BLOCK_SIZE), b''):
+                    hasher.update(block)
+                    f.write(block)
+            return self.put_file(tmp_path, ext, hasher.hexdigest())
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def list_blobs(self):
+        if not os.path.isdir(self.root):
+            return []
+        return [os.path.join(self.root, name) for name in os.listdir(self.root) if BLOB_NAME.match(name)]
+
+    def delete(self, path):
+        """删除blob，返回释放的字节数"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return 0
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+验证码图片池 - 后台线程预先生成验证码图片，请求线程只需取出一张
+
+每张图片只发放一次；答案仍写入共享状态（state_backend），任何worker都能校验。
+池中数量低于 low_water 时唤醒补充线程补到 size 张，集中注册时的突发请求由池中的图片承接，
+池被取空时才在请求线程中现场生成。gunicorn fork 出的worker不继承线程，
+补充线程在每个进程第一次使用时（或 post_fork 中调用 warm）启动，fork 前生成的图片会被丢弃，
+避免多个worker发出相同的验证码。
+"""
+
+import os
+import threading
+from collections import deque
+
+
+class CaptchaPool:
+
+    def __init__(self, generate, size=200, low_water=None):
+        self.generate = generate  # 返回 (验证码文本, 图片data URL)
+        self.size = size
+        self.low_water = size // 2 if low_water is None else low_water
+        self._items = deque()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._items = deque()
+                self._thread = None
+                self._pid = os.getpid()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._refill_loop, name='captcha-pool', daemon=True)
+                self._thread.start()
+
+    def _refill_loop(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while len(self._items) < self.size:
+                self._items.append(self.generate())
+                self.generated += 1
+
+    def warm(self):
+        """启动补充线程并开始填充（不等待填满）"""
+        if self.size <= 0:
+            return
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def take(self):
+        if self.size <= 0:
+            return self.generate()
+        self._ensure_worker()
+        try:
+            item = self._items.popleft()
+            self.hits += 1
+        except IndexError:
+            item = None
+            self.misses += 1
+        if len(self._items) < self.low_water:
+            self._wakeup.set()
+        return item if item is not None else self.generate()
+
+    def stats(self):
+        return {
+            'available': len(self._items),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'generated': self.generated,
+        }
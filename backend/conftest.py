@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+pytest 公共夹具 - 在导入 app 之前把数据库、共享状态和上传目录指向临时目录
+
+运行: cd backend && python -m pytest
+"""
+
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# test_api.py 是对运行中的服务器手动执行的脚本，不由 pytest 收集
+collect_ignore = ['test_api.py']
+
+scratch_dir = tempfile.mkdtemp(prefix='pytest_backend_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir, 'test.db')
+os.environ['STATE_BACKEND_URL'] = 'memory://'
+os.environ['SECRET_KEY'] = 'test-secret-key-for-pytest-only-0123456789'
+os.environ['AUDIO_SEGMENT_MODE'] = 'off'
+os.environ['CAPTCHA_POOL_SIZE'] = '0'
+# 测试中不需要抗暴力破解的哈希强度
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ.pop('SLOW_QUERY_MS', None)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app, init_database
+    application = create_app({
+        'UPLOAD_FOLDER': os.path.join(scratch_dir, 'uploads'),
+        'UPLOAD_SESSION_FOLDER': os.path.join(scratch_dir, 'incoming'),
+    })
+    with application.app_context():
+        init_database()
+    return application
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """创建用户并登录，返回 (用户ID, 请求头)"""
+    from app import db, User
+
+    def make(**fields):
+        username = f'user_{uuid.uuid4().hex[:12]}'
+        with app.app_context():
+            user = User(username=username, **fields)
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+        token = app.test_client().post('/api/login', json={'username': username, 'password': 'password'}) \
+            .get_json()['token']
+        return user_id, {'Authorization': f'Bearer {token}'}
+
+    return make
+
+
+@pytest.fixture
+def make_course(app):
+    """直接写库创建一门课程，cues 为 [(文本, 开始毫秒, 结束毫秒), ...]，返回 (课程ID, 句子ID列表)"""
+    from app import db, Course, Sentence, User, import_sentences
+
+    def make(cues, **fields):
+        with app.app_context():
+            admin_id = User.query.filter_by(is_admin=True).order_by(User.id).first().id
+            course = Course(title=fields.pop('title', 'Test course'), difficulty='normal', user_id=admin_id,
+                            **fields)
+            db.session.add(course)
+            db.session.flush()
+            import_sentences(course.id, cues)
+            db.session.commit()
+            sentence_ids = [sentence_id for (sentence_id,) in db.session.query(Sentence.id)
+                            .filter(Sentence.course_id == course.id).order_by(Sentence.start_ms, Sentence.id)]
+            return course.id, sentence_ids
+
+    return make
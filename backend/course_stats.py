@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+课程难度分析 - 根据字幕计算语速、词汇稀有度、句长分布和数值难度分
+
+导入字幕时（create_course / flask import-courses）边写入句子边统计，
+结果保存在 course_stats 表，课程列表按这些字段排序/过滤时不需要扫描句子。
+这里的函数不访问数据库，可以放在进程池中并行执行（见 flask backfill-course-stats）。
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+
+# 统计算法变化时加一，backfill 会重新计算旧版本的结果
+ANALYSIS_VERSION = 1
+
+# 句长分布的分桶上限（词数），最后一个桶为超过最大上限的句子
+LENGTH_BUCKETS = (5, 10, 15, 20)
+
+# 难度分：各项指标线性映射到 0~1（超出范围截断）后加权，得到 0~100 的分数
+# (指标, 最容易, 最难, 权重)
+SCORE_COMPONENTS = (
+    ('words_per_second', 1.5, 3.5, 0.45),
+    ('rare_word_ratio', 0.05, 0.30, 0.35),
+    ('avg_sentence_words', 5.0, 20.0, 0.20),
+)
+
+_TAG = re.compile(r'<[^>]+>|\{[^}]*\}')
+_WORD = re.compile(r"[A-Za-z]+(?:['’][A-Za-z]+)*|\d+(?:[.,]\d+)*")
+_WORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'common_words.txt')
+
+
+@lru_cache(maxsize=1)
+def common_words():
+    with open(_WORDS_FILE, 'r', encoding='utf-8') as f:
+        return frozenset(line.strip() for line in f if line.strip() and not line.startswith('#'))
+
+
+def _lemma_candidates(word, depth=2):
+    """单词及其可能的原形（去掉 -s/-es/-ed/-ing/-ly/-er/-est 等词尾，最多两层：learners -> learner -> learn）"""
+    yield word
+    if depth == 0:
+        return
+    for suffix, replacements in (('ies', ('y',)), ('ied', ('y',)), ('es', ('', 'e')), ('s', ('',)),
+                                 ('ing', ('', 'e')), ('ed', ('', 'e')), ('ly', ('',)),
+                                 ('er', ('', 'e')), ('est', ('', 'e'))):
+        if len(word) > len(suffix) + 1 and word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            for replacement in replacements:
+                yield from _lemma_candidates(stem + replacement, depth - 1)
+            # stopped -> stop, bigger -> big
+            if len(stem) > 2 and stem[-1] == stem[-2]:
+                yield stem[:-1]
+            return
+
+
+@lru_cache(maxsize=65536)
+def is_common_word(word):
+    """word 为小写单词；缩写按撇号前的部分查找（I'm -> i, don't -> don）"""
+    words = common_words()
+    word = word.replace('’', "'")
+    base = word.split("'", 1)[0]
+    return any(candidate in words for candidate in _lemma_candidates(base))
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def difficulty_score(metrics):
+    score = 0.0
+    for name, easy, hard, weight in SCORE_COMPONENTS:
+        value = (metrics[name] - easy) / (hard - easy)
+        score += weight * min(1.0, max(0.0, value))
+    return round(score * 100, 1)
+
+
+class CourseAnalyzer:
+    """逐条累加字幕，内存中只保留每句的词数和去重词表"""
+
+    def __init__(self):
+        self.sentence_words = []
+        self.word_count = 0
+        self.vocabulary = set()
+        self.rated_words = 0   # 参与稀有度统计的词数（不含数字和人名）
+        self.rare_words = 0
+        self.speech_ms = 0
+        self.first_ms = None
+        self.last_ms = 0
+
+    def add(self, text, start_ms, end_ms):
+        tokens = _WORD.findall(_TAG.sub(' ', text or ''))
+        self.sentence_words.append(len(tokens))
+        self.word_count += len(tokens)
+        for position, token in enumerate(tokens):
+            if token[0].isdigit():
+                continue
+            word = token.lower()
+            self.vocabulary.add(word)
+            if is_common_word(word):
+                self.rated_words += 1
+            elif position == 0 or not token[0].isupper():
+                # 句中大写开头的生词多为人名/地名，不计入稀有度
+                self.rated_words += 1
+                self.rare_words += 1
+
+        if end_ms > start_ms:
+            self.speech_ms += end_ms - start_ms
+        if self.first_ms is None or start_ms < self.first_ms:
+            self.first_ms = start_ms
+        self.last_ms = max(self.last_ms, end_ms)
+
+    def observe(self, cues):
+        """包装 (文本, 开始毫秒, 结束毫秒) 迭代器，转交给 import_sentences 的同时统计"""
+        for cue in cues:
+            self.add(*cue)
+            yield cue
+
+    def result(self):
+        """返回统计结果字典（对应 course_stats 表的列），没有句子时返回 None"""
+        if not self.sentence_words:
+            return None
+        lengths = sorted(self.sentence_words)
+        histogram = [0] * (len(LENGTH_BUCKETS) + 1)
+        for length in lengths:
+            histogram[next((i for i, limit in enumerate(LENGTH_BUCKETS) if length <= limit), len(LENGTH_BUCKETS))] += 1
+
+        # 语速按字幕实际覆盖的时间计算，不含句间停顿
+        metrics = {
+            'analysis_version': ANALYSIS_VERSION,
+            'sentence_count': len(lengths),
+            'word_count': self.word_count,
+            'unique_words': len(self.vocabulary),
+            'duration_seconds': round((self.last_ms - self.first_ms) / 1000, 3),
+            'speech_seconds': round(self.speech_ms / 1000, 3),
+            'words_per_second': round(self.word_count / (self.speech_ms / 1000), 3) if self.speech_ms else 0.0,
+            'rare_word_ratio': round(self.rare_words / self.rated_words, 4) if self.rated_words else 0.0,
+            'avg_sentence_words': round(self.word_count / len(lengths), 2),
+            'sentence_words_p50': _percentile(lengths, 0.5),
+            'sentence_words_p90': _percentile(lengths, 0.9),
+            'sentence_words_max': lengths[-1],
+            'length_histogram': json.dumps(histogram),
+        }
+        metrics['difficulty_score'] = difficulty_score(metrics)
+        return metrics
+
+
+def analyze_cues(cues):
+    """一次性计算 [(文本, 开始毫秒, 结束毫秒), ...] 的统计结果（进程池中执行）"""
+    analyzer = CourseAnalyzer()
+    for cue in cues:
+        analyzer.add(*cue)
+    return analyzer.result()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+听写答案检查 - 文本规范化和按词的编辑距离比对
+
+句子写入数据库时预先计算规范化后的词序列（Sentence.normalized_text，空格分隔），
+检查答案时只需规范化用户输入，再做一次词级编辑距离并回溯出逐词差异。
+规范化规则：
+- 大小写、标点、重音符号、弯引号统一（café -> cafe，well-known -> well known）
+- 缩写展开：don't -> do not，I'm -> i am，we'll -> we will，gonna -> going to；
+  's 只在代词等后面展开为 is（it's -> it is），其它撇号去掉（john's -> johns）
+- 数字转为英文单词：25 -> twenty five，3rd -> third，1,000 -> one thousand，
+  3.5 -> three point five，50% -> fifty percent，$5 -> five dollars
+拼写相近的词（recieve / receive）算作拼写错误，只扣半个词的分。
+这里的函数不访问数据库。
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# 拼写错误（字符编辑距离不超过阈值）的代价，其余错误每个词记1
+TYPO_COST = 0.5
+
+_TAG = re.compile(r'<[^>]+>|\{[^}]*\}')
+_TOKEN = re.compile(r"\$?\d+(?:,\d{3})*(?:\.\d+)?(?:st|nd|rd|th|%)?|[^\W\d_]+(?:'[^\W\d_]+)*")
+_NUMBER = re.compile(r'(\$?)(\d+(?:,\d{3})*)(?:\.(\d+))?(st|nd|rd|th|%)?$')
+
+_ONES = ('zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen '
+         'sixteen seventeen eighteen nineteen').split()
+_TENS = 'zero ten twenty thirty forty fifty sixty seventy eighty ninety'.split()
+_SCALES = ((10 ** 12, 'trillion'), (10 ** 9, 'billion'), (10 ** 6, 'million'), (1000, 'thousand'))
+_ORDINALS = {'one': 'first', 'two': 'second', 'three': 'third', 'five': 'fifth', 'eight': 'eighth',
+             'nine': 'ninth', 'twelve': 'twelfth'}
+_NUMBER_WORDS = frozenset(_ONES + _TENS + ['hundred'] + [name for _, name in _SCALES])
+
+_CONTRACTIONS = {
+    "won't": ('will', 'not'), "can't": ('can', 'not'), 'cannot': ('can', 'not'), "shan't": ('shall', 'not'),
+    "ain't": ('is', 'not'), "let's": ('let', 'us'), "y'all": ('you', 'all'),
+    'gonna': ('going', 'to'), 'wanna': ('want', 'to'), 'gotta': ('got', 'to'),
+    'kinda': ('kind', 'of'), 'sorta': ('sort', 'of'), 'ok': ('okay',),
+    # 输入时常省略撇号的缩写（its/were/well/id 等省略后与其它单词相同的不在此列）
+    'dont': ('do', 'not'), 'doesnt': ('does', 'not'), 'didnt': ('did', 'not'), 'isnt': ('is', 'not'),
+    'arent': ('are', 'not'), 'wasnt': ('was', 'not'), 'werent': ('were', 'not'), 'cant': ('can', 'not'),
+    'couldnt': ('could', 'not'), 'shouldnt': ('should', 'not'), 'wouldnt': ('would', 'not'),
+    'havent': ('have', 'not'), 'hasnt': ('has', 'not'), 'hadnt': ('had', 'not'), 'im': ('i', 'am'),
+    'ive': ('i', 'have'), 'youre': ('you', 'are'), 'theyre': ('they', 'are'), 'youve': ('you', 'have'),
+    'weve': ('we', 'have'), 'theyve': ('they', 'have'), 'youll': ('you', 'will'), 'theyll': ('they', 'will'),
+    'thats': ('that', 'is'), 'whats': ('what', 'is'), 'theres': ('there', 'is'),
+}
+_SUFFIXES = (("n't", 'not'), ("'re", 'are'), ("'ve", 'have'), ("'ll", 'will'), ("'m", 'am'), ("'d", 'would'))
+# 这些词后面的 's 是 is 的缩写，其它词后面按所有格处理
+_IS_CONTRACTION_STEMS = frozenset('he she it that what where who how there here this everyone everything '
+                                  'someone something nobody nothing'.split())
+
+
+def _hundreds_words(n):
+    words = []
+    if n >= 100:
+        words += [_ONES[n // 100], 'hundred']
+        n %= 100
+    if n >= 20:
+        words.append(_TENS[n // 10])
+        n %= 10
+        if n:
+            words.append(_ONES[n])
+    elif n or not words:
+        words.append(_ONES[n])
+    return words
+
+
+def number_words(n):
+    """非负整数的英文读法（不含 and）：1205 -> one thousand two hundred five"""
+    if n < 1000:
+        return _hundreds_words(n)
+    words = []
+    for scale, name in _SCALES:
+        if n >= scale:
+            words += number_words(n // scale) + [name]
+            n %= scale
+    if n:
+        words += _hundreds_words(n)
+    return words
+
+
+def _ordinal(words):
+    last = words[-1]
+    if last in _ORDINALS:
+        last = _ORDINALS[last]
+    elif last.endswith('y'):
+        last = last[:-1] + 'ieth'
+    else:
+        last += 'th'
+    return words[:-1] + [last]
+
+
+def _expand_number(token):
+    match = _NUMBER.match(token)
+    if match is None:
+        return (token,)
+    currency, integer, fraction, suffix = match.groups()
+    words = number_words(int(integer.replace(',', '')))
+    if fraction:
+        words += ['point'] + [_ONES[int(digit)] for digit in fraction]
+    if suffix == '%':
+        words.append('percent')
+    elif suffix:
+        words = _ordinal(words)
+    if currency:
+        words.append('dollars')
+    return tuple(words)
+
+
+@lru_cache(maxsize=65536)
+def _normalize_token(token):
+    """单个（已小写）词的规范化结果，返回词元组"""
+    if token[0].isdigit() or token[0] == '$':
+        return _expand_number(token)
+    if token in _CONTRACTIONS:
+        return _CONTRACTIONS[token]
+    if "'" in token:
+        for suffix, expansion in _SUFFIXES:
+            if token.endswith(suffix) and len(token) > len(suffix):
+                return (token[:-len(suffix)], expansion)
+        if token.endswith("'s") and token[:-2] in _IS_CONTRACTION_STEMS:
+            return (token[:-2], 'is')
+        # 其余撇号去掉，输入时省略撇号也算正确（john's -> johns，o'clock -> oclock）
+        return (token.replace("'", ''),)
+    return (token,)
+
+
+def _fold(text):
+    text = unicodedata.normalize('NFKC', _TAG.sub(' ', text)).lower()
+    text = text.replace('’', "'").replace('‘', "'").replace('`', "'")
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return text
+
+
+def normalize_tokens(text):
+    """把句子或用户输入转换为规范化的词列表"""
+    tokens = []
+    for token in _TOKEN.findall(_fold(text or '')):
+        tokens.extend(_normalize_token(token))
+    # one hundred and five -> one hundred five
+    if 'and' in tokens:
+        tokens = [token for i, token in enumerate(tokens)
+                  if not (token == 'and' and 0 < i < len(tokens) - 1
+                          and tokens[i - 1] in _NUMBER_WORDS and tokens[i + 1] in _NUMBER_WORDS)]
+    return tokens
+
+
+def normalize_text(text):
+    """规范化后的词用空格连接，保存在 Sentence.normalized_text"""
+    return ' '.join(normalize_tokens(text))
+
+
+@lru_cache(maxsize=65536)
+def is_typo(expected, actual):
+    """两个不同的词是否只是拼写错误：长度不小于4，字符编辑距离（相邻字母互换算一次）不超过1，8个字母以上不超过2"""
+    if len(expected) < 4 or len(actual) < 4:
+        return False
+    limit = 1 if len(expected) < 8 else 2
+    if abs(len(expected) - len(actual)) > limit:
+        return False
+    before, previous = None, list(range(len(actual) + 1))
+    for i, a in enumerate(expected, 1):
+        current = [i]
+        for j, b in enumerate(actual, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b))
+            if i > 1 and j > 1 and a == actual[j - 2] and expected[i - 2] == b:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+
+def diff_tokens(expected, actual):
+    """词级编辑距离，返回 (错误代价, 逐词差异)
+
+    差异为 [{'op': 'equal'|'typo'|'substitute'|'missing'|'extra', 'expected': ..., 'actual': ...}, ...]，
+    按句子顺序排列。相同的开头和结尾先去掉，只对中间不同的部分做动态规划。
+    """
+    start = 0
+    while start < len(expected) and start < len(actual) and expected[start] == actual[start]:
+        start += 1
+    end_e, end_a = len(expected), len(actual)
+    while end_e > start and end_a > start and expected[end_e - 1] == actual[end_a - 1]:
+        end_e -= 1
+        end_a -= 1
+
+    head = [{'op': 'equal', 'expected': word, 'actual': word} for word in expected[:start]]
+    tail = [{'op': 'equal', 'expected': word, 'actual': word} for word in expected[end_e:]]
+    exp, act = expected[start:end_e], actual[start:end_a]
+    if not exp and not act:
+        return 0.0, head + tail
+
+    # cost[i][j]: exp[:i] 与 act[:j] 的最小代价
+    rows, cols = len(exp) + 1, len(act) + 1
+    cost = [[float(j) for j in range(cols)]]
+    for i in range(1, rows):
+        row = [float(i)]
+        previous = cost[i - 1]
+        word = exp[i - 1]
+        for j in range(1, cols):
+            other = act[j - 1]
+            if word == other:
+                substitution = previous[j - 1]
+            else:
+                substitution = previous[j - 1] + (TYPO_COST if is_typo(word, other) else 1.0)
+            row.append(min(substitution, previous[j] + 1.0, row[j - 1] + 1.0))
+        cost.append(row)
+
+    ops = []
+    i, j = len(exp), len(act)
+    while i > 0 or j > 0:
+        if i > 0 and j > 0:
+            word, other = exp[i - 1], act[j - 1]
+            if word == other:
+                step, op = 0.0, 'equal'
+            elif is_typo(word, other):
+                step, op = TYPO_COST, 'typo'
+            else:
+                step, op = 1.0, 'substitute'
+            if cost[i][j] == cost[i - 1][j - 1] + step:
+                ops.append({'op': op, 'expected': word, 'actual': other})
+                i -= 1
+                j -= 1
+                continue
+        if i > 0 and cost[i][j] == cost[i - 1][j] + 1.0:
+            ops.append({'op': 'missing', 'expected': exp[i - 1], 'actual': None})
+            i -= 1
+        else:
+            ops.append({'op': 'extra', 'expected': None, 'actual': act[j - 1]})
+            j -= 1
+    ops.reverse()
+    return cost[-1][-1], head + ops + tail
+
+
+def score_answer(expected, answer):
+    """expected 为预先规范化的词列表，answer 为用户输入的原文
+
+    返回 {'score': 0~100, 'correct': 只有拼写错误或完全正确, 'exact': 完全正确, 'errors': 错误代价, 'diff': [...]}
+    """
+    errors, diff = diff_tokens(expected, normalize_tokens(answer))
+    return {
+        'score': round(max(0.0, 1 - errors / max(len(expected), 1)) * 100, 1),
+        'correct': all(item['op'] in ('equal', 'typo') for item in diff),
+        'exact': errors == 0,
+        'errors': errors,
+        'diff': diff,
+    }
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成数据集生成器 - 在临时目录中生成用于压测的数据库和字幕文件
+
+生成的内容：学习者用户（密码均为 password）、课程及其SRT字幕文件（句子由常用词和少量生词组成，
+经由与 import-courses 相同的解析/统计/写入流程导入）、课程进度、关卡完成记录和复习项。
+同样的参数和 --seed 生成完全相同的数据。目录中写入 bench.db、srt/ 和 dataset.json（规模和耗时）。
+
+用法: python gen_dataset.py <目录> [--scale small|medium|large] [--users N] [--courses N]
+      [--sentences-per-course N] [--progress-per-user N] [--reviews-per-user N] [--seed 42]
+large 约为 10万用户、5千门课程、200万个句子。
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import time
+
+# 预设规模：(用户数, 课程数, 每门课程句子数)
+SCALES = {
+    'small': (1000, 50, 100),
+    'medium': (20000, 500, 200),
+    'large': (100000, 5000, 400),
+}
+# 每关句子数（与前端划分关卡的方式一致）
+LEVEL_SIZE = 10
+INSERT_BATCH = 5000
+# 非常用词所占比例的范围，决定课程难度分的分布
+RARE_WORD_RATIO = (0.02, 0.3)
+
+
+def make_rare_words(rng, count=3000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(6, 12))) for _ in range(count)]
+
+
+def make_sentence(rng, common, rare, rare_ratio):
+    words = [rng.choice(rare) if rng.random() < rare_ratio else rng.choice(common)
+             for _ in range(max(2, int(rng.gauss(10, 4))))]
+    return ' '.join(words).capitalize() + rng.choice('..?!')
+
+
+def write_srt(path, sentences, rng):
+    """按语速 2~3.5 词/秒写出字幕，句间停顿 0.2~1.5 秒"""
+    def fmt(ms):
+        return f'{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}'
+
+    words_per_second = rng.uniform(2.0, 3.5)
+    position = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for index, text in enumerate(sentences, 1):
+            start = position + rng.randint(200, 1500)
+            end = start + int(len(text.split()) / words_per_second * 1000)
+            f.write(f'{index}\n{fmt(start)} --> {fmt(end)}\n{text}\n\n')
+            position = end
+
+
+def insert_rows(model, rows):
+    from app import db
+    insert = db.insert(model)
+    for i in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert, rows[i:i + INSERT_BATCH])
+
+
+def generate(directory, users, courses, sentences_per_course, progress_per_user=3, reviews_per_user=10, seed=42):
+    """生成数据集（调用前需把 DATABASE_URL 指向 <目录>/bench.db），返回 dataset.json 的内容"""
+    from werkzeug.security import generate_password_hash
+
+    from app import (app, db, User, Course, Sentence, UserProgress, LevelCompletion, ReviewItem,
+                     import_sentences, init_database, save_course_stats)
+    from course_stats import CourseAnalyzer, common_words
+    from srt_import import iter_srt_cues
+
+    rng = random.Random(seed)
+    srt_dir = os.path.join(directory, 'srt')
+    os.makedirs(srt_dir, exist_ok=True)
+    started = time.perf_counter()
+    now = datetime.datetime.utcnow()
+
+    with app.app_context():
+        init_database()
+        admin_id = User.query.filter_by(is_admin=True).order_by(User.id).first().id
+
+        # 所有用户共用一个密码哈希，逐个计算10万次哈希要花数小时
+        password_hash = generate_password_hash('password')
+        insert_rows(User, [{
+            'username': f'learner_{i:06d}', 'password_hash': password_hash,
+            'is_vip': rng.random() < 0.1, 'is_newbie': rng.random() < 0.2,
+            'hearts': rng.randint(0, 5), 'created_at': now - datetime.timedelta(days=rng.randint(0, 365)),
+        } for i in range(users)])
+        db.session.commit()
+        user_ids = [user_id for (user_id,) in
+                    db.session.query(User.id).filter(User.username.like('learner\\_%', escape='\\'))]
+
+        common = sorted(common_words())
+        rare = make_rare_words(rng)
+        course_sentences = {}
+        for i in range(courses):
+            rare_ratio = rng.uniform(*RARE_WORD_RATIO)
+            count = max(LEVEL_SIZE, int(rng.gauss(sentences_per_course, sentences_per_course / 4)))
+            srt_path = os.path.join(srt_dir, f'course_{i:05d}.srt')
+            write_srt(srt_path, [make_sentence(rng, common, rare, rare_ratio) for _ in range(count)], rng)
+            course = Course(title=f'Synthetic course {i + 1}', description='Generated for benchmarks',
+                            difficulty=rng.choice(['easy', 'normal', 'hard']), user_id=admin_id, srt_path=srt_path)
+            db.session.add(course)
+            db.session.flush()
+            analyzer = CourseAnalyzer()
+            course_sentences[course.id] = import_sentences(course.id, analyzer.observe(iter_srt_cues(srt_path)))
+            save_course_stats(course.id, analyzer.result())
+            if i % 50 == 49:
+                db.session.commit()
+        db.session.commit()
+
+        course_ids = list(course_sentences)
+        first_sentence = dict(db.session.query(Sentence.course_id, db.func.min(Sentence.id))
+                              .filter(Sentence.course_id.in_(course_ids)).group_by(Sentence.course_id))
+        progress, levels, reviews = [], [], []
+        for user_id in user_ids:
+            started_courses = rng.sample(course_ids, min(len(course_ids), rng.randint(0, 2 * progress_per_user)))
+            for course_id in started_courses:
+                level_count = course_sentences[course_id] // LEVEL_SIZE
+                done = rng.randint(0, level_count)
+                progress.append({'user_id': user_id, 'course_id': course_id, 'completed': done == level_count,
+                                 'completed_at': now if done == level_count else None})
+                levels.extend({'user_id': user_id, 'course_id': course_id, 'level_index': level}
+                              for level in range(done))
+            if started_courses:
+                course_id = started_courses[0]
+                offsets = rng.sample(range(course_sentences[course_id]),
+                                     min(course_sentences[course_id], rng.randint(0, 2 * reviews_per_user)))
+                reviews.extend({
+                    'user_id': user_id, 'sentence_id': first_sentence[course_id] + offset, 'course_id': course_id,
+                    'interval_days': rng.choice([0.0, 1.0, 6.0, 15.0]), 'repetitions': rng.randint(0, 3),
+                    'due_at': now + datetime.timedelta(hours=rng.uniform(-72, 240)), 'last_reviewed_at': now,
+                    'last_score': rng.uniform(20, 95),
+                } for offset in offsets)
+            if len(levels) >= 50 * INSERT_BATCH:
+                insert_rows(UserProgress, progress)
+                insert_rows(LevelCompletion, levels)
+                insert_rows(ReviewItem, reviews)
+                progress, levels, reviews = [], [], []
+        insert_rows(UserProgress, progress)
+        insert_rows(LevelCompletion, levels)
+        insert_rows(ReviewItem, reviews)
+        db.session.commit()
+
+        summary = {
+            'seed': seed,
+            'users': User.query.count(),
+            'courses': Course.query.count(),
+            'sentences': Sentence.query.count(),
+            'progress_rows': UserProgress.query.count(),
+            'level_completions': LevelCompletion.query.count(),
+            'review_items': ReviewItem.query.count(),
+            'generation_seconds': round(time.perf_counter() - started, 1),
+        }
+    with open(os.path.join(directory, 'dataset.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--courses', type=int)
+    parser.add_argument('--sentences-per-course', type=int)
+    parser.add_argument('--progress-per-user', type=int, default=3, help='每个用户平均开始学习的课程数')
+    parser.add_argument('--reviews-per-user', type=int, default=10, help='每个用户平均的复习项数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.directory)
+    if os.path.exists(os.path.join(directory, 'bench.db')):
+        parser.error(f'{directory} 中已有 bench.db')
+    os.makedirs(directory, exist_ok=True)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+    os.environ.setdefault('AUDIO_SEGMENT_MODE', 'off')
+
+    users, courses, sentences_per_course = SCALES[args.scale]
+    summary = generate(directory, args.users or users, args.courses or courses,
+                       args.sentences_per_course or sentences_per_course,
+                       args.progress_per_user, args.reviews_per_user, args.seed)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
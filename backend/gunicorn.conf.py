@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn配置 - 多worker部署
+
+启动: cd backend && gunicorn -c gunicorn.conf.py wsgi:app
+可用环境变量: WEB_CONCURRENCY（worker数）、GUNICORN_THREADS、BIND、
+DATABASE_URL、SECRET_KEY、STATE_BACKEND_URL、METRICS_TOKEN
+"""
+
+import multiprocessing
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = '-'
+
+# 多个worker之间必须共享验证码和缓存版本号，默认使用本地SQLite文件
+os.environ.setdefault('STATE_BACKEND_URL', 'sqlite:///' + os.path.join(basedir, 'instance', 'state.db'))
+
+
+def on_starting(server):
+    # 只在master中建表/写入默认数据一次，避免多个worker同时执行create_all
+    from app import app, db, init_database
+    with app.app_context():
+        init_database()
+        db.engine.dispose()
+
+
+def post_fork(server, worker):
+    # worker不能复用master中打开的数据库连接
+    from app import app, db, captcha_pool
+    with app.app_context():
+        db.engine.dispose(close=False)
+    # 每个worker启动后就在后台预先生成验证码图片
+    captcha_pool.warm()
+
+
+def worker_exit(server, worker):
+    # 退出（包括 max_requests 重启）前把本worker的请求指标并入共享状态中的累计值
+    from app import retire_worker_metrics
+    retire_worker_metrics()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+生命值恢复规则 - 纯函数，不访问数据库
+
+读取接口根据数据库中保存的状态和当前时间算出"现在应有的"心数，
+只有在真正修改心数（扣心/奖励）之前才把结果写回数据库。
+"""
+
+import datetime
+
+# 每小时恢复1颗心
+HEART_RECOVERY_INTERVAL = datetime.timedelta(hours=1)
+
+
+def regenerate_hearts(hearts, max_hearts, last_heart_update, last_daily_reset, now, today):
+    """返回 (hearts, last_heart_update, last_daily_reset)
+
+    - 跨天后心数重置为上限
+    - 否则每满一小时恢复1颗心，last_heart_update 按整小时前移，
+      未满一小时的进度保留，因此对同一状态重复计算结果不变
+    """
+    if last_daily_reset is None or last_daily_reset < today:
+        return max_hearts, now, today
+
+    if hearts >= max_hearts:
+        return hearts, last_heart_update, last_daily_reset
+
+    hearts_to_recover = int((now - last_heart_update) // HEART_RECOVERY_INTERVAL)
+    if hearts_to_recover <= 0:
+        return hearts, last_heart_update, last_daily_reset
+
+    return (min(max_hearts, hearts + hearts_to_recover),
+            last_heart_update + hearts_to_recover * HEART_RECOVERY_INTERVAL,
+            last_daily_reset)
+
+
+def next_recovery_time(hearts, max_hearts, last_heart_update):
+    if hearts >= max_hearts:
+        return None
+    return last_heart_update + HEART_RECOVERY_INTERVAL
+
+
+def seconds_until_change(hearts, max_hearts, last_heart_update, now, local_now):
+    """在没有其它修改的情况下，计算结果保持不变的秒数（下次恢复或次日重置）
+
+    now 为UTC时间（与 last_heart_update 一致），local_now 为本地时间（每日重置按本地日期）。
+    """
+    tomorrow = datetime.datetime.combine(local_now.date() + datetime.timedelta(days=1), datetime.time())
+    seconds = (tomorrow - local_now).total_seconds()
+    recovery_time = next_recovery_time(hearts, max_hearts, last_heart_update)
+    if recovery_time is not None:
+        seconds = min(seconds, (recovery_time - now).total_seconds())
+    return max(0, seconds)
@@ -1,11 +1,9 @@
-from app import app, db, User, Course, seed_data
-
-from app import app, db, User, Course, seed_data
+from app import app, db, User, Course, drop_search_index, init_database
 
 with app.app_context():
+    drop_search_index()
     db.drop_all()
-    db.create_all()
-    seed_data()
+    init_database()
     print('Database created and seeded successfully')
     print(f'Total users: {User.query.count()}')
     print(f'Total courses: {Course.query.count()}')
\ No newline at end of file
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多worker压测脚本 - 用不同的worker数启动gunicorn，比较吞吐量
+
+用法: python loadtest.py [--workers 1,2,4] [--concurrency 16] [--duration 10]
+使用临时数据库和临时共享状态文件，不会影响app.db。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+# 压测的接口组合：(路径, 是否需要登录)
+ENDPOINTS = [
+    ('/api/courses/all', False),
+    ('/api/captcha', False),
+    ('/api/courses/1/levels/completed', True),
+    ('/api/health', False),
+]
+
+
+def request(url, token=None, data=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+    req = urllib.request.Request(url, data=body, headers=headers)
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return response.status, response.read()
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            request(base_url + '/api/health')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def start_server(workers, port, scratch_dir, database_path=None):
+    env = dict(os.environ)
+    env.update({
+        'WEB_CONCURRENCY': str(workers),
+        'GUNICORN_THREADS': '1',
+        'BIND': f'127.0.0.1:{port}',
+        'DATABASE_URL': 'sqlite:///' + (database_path or os.path.join(scratch_dir, 'loadtest.db')),
+        'STATE_BACKEND_URL': 'sqlite:///' + os.path.join(scratch_dir, 'state.db'),
+    })
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=basedir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def run_load(base_url, token, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def worker(offset):
+        i = offset
+        local = []
+        local_errors = 0
+        while time.time() < deadline:
+            path, needs_token = ENDPOINTS[i % len(ENDPOINTS)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                request(base_url + path, token if needs_token else None)
+                local.append(time.perf_counter() - start)
+            except OSError:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for n in range(concurrency):
+            pool.submit(worker, n)
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    scratch_dir = tempfile.mkdtemp(prefix='loadtest_')
+    base_url = f'http://127.0.0.1:{args.port}'
+    results = []
+
+    for workers in [int(w) for w in args.workers.split(',')]:
+        server = start_server(workers, args.port, scratch_dir)
+        try:
+            wait_until_ready(base_url)
+            _, body = request(base_url + '/api/login', data={'username': 'default_user', 'password': 'password'})
+            token = json.loads(body)['token']
+            result = run_load(base_url, token, args.concurrency, args.duration)
+            result['workers'] = workers
+            results.append(result)
+            print(f"workers={workers:<3} rps={result['rps']:8.1f}  p50={result['p50_ms']:7.2f}ms  "
+                  f"p95={result['p95_ms']:7.2f}ms  errors={result['errors']}")
+        finally:
+            server.terminate()
+            server.wait()
+
+    if len(results) > 1:
+        base = results[0]['rps'] or 1
+        print('扩展倍数: ' + ', '.join(f"{r['workers']}w={r['rps'] / base:.2f}x" for r in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+请求指标 - 按路由统计延迟直方图、状态码、进行中的请求数以及每个请求的SQL语句数和耗时
+
+每个进程在内存中累计（一次加锁的字典更新），SQL语句通过 SQLAlchemy 引擎的游标事件计入
+当前请求（contextvars，后台线程和命令行中执行的SQL不计入）。
+多worker部署时各worker定期把快照写入共享状态，/api/metrics 合并所有worker的快照后
+按 Prometheus 文本格式输出（见 app.py 中的 publish_metrics）。
+"""
+
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 请求延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 每个请求SQL语句数直方图的桶上限
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# 当前请求的 [SQL语句数, SQL耗时秒数]，不在请求中时为 None
+_current_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+def _observe(histogram, buckets, value):
+    """histogram 为 [各桶计数..., 总和, 次数]，桶计数不累加（输出时再累加）"""
+    for i, limit in enumerate(buckets):
+        if value <= limit:
+            histogram[i] += 1
+            break
+    histogram[-2] += value
+    histogram[-1] += 1
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = {}       # (method, route, status) -> 次数
+        self.latency = {}        # (method, route) -> 直方图
+        self.queries = {}        # (method, route) -> 每个请求SQL语句数的直方图
+        self.query_seconds = {}  # (method, route) -> SQL总耗时
+        self.last_published = 0.0
+
+    def start_request(self):
+        """请求开始时调用，返回开始时间"""
+        with self._lock:
+            self.in_flight += 1
+        _current_request.set([0, 0.0])
+        return time.perf_counter()
+
+    def finish_request(self, method, route, status, started):
+        elapsed = time.perf_counter() - started
+        sql = _current_request.get() or [0, 0.0]
+        _current_request.set(None)
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            status_key = (method, route, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            if key not in self.latency:
+                self.latency[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+                self.queries[key] = [0] * (len(QUERY_COUNT_BUCKETS) + 1) + [0, 0]
+                self.query_seconds[key] = 0.0
+            _observe(self.latency[key], LATENCY_BUCKETS, elapsed)
+            _observe(self.queries[key], QUERY_COUNT_BUCKETS, sql[0])
+            self.query_seconds[key] += sql[1]
+
+    def snapshot(self):
+        """可JSON序列化的快照，用于跨worker合并"""
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'requests': [list(key) + [count] for key, count in self.requests.items()],
+                'latency': [list(key) + [list(value)] for key, value in self.latency.items()],
+                'queries': [list(key) + [list(value)] for key, value in self.queries.items()],
+                'query_seconds': [list(key) + [value] for key, value in self.query_seconds.items()],
+            }
+
+
+def merge_snapshots(snapshots):
+    merged = {'in_flight': 0, 'requests': {}, 'latency': {}, 'queries': {}, 'query_seconds': {}}
+    for snapshot in snapshots:
+        if not snapshot:
+            continue
+        merged['in_flight'] += snapshot.get('in_flight', 0)
+        for name in ('requests', 'query_seconds'):
+            for *key, value in snapshot.get(name, []):
+                key = tuple(key)
+                merged[name][key] = merged[name].get(key, 0) + value
+        for name in ('latency', 'queries'):
+            for *key, value in snapshot.get(name, []):
+                key = tuple(key)
+                if key in merged[name]:
+                    merged[name][key] = [a + b for a, b in zip(merged[name][key], value)]
+                else:
+                    merged[name][key] = list(value)
+    return {
+        'in_flight': merged['in_flight'],
+        'requests': [list(key) + [value] for key, value in merged['requests'].items()],
+        'latency': [list(key) + [value] for key, value in merged['latency'].items()],
+        'queries': [list(key) + [value] for key, value in merged['queries'].items()],
+        'query_seconds': [list(key) + [value] for key, value in merged['query_seconds'].items()],
+    }
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _render_histogram(lines, name, help_text, buckets, series):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for method, route, histogram in sorted(series):
+        cumulative = 0
+        for limit, count in zip(list(buckets) + ['+Inf'], histogram[:-2]):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(method=method, route=route, le=limit)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(method=method, route=route)} {histogram[-2]}')
+        lines.append(f'{name}_count{_labels(method=method, route=route)} {histogram[-1]}')
+
+
+def render_prometheus(snapshot):
+    """按 Prometheus 文本格式（0.0.4）输出快照"""
+    lines = [
+        '# HELP http_requests_in_flight Requests currently being handled',
+        '# TYPE http_requests_in_flight gauge',
+        f"http_requests_in_flight {snapshot['in_flight']}",
+        '# HELP http_requests_total Requests by route and status',
+        '# TYPE http_requests_total counter',
+    ]
+    for method, route, status, count in sorted(snapshot['requests']):
+        lines.append(f'http_requests_total{_labels(method=method, route=route, status=status)} {count}')
+    _render_histogram(lines, 'http_request_duration_seconds', 'Request latency by route',
+                      LATENCY_BUCKETS, snapshot['latency'])
+    _render_histogram(lines, 'db_queries_per_request', 'SQL statements executed per request',
+                      QUERY_COUNT_BUCKETS, snapshot['queries'])
+    lines.append('# HELP db_query_duration_seconds_total Time spent in SQL statements by route')
+    lines.append('# TYPE db_query_duration_seconds_total counter')
+    for method, route, seconds in sorted(snapshot['query_seconds']):
+        lines.append(f'db_query_duration_seconds_total{_labels(method=method, route=route)} {seconds:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current_request.get() is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    current = _current_request.get()
+    if started is not None and current is not None:
+        current[0] += 1
+        current[1] += time.perf_counter() - started
+
+
+def register_sql_metrics():
+    """统计所有引擎上执行的SQL（与 db_config.register_sqlite_pragmas 一样在Engine类上注册）"""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
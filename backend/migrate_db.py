@@ -8,9 +8,12 @@ import sqlite3
 import os
 from datetime import datetime
 
-def migrate_database():
-    """迁移数据库，添加新字段"""
-    db_path = os.path.join(os.path.dirname(__file__), 'app.db')
+from search_index import REBUILD_STATEMENT as SEARCH_INDEX_REBUILD, ensure_search_index
+from dictation import normalize_text
+
+def migrate_database(db_path=None):
+    """迁移数据库，添加新字段（db_path 默认为 backend/app.db）"""
+    db_path = db_path or os.path.join(os.path.dirname(__file__), 'app.db')
     
     # 如果数据库不存在，直接返回
     if not os.path.exists(db_path):
@@ -43,6 +46,73 @@ def migrate_database():
                 except sqlite3.OperationalError as e:
                     print(f"添加字段 {field_name} 失败: {e}")
         
+        # 课程表：句子音频切片状态
+        cursor.execute("PRAGMA table_info(course)")
+        course_columns = [column[1] for column in cursor.fetchall()]
+        for field_name, field_type in {'segments_status': 'VARCHAR(20)', 'segments_error': 'TEXT',
+                                       'segments_started_at': 'DATETIME'}.items():
+            if field_name not in course_columns:
+                try:
+                    cursor.execute(f"ALTER TABLE course ADD COLUMN {field_name} {field_type}")
+                    print(f"已添加字段: course.{field_name}")
+                except sqlite3.OperationalError as e:
+                    print(f"添加字段 course.{field_name} 失败: {e}")
+        
+        # 句子时间改为整数毫秒（start_ms/end_ms）。SQLite不能修改列类型，需要重建表；
+        # 旧表的时间可能是VARCHAR保存的秒数字符串，也可能是FLOAT秒数；
+        # 旧表允许时间为空，新列是NOT NULL，空的开始时间按0处理，空的结束时间取开始时间
+        cursor.execute("PRAGMA table_info(sentence)")
+        sentence_columns = [column[1] for column in cursor.fetchall()]
+        sentence_rebuilt = False
+        if 'start_time' in sentence_columns and 'start_ms' not in sentence_columns:
+            missing = cursor.execute(
+                "SELECT COUNT(*) FROM sentence WHERE start_time IS NULL OR end_time IS NULL").fetchone()[0]
+            cursor.executescript("""
+                CREATE TABLE sentence_new (
+                    id INTEGER NOT NULL PRIMARY KEY,
+                    course_id INTEGER NOT NULL REFERENCES course (id),
+                    text TEXT NOT NULL,
+                    start_ms INTEGER NOT NULL,
+                    end_ms INTEGER NOT NULL,
+                    audio_segment_path VARCHAR(200)
+                );
+                INSERT INTO sentence_new (id, course_id, text, start_ms, end_ms, audio_segment_path)
+                    SELECT id, course_id, text,
+                           COALESCE(CAST(ROUND(CAST(start_time AS REAL) * 1000) AS INTEGER), 0),
+                           COALESCE(CAST(ROUND(CAST(end_time AS REAL) * 1000) AS INTEGER),
+                                    CAST(ROUND(CAST(start_time AS REAL) * 1000) AS INTEGER), 0),
+                           audio_segment_path
+                    FROM sentence;
+                DROP TABLE sentence;
+                ALTER TABLE sentence_new RENAME TO sentence;
+            """)
+            print("已将句子时间转换为整数毫秒")
+            if missing:
+                print(f"{missing} 个句子缺少开始/结束时间，已按0秒（或开始时间）填充，请检查对应课程的字幕")
+            sentence_rebuilt = True
+        
+        # 按课程和开始时间查找句子的索引，同时覆盖只按course_id的查询
+        cursor.execute("DROP INDEX IF EXISTS ix_sentence_course_id")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_sentence_course_start ON sentence (course_id, start_ms)")
+        
+        # 听写检查用的规范化文本，为已有句子补算
+        cursor.execute("PRAGMA table_info(sentence)")
+        if 'normalized_text' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE sentence ADD COLUMN normalized_text TEXT")
+            print("已添加字段: sentence.normalized_text")
+        rows = cursor.execute("SELECT id, text FROM sentence WHERE normalized_text IS NULL").fetchall()
+        if rows:
+            cursor.executemany("UPDATE sentence SET normalized_text = ? WHERE id = ?",
+                               [(normalize_text(text), sentence_id) for sentence_id, text in rows])
+            print(f"已为 {len(rows)} 个句子计算规范化文本")
+        
+        # 句子全文索引；重建过sentence表时触发器随旧表一起删除，需要重新建立并重建索引
+        if ensure_search_index(cursor.execute):
+            print("已创建句子全文索引")
+        elif sentence_rebuilt:
+            cursor.execute(SEARCH_INDEX_REBUILD)
+            print("已重建句子全文索引")
+        
         # 更新现有用户的默认值
         current_time = datetime.utcnow().isoformat()
         cursor.execute("""
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+密码哈希线程池 - 限制同时计算密码哈希的数量，排队过多时直接拒绝
+
+Werkzeug 的 scrypt/pbkdf2 每次要耗时上百毫秒的CPU（计算时释放GIL），集中登录时如果在请求线程里直接计算，
+所有请求线程都会被占满，生命值等轻量接口也跟着排队。这里把哈希计算交给固定大小的线程池，
+排队中+计算中的任务数达到上限时抛出 HashingBusy，由接口快速返回503和 Retry-After。
+上限由 hash_limits 按每个进程的请求线程数计算：等待哈希的请求最多占用 请求线程数-1 个线程，
+始终留一个请求线程处理其它接口。
+哈希参数可配置，needs_rehash 判断已保存的哈希是否使用了旧参数，登录成功时据此透明地重新计算。
+"""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """哈希线程池已满，retry_after 为建议的重试秒数"""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing is busy')
+        self.retry_after = retry_after
+
+
+def hash_limits(request_threads, workers=None, max_queue=None):
+    """返回 (哈希线程数, 排队上限)，两者之和不超过 request_threads - 1（单线程时为1）
+
+    workers 默认为CPU核数（哈希是CPU计算，线程再多也不会更快），max_queue 默认用满剩余的名额；
+    显式配置的值超出名额时被截断。
+    """
+    capacity = max(1, request_threads - 1)
+    workers = min(workers or os.cpu_count() or 1, capacity)
+    remaining = capacity - workers
+    return workers, remaining if max_queue is None else min(max_queue, remaining)
+
+
+class PasswordHasher:
+
+    def __init__(self, method='scrypt', workers=1, max_queue=0):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        # 完整的参数前缀（如 scrypt:32768:8:1），同时校验配置的方法是否可用
+        self.prefix = generate_password_hash('', method).split('$', 1)[0]
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._avg_seconds = 0.1  # 单次哈希耗时的滑动平均，用于估算 Retry-After
+        self.completed = 0
+        self.rejected = 0
+
+    def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HashingBusy(max(1, math.ceil(self._pending / self.workers * self._avg_seconds)))
+            self._pending += 1
+            if self._pid != os.getpid():
+                # gunicorn fork 出的worker不继承线程池中的线程，在每个进程中重新创建
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                self._pid = os.getpid()
+            executor = self._executor
+        try:
+            return executor.submit(self._timed, func, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _timed(self, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._avg_seconds = 0.9 * self._avg_seconds + 0.1 * elapsed
+            self.completed += 1
+        return result
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.prefix,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'pending': self._pending,
+                'avg_ms': round(self._avg_seconds * 1000, 1),
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
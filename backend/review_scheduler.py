@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+间隔重复复习调度 - SM-2 算法和每日复习量均衡
+
+每次听写检查的结果换算为 0~5 的回忆质量，按 SM-2 更新复习项的难度系数（ease）、
+间隔天数和下次复习时间；答错的句子在 RELEARN_MINUTES 分钟后重新出现。
+balance_due_dates 由每晚的批处理任务调用，把超出每日上限的复习项顺延到之后的日子。
+这里的函数不访问数据库，时间均为UTC的naive datetime（与数据库中的其它时间一致）。
+"""
+
+from datetime import timedelta
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# 答错后重新学习的间隔
+RELEARN_MINUTES = 10
+# 间隔天数上限
+MAX_INTERVAL_DAYS = 365
+
+
+def answer_quality(result):
+    """把 dictation.score_answer 的结果换算为 SM-2 的回忆质量（0~5，3及以上为记住）"""
+    if result['exact']:
+        return 5
+    if result['correct']:
+        return 4
+    score = result['score']
+    if score >= 80:
+        return 3
+    if score >= 50:
+        return 2
+    return 1 if score > 0 else 0
+
+
+def sm2_update(ease, interval_days, repetitions, quality, now):
+    """返回 (ease, interval_days, repetitions, due_at)"""
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return ease, 0.0, 0, now + timedelta(minutes=RELEARN_MINUTES)
+    if repetitions == 0:
+        interval_days = 1.0
+    elif repetitions == 1:
+        interval_days = 6.0
+    else:
+        interval_days = min(MAX_INTERVAL_DAYS, round(interval_days * ease, 2))
+    return ease, interval_days, repetitions + 1, now + timedelta(days=interval_days)
+
+
+def balance_due_dates(items, now, daily_limit, horizon_days):
+    """均衡一个用户未来 horizon_days 天的复习量
+
+    items 为该用户 due_at 早于 now + horizon_days 的 [(id, due_at, interval_days), ...]。
+    按UTC日期分天（已过期的算作今天），每天最多 daily_limit 项；超出的项中间隔最长
+    （记得最牢）的顺延到下一天，时刻不变，再与下一天的项一起计算。同一天内重复运行结果不变。
+    返回需要修改的 [(id, new_due_at), ...]。
+    """
+    one_day = timedelta(days=1)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = [[] for _ in range(horizon_days)]
+    for item in items:
+        day = max(0, (item[1] - today) // one_day)
+        if day < horizon_days:
+            days[day].append(item)
+
+    moved = {}
+    carry = []
+    for day, bucket in enumerate(days):
+        bucket.extend(carry)
+        carry = []
+        if len(bucket) <= daily_limit:
+            continue
+        # 间隔短（刚学或刚答错）的优先保留在当天
+        bucket.sort(key=lambda item: (item[2], item[1]))
+        for item_id, due_at, interval in bucket[daily_limit:]:
+            due_at = today + (day + 1) * one_day + (due_at - today) % one_day
+            moved[item_id] = due_at
+            carry.append((item_id, due_at, interval))
+    return list(moved.items())
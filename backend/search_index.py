@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+句子全文索引 - SQLite FTS5
+
+sentence_fts 是以 sentence 表为内容表的外部内容FTS5表，只保存倒排索引，不重复保存文本；
+额外的2、3字符前缀索引让边输入边搜索的短前缀查询不必合并大量词条。
+sentence 表上的触发器在插入/删除/修改句子时同步更新索引，创建课程（批量插入）、
+删除课程和删除用户都不需要额外处理。
+app.py（init_database）和 migrate_db.py 共用这里的建表语句。
+"""
+
+import html
+import re
+
+FTS_TABLE = 'sentence_fts'
+
+# snippet() 中用 char(2)/char(3) 标记命中的词，转义HTML后再替换为 <mark>
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+CREATE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='sentence', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS sentence_fts_insert AFTER INSERT ON sentence BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS sentence_fts_delete AFTER DELETE ON sentence BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS sentence_fts_update AFTER UPDATE OF text ON sentence BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+DROP_STATEMENTS = [
+    'DROP TRIGGER IF EXISTS sentence_fts_insert',
+    'DROP TRIGGER IF EXISTS sentence_fts_delete',
+    'DROP TRIGGER IF EXISTS sentence_fts_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+REBUILD_STATEMENT = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+
+def ensure_search_index(execute):
+    """创建索引表和触发器；execute(sql) 执行一条SQL并返回可 fetchall 的结果
+
+    索引表是新建的时候，从现有句子重建索引。返回是否新建。
+    """
+    exists = execute(f"SELECT name FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'").fetchall()
+    for statement in CREATE_STATEMENTS:
+        execute(statement)
+    if not exists:
+        execute(REBUILD_STATEMENT)
+    return not exists
+
+
+def build_match_query(query):
+    """把用户输入转换为安全的FTS5查询，没有可搜索的词时返回None
+
+    - 用双引号括起来的整句按短语搜索："quarterly report"
+    - 否则所有词都要出现，最后一个词按前缀匹配（边输入边搜索）
+    """
+    query = (query or '').strip()
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    if len(query) > 1 and query.startswith('"') and query.endswith('"'):
+        return '"' + ' '.join(terms) + '"'
+    return ' '.join(f'"{term}"' for term in terms[:-1]) + (' ' if len(terms) > 1 else '') + f'"{terms[-1]}"*'
+
+
+def highlight(snippet):
+    """转义snippet中的HTML，命中的词用 <mark> 标出"""
+    return html.escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+课程句子缓存 - 进程内LRU缓存，按课程ID保存已序列化的句子JSON
+
+缓存条目记录SRT文件的修改时间，文件被替换后自动失效；
+课程更新或删除时由接口显式调用 invalidate；多worker部署时，调用方传入
+共享的版本号，其它worker发现版本号变化后同样会丢弃旧条目。
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class SentenceCacheEntry:
+    __slots__ = ('body', 'etag', 'srt_path', 'srt_mtime', 'version')
+
+    def __init__(self, body, srt_path=None, srt_mtime=None, version=0):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()
+        self.srt_path = srt_path
+        self.srt_mtime = srt_mtime
+        self.version = version
+
+
+def _srt_mtime(srt_path):
+    if not srt_path:
+        return None
+    try:
+        return os.stat(srt_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SentenceCache:
+    """有内存上限的LRU缓存，max_bytes 按JSON正文字节数计算"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, course_id, version=0):
+        with self._lock:
+            entry = self._entries.get(course_id)
+            if entry is not None and (entry.version != version or
+                                      entry.srt_path and _srt_mtime(entry.srt_path) != entry.srt_mtime):
+                # 课程已在其它worker中更新，或SRT文件已被修改，丢弃旧条目
+                self._remove(course_id)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(course_id)
+            self.hits += 1
+            return entry
+
+    def put(self, course_id, body, srt_path=None, version=0):
+        entry = SentenceCacheEntry(body, srt_path, _srt_mtime(srt_path), version)
+        if len(body) > self.max_bytes:
+            return entry
+
+        with self._lock:
+            if course_id in self._entries:
+                self._remove(course_id)
+            self._entries[course_id] = entry
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, course_id):
+        with self._lock:
+            if course_id in self._entries:
+                self._remove(course_id)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, course_id):
+        entry = self._entries.pop(course_id)
+        self._size -= len(entry.body)
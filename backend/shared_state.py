@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+跨进程共享状态 - 验证码、缓存版本号、计数器等需要在多个worker之间共享的数据
+
+通过 STATE_BACKEND_URL 选择实现：
+- memory://                  进程内字典，仅适用于单进程开发服务器
+- sqlite:////path/state.db   本地SQLite文件，多个worker共享，无需Redis
+"""
+
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def _decode(value):
+    # incr 写入的是整数，其余值以JSON文本保存
+    return value if isinstance(value, (int, float)) else json.loads(value)
+
+
+class MemoryStateBackend:
+    """进程内实现，接口与 SQLiteStateBackend 相同
+
+    带过期时间的键同时放入按过期时间排序的堆，每次写入时从堆顶删除已过期的键，
+    从不被读取的验证码等数据也会被及时清理，每次清理的代价为 O(log n)。
+    """
+
+    def __init__(self):
+        self.url = 'memory://'
+        self._data = {}
+        self._expiry = []  # [(过期时间, 键)]
+        self._lock = threading.Lock()
+
+    def _purge_expired(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            item = self._data.get(key)
+            # 键可能已被重新写入，只删除过期时间相同的那一份
+            if item is not None and item[1] == expires_at:
+                del self._data[key]
+
+    def _store(self, key, value, expires_at, now):
+        self._purge_expired(now)
+        self._data[key] = (value, expires_at)
+        if expires_at is not None:
+            heapq.heappush(self._expiry, (expires_at, key))
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.time())
+            return item[0] if item else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            now = time.time()
+            self._store(key, value, now + ttl if ttl else None, now)
+
+    def pop(self, key):
+        """读取并删除，用于验证码这类只能使用一次的数据"""
+        with self._lock:
+            item = self._live(key, time.time())
+            if item is None:
+                return None
+            del self._data[key]
+            return item[0]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = time.time()
+            item = self._live(key, now)
+            if item is None:
+                item = (0, now + ttl if ttl else None)
+            value = item[0] + amount
+            if key in self._data:
+                # 已有的键过期时间不变，堆中已有记录
+                self._data[key] = (value, item[1])
+            else:
+                self._store(key, value, item[1], now)
+            return value
+
+    def count(self, prefix):
+        with self._lock:
+            now = time.time()
+            return sum(1 for key in list(self._data) if key.startswith(prefix) and self._live(key, now))
+
+    def items(self, prefix):
+        with self._lock:
+            now = time.time()
+            return {key: self._data[key][0] for key in list(self._data) if key.startswith(prefix) and self._live(key, now)}
+
+
+class SQLiteStateBackend:
+    """基于本地SQLite文件的实现，同一台机器上的所有worker共享一个文件"""
+
+    # 每写入多少次顺带清理一次过期数据
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.url = 'sqlite:///' + path
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS state ('
+            'key TEXT PRIMARY KEY, value, expires_at REAL)'
+        )
+        # 清理过期数据时按索引只访问已过期的行，不扫描全表
+        conn.execute('CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)')
+
+    def _conn(self):
+        if self._pid != os.getpid():
+            # fork之后不能沿用父进程的连接
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _after_write(self, conn):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())
+        ).fetchone()
+        return _decode(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, json.dumps(value), time.time() + ttl if ttl else None)
+        )
+        self._after_write(conn)
+
+    def pop(self, key):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())
+            ).fetchone()
+            conn.execute('DELETE FROM state WHERE key = ?', (key,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return _decode(row[0]) if row else None
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM state WHERE key = ?', (key,))
+
+    def incr(self, key, amount=1, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 已过期的计数器从头开始计数
+            conn.execute(
+                'INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'value = CASE WHEN expires_at IS NOT NULL AND expires_at <= ? '
+                'THEN excluded.value ELSE value + excluded.value END, '
+                'expires_at = CASE WHEN expires_at IS NOT NULL AND expires_at <= ? '
+                'THEN excluded.expires_at ELSE expires_at END',
+                (key, amount, expires_at, now, now)
+            )
+            value = conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._after_write(conn)
+        return int(value)
+
+    def count(self, prefix):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM state WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)',
+            (prefix, prefix + '\uffff', time.time())
+        ).fetchone()[0]
+
+    def items(self, prefix):
+        rows = self._conn().execute(
+            'SELECT key, value FROM state WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)',
+            (prefix, prefix + '\uffff', time.time())
+        ).fetchall()
+        return {key: _decode(value) for key, value in rows}
+
+
+def create_state_backend(url):
+    if url == 'memory://':
+        return MemoryStateBackend()
+    if url.startswith('sqlite:///'):
+        return SQLiteStateBackend(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported STATE_BACKEND_URL: {url}')
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+慢查询记录 - 记录执行时间超过阈值的SQL语句及其执行计划（默认关闭，SLOW_QUERY_MS 大于0时开启）
+
+通过 SQLAlchemy 引擎的游标事件计时。超过阈值的语句把字面量替换为 ? 后作为指纹，
+按（指纹, 来源路由）聚合次数、总耗时和最长耗时，写入共享状态（state_backend），
+所有worker和命令行看到同一份汇总。每个指纹第一次出现时在同一连接上执行
+EXPLAIN QUERY PLAN（仅SQLite），计划中没有使用索引的 SCAN 单独列出，方便找出全表扫描。
+"""
+
+import hashlib
+import re
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+KEY_PREFIX = 'slowq:'
+# 执行 EXPLAIN QUERY PLAN 的语句（INSERT 的计划没有参考价值，且批量插入的参数与语句不是一一对应）
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \(\?(?:, \?)*\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(statement):
+    """把字符串/数字字面量替换为 ?，IN (?, ?, ...) 合并为 IN (...)，压缩空白"""
+    sql = _SPACE_RE.sub(' ', statement).strip()
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+def explain_query_plan(dbapi_connection, statement, parameters):
+    """在同一个DBAPI连接上执行 EXPLAIN QUERY PLAN，返回按层级缩进的计划行"""
+    cursor = dbapi_connection.cursor()
+    try:
+        rows = cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+    finally:
+        cursor.close()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def table_scans(plan):
+    """计划中没有使用索引的全表扫描"""
+    return [line.strip() for line in plan or []
+            if line.strip().startswith('SCAN ') and 'INDEX' not in line and 'CONSTANT ROW' not in line]
+
+
+class SlowQueryRecorder:
+
+    def __init__(self, store, threshold_ms=0, explain=True, ttl=7 * 24 * 3600, route=None, logger=None):
+        self.store = store            # 共享状态，见 shared_state.py
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.ttl = ttl
+        self.route = route or (lambda: '-')  # 返回当前来源（路由）的函数
+        self.logger = logger
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    def register(self):
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.threshold_ms > 0 and context is not None:
+            context._slow_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_slow_query_started', None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+        try:
+            self.record(conn, statement, parameters[0] if executemany and parameters else parameters, elapsed_ms)
+        except Exception as e:
+            # 记录失败不能影响正在执行的请求
+            if self.logger:
+                self.logger.warning(f'Failed to record slow query: {e}')
+
+    def record(self, conn, statement, parameters, elapsed_ms):
+        sql = normalize_sql(statement)
+        route = self.route()
+        key = KEY_PREFIX + hashlib.sha1(f'{route}\n{sql}'.encode('utf-8')).hexdigest()
+        entry = self.store.get(key)
+        if entry is None:
+            plan = None
+            if self.explain and conn.dialect.name == 'sqlite' and sql.upper().startswith(EXPLAINABLE):
+                try:
+                    plan = explain_query_plan(conn.connection.dbapi_connection, statement, parameters)
+                except Exception as e:
+                    plan = [f'EXPLAIN failed: {e}']
+            entry = {'sql': sql, 'route': route, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'plan': plan}
+        # 各worker之间先读后写，并发时可能少计一次，对诊断用途足够
+        entry['count'] += 1
+        entry['total_ms'] = round(entry['total_ms'] + elapsed_ms, 3)
+        entry['max_ms'] = round(max(entry['max_ms'], elapsed_ms), 3)
+        entry['last_seen'] = time.time()
+        self.store.set(key, entry, ttl=self.ttl)
+        if self.logger:
+            self.logger.warning(f'Slow query {elapsed_ms:.1f}ms [{route}] {sql}')
+
+    def report(self, limit=20, sort='total'):
+        """按总耗时（total）、最长耗时（max）或次数（count）排序的前 limit 条"""
+        field = {'total': 'total_ms', 'max': 'max_ms', 'count': 'count'}[sort]
+        entries = sorted(self.store.items(KEY_PREFIX).values(), key=lambda e: e[field], reverse=True)[:limit]
+        return [dict(entry, avg_ms=round(entry['total_ms'] / entry['count'], 3), table_scans=table_scans(entry['plan']))
+                for entry in entries]
+
+    def reset(self):
+        keys = list(self.store.items(KEY_PREFIX))
+        for key in keys:
+            self.store.delete(key)
+        return len(keys)
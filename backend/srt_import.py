@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+字幕批量导入 - 解析SRT得到句子行，以及扫描目录中的 MP3+SRT 课程文件
+
+这里的函数不访问数据库，可以放在进程池中并行执行；
+写库由 app.py 中的 import_sentences / flask import-courses 完成。
+"""
+
+import os
+from datetime import timedelta
+
+import srt
+
+from blob_store import file_sha256
+from course_stats import analyze_cues
+
+
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def iter_srt_cues(path):
+    """逐条返回 (文本, 开始毫秒, 结束毫秒)，srt.parse 本身是生成器，不会一次生成全部对象"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        content = f.read()
+    for sub in srt.parse(content):
+        yield sub.content, sub.start // _MILLISECOND, sub.end // _MILLISECOND
+
+
+def find_course_files(directory, audio_ext='.mp3'):
+    """返回目录中同名的音频+字幕对 [(名称, 音频路径, 字幕路径), ...]，按名称排序"""
+    pairs = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() != audio_ext:
+            continue
+        srt_path = os.path.join(directory, stem + '.srt')
+        if os.path.exists(srt_path):
+            pairs.append((stem, os.path.join(directory, name), srt_path))
+    return pairs
+
+
+def prepare_course_files(name, audio_path, srt_path):
+    """计算文件哈希、解析字幕并计算课程统计（CPU密集部分，在进程池中执行）"""
+    cues = list(iter_srt_cues(srt_path))
+    return {
+        'name': name,
+        'audio_path': audio_path,
+        'srt_path': srt_path,
+        'audio_sha256': file_sha256(audio_path),
+        'srt_sha256': file_sha256(srt_path),
+        'bytes': os.path.getsize(audio_path) + os.path.getsize(srt_path),
+        'cues': cues,
+        'stats': analyze_cues(cues),
+    }
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+验证码测试 - 注册时校验验证码（不区分大小写、只能使用一次、输错也作废）
+"""
+
+import uuid
+
+import app as app_module
+
+
+def new_captcha(client):
+    """获取一个验证码，返回 (验证码ID, 答案)"""
+    body = client.get('/api/captcha').get_json()
+    assert body['image'].startswith('data:image/png;base64,')
+    # build_components 可能替换共享状态对象，每次从模块读取
+    return body['id'], app_module.state_backend.get(f"captcha:{body['id']}")
+
+
+def register(client, captcha_id=None, captcha_text=None):
+    data = {'username': f'reg_{uuid.uuid4().hex[:12]}', 'password': 'secret123'}
+    if captcha_id is not None:
+        data.update(captcha_id=captcha_id, captcha_text=captcha_text)
+    return client.post('/api/register', json=data)
+
+
+def test_register_requires_valid_captcha(client):
+    response = register(client)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == '验证码错误或已过期'
+
+    captcha_id, text = new_captcha(client)
+    assert register(client, captcha_id, f' {text.upper()} ').status_code == 201
+    # 同一个验证码不能再次使用
+    assert register(client, captcha_id, text).status_code == 400
+
+
+def test_wrong_captcha_is_consumed(client):
+    captcha_id, text = new_captcha(client)
+    assert register(client, captcha_id, text + 'x').status_code == 400
+    assert app_module.state_backend.get(f'captcha:{captcha_id}') is None
+    assert register(client, captcha_id, text).status_code == 400
+    assert register(client, str(uuid.uuid4()), text).status_code == 400
+
+
+def test_captcha_can_be_disabled(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'REGISTER_CAPTCHA_REQUIRED', False)
+    assert register(client).status_code == 201
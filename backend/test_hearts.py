@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+生命值接口测试 - 并发扣心的原子性、生命值缓存的失效、用户被删除后的处理
+"""
+
+import threading
+
+from app import db, User
+
+
+def test_concurrent_losses_never_go_below_zero(app, make_user):
+    user_id, headers = make_user(is_newbie=False, hearts=5)
+    statuses = []
+    lock = threading.Lock()
+    start = threading.Barrier(8)
+
+    def lose():
+        client = app.test_client()
+        start.wait()
+        response = client.post('/api/user/hearts/lose', json={'action_type': 'wrong_answer'}, headers=headers)
+        with lock:
+            statuses.append((response.status_code, response.get_json().get('hearts_lost')))
+
+    threads = [threading.Thread(target=lose) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [(200, 1)] * 5 + [(400, None)] * 3
+    with app.app_context():
+        assert db.session.get(User, user_id).hearts == 0
+
+
+def test_bonus_hearts_are_spent_first(client, make_user):
+    _, headers = make_user(is_newbie=False, hearts=3, bonus_hearts=1)
+    body = client.post('/api/user/hearts/lose', json={}, headers=headers).get_json()
+    assert (body['current_hearts'], body['bonus_hearts']) == (3, 0)
+    body = client.post('/api/user/hearts/lose', json={}, headers=headers).get_json()
+    assert (body['current_hearts'], body['bonus_hearts']) == (2, 0)
+
+
+def test_newbie_protection_does_not_cost_hearts(client, make_user):
+    _, headers = make_user(is_newbie=True, newbie_protection_count=1, hearts=5)
+    body = client.post('/api/user/hearts/lose', json={}, headers=headers).get_json()
+    assert body['hearts_lost'] == 0 and body['newbie_protection_remaining'] == 0
+    body = client.post('/api/user/hearts/lose', json={}, headers=headers).get_json()
+    assert body['hearts_lost'] == 1 and body['remaining_hearts'] == 4
+
+
+def test_hearts_cache_is_invalidated_by_updates(client, make_user):
+    _, headers = make_user(is_newbie=False, hearts=5)
+    first = client.get('/api/user/hearts', headers=headers)
+    assert first.status_code == 200
+    # 同一状态下重复请求命中缓存，ETag 相同时返回304
+    cached = client.get('/api/user/hearts', headers=dict(headers, **{'If-None-Match': first.headers['ETag']}))
+    assert cached.status_code == 304
+
+    client.post('/api/user/hearts/lose', json={}, headers=headers)
+    after = client.get('/api/user/hearts', headers=dict(headers, **{'If-None-Match': first.headers['ETag']}))
+    assert after.status_code == 200
+    assert after.headers['ETag'] != first.headers['ETag']
+
+
+def test_updates_for_deleted_user_return_404(app, client, make_user):
+    user_id, headers = make_user(is_newbie=False, hearts=5)
+    with app.app_context():
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+    for path, payload in (('/api/user/hearts/reward', {'type': 'correct_answer'}),
+                          ('/api/user/hearts/lose', {'is_practice_mode': True})):
+        response = client.post(path, json=payload, headers=headers)
+        assert response.status_code in (401, 404), path
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+媒体文件接口测试 - Range/206、416、ETag/304和If-Range，非gunicorn服务器下响应体不超过Content-Length
+"""
+
+import hashlib
+import os
+
+import pytest
+
+DATA = bytes(range(256)) * 1024
+
+
+@pytest.fixture
+def media_url(app):
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    name = hashlib.sha256(DATA).hexdigest() + '.mp3'
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], name), 'wb') as f:
+        f.write(DATA)
+    return '/uploads/' + name
+
+
+def test_range_request_returns_partial_content(client, media_url):
+    response = client.get(media_url, headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == DATA[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(DATA)}'
+    assert response.headers['Content-Length'] == '10'
+    assert 'immutable' in response.headers['Cache-Control']
+
+    response = client.get(media_url, headers={'Range': 'bytes=-5'})
+    assert response.status_code == 206
+    assert response.data == DATA[-5:]
+
+
+def test_unsatisfiable_range_returns_416(client, media_url):
+    response = client.get(media_url, headers={'Range': f'bytes={len(DATA)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+
+def test_conditional_requests(client, media_url):
+    full = client.get(media_url)
+    assert full.status_code == 200
+    assert full.data == DATA
+    etag = full.headers['ETag']
+    assert client.get(media_url, headers={'If-None-Match': etag}).status_code == 304
+
+    # If-Range与当前ETag一致时按Range返回，不一致时返回整个文件
+    response = client.get(media_url, headers={'Range': 'bytes=0-3', 'If-Range': etag})
+    assert (response.status_code, response.data) == (206, DATA[:4])
+    response = client.get(media_url, headers={'Range': 'bytes=0-3', 'If-Range': '"stale"'})
+    assert (response.status_code, len(response.data)) == (200, len(DATA))
+
+
+def test_range_without_gunicorn_stops_at_content_length(client, media_url):
+    wrapped = []
+
+    def file_wrapper(f, block_size):
+        wrapped.append(f.tell())
+        return iter(lambda: f.read(block_size), b'')
+
+    # 其它服务器的 file_wrapper 不会按Content-Length截断，因此不能用于Range响应
+    response = client.get(media_url, headers={'Range': 'bytes=100-199'},
+                          environ_overrides={'wsgi.file_wrapper': file_wrapper, 'SERVER_SOFTWARE': 'waitress'})
+    assert response.status_code == 206
+    assert response.data == DATA[100:200]
+    # werkzeug本身用 file_wrapper 打开整个文件，206时外面包一层范围迭代器
+    assert wrapped == [0]
+
+    response = client.get(media_url, headers={'Range': 'bytes=100-199'},
+                          environ_overrides={'wsgi.file_wrapper': file_wrapper, 'SERVER_SOFTWARE': 'gunicorn/23.0.0'})
+    assert response.status_code == 206
+    assert response.headers['Content-Length'] == '100'
+    # gunicorn下改为从起始位置开始的 file_wrapper，由gunicorn按Content-Length截断
+    assert wrapped[1:] == [0, 100]
+    assert response.data.startswith(DATA[100:200])
+
+
+def test_missing_and_hidden_files_return_404(client, app):
+    partial_dir = os.path.join(app.config['UPLOAD_FOLDER'], '.partial')
+    os.makedirs(partial_dir, exist_ok=True)
+    with open(os.path.join(partial_dir, 'tmp.mp3'), 'wb') as f:
+        f.write(b'partial')
+    assert client.get('/uploads/.partial/tmp.mp3').status_code == 404
+    assert client.get('/uploads/does-not-exist.mp3').status_code == 404
+    assert client.get('/uploads/../conftest.py').status_code == 404
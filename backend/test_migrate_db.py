@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+数据库迁移测试 - 在临时目录中构造旧版表结构（句子时间为可空的秒数字符串），
+验证 migrate_database 把时间转换为整数毫秒，时间为空的旧数据也能迁移
+
+运行: cd backend && python -m pytest test_migrate_db.py（或 python test_migrate_db.py）
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from migrate_db import migrate_database
+
+LEGACY_SCHEMA = """
+    CREATE TABLE user (
+        id INTEGER NOT NULL PRIMARY KEY,
+        username VARCHAR(80) NOT NULL,
+        password_hash VARCHAR(128),
+        hearts INTEGER
+    );
+    CREATE TABLE course (
+        id INTEGER NOT NULL PRIMARY KEY,
+        title VARCHAR(100) NOT NULL
+    );
+    CREATE TABLE sentence (
+        id INTEGER NOT NULL PRIMARY KEY,
+        course_id INTEGER NOT NULL REFERENCES course (id),
+        text TEXT NOT NULL,
+        start_time VARCHAR(20),
+        end_time VARCHAR(20),
+        audio_segment_path VARCHAR(200)
+    );
+    CREATE INDEX ix_sentence_course_id ON sentence (course_id);
+"""
+
+
+def test_migrate_legacy_sentence_times():
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'app.db')
+        conn = sqlite3.connect(db_path)
+        conn.executescript(LEGACY_SCHEMA)
+        conn.execute("INSERT INTO user (id, username, hearts) VALUES (1, 'legacy', 5)")
+        conn.execute("INSERT INTO course (id, title) VALUES (1, 'Legacy course')")
+        conn.executemany("INSERT INTO sentence (id, course_id, text, start_time, end_time) VALUES (?, 1, ?, ?, ?)", [
+            (1, 'Hello there.', '1.5', '3.25'),
+            (2, 'No times at all.', None, None),
+            (3, 'Missing end time.', '4.0', None),
+        ])
+        conn.commit()
+        conn.close()
+
+        migrate_database(db_path)
+
+        conn = sqlite3.connect(db_path)
+        try:
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(sentence)")]
+            assert 'start_ms' in columns and 'start_time' not in columns
+            rows = conn.execute("SELECT id, start_ms, end_ms, normalized_text FROM sentence ORDER BY id").fetchall()
+            assert rows == [(1, 1500, 3250, 'hello there'), (2, 0, 0, 'no times at all'),
+                            (3, 4000, 4000, 'missing end time')]
+            assert conn.execute("SELECT is_newbie FROM user WHERE id = 1").fetchone() == (1,)
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    test_migrate_legacy_sentence_times()
+    print('ok')
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+密码哈希线程池的过载保护测试 - 使用 gunicorn.conf.py 的默认线程数，
+验证哈希请求占满名额后立即返回 HashingBusy，而不是把所有请求线程都堵在哈希上
+
+运行: cd backend && python -m pytest test_password_hashing.py（或 python test_password_hashing.py）
+"""
+
+import os
+import runpy
+import threading
+import time
+from unittest import mock
+
+from password_hashing import HashingBusy, PasswordHasher, hash_limits
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+
+def gunicorn_default_threads():
+    """不带任何环境变量时 gunicorn.conf.py 中的 threads（配置文件会修改 os.environ，执行后恢复）"""
+    environ = {k: v for k, v in os.environ.items() if k != 'GUNICORN_THREADS'}
+    with mock.patch.dict(os.environ, environ, clear=True):
+        return runpy.run_path(os.path.join(basedir, 'gunicorn.conf.py'))['threads']
+
+
+def test_hash_limits_leave_a_request_thread_free():
+    for threads in (1, 2, 4, 16):
+        for workers, queue in ((None, None), (8, None), (2, 64)):
+            hash_workers, max_queue = hash_limits(threads, workers, queue)
+            assert hash_workers >= 1 and max_queue >= 0
+            assert hash_workers + max_queue <= max(1, threads - 1)
+
+
+def test_default_config_sheds_load():
+    threads = gunicorn_default_threads()
+    hasher = PasswordHasher('pbkdf2:sha256:1000', *hash_limits(threads))
+    release = threading.Event()
+
+    # 用满名额：workers 个在计算，max_queue 个在排队
+    holders = [threading.Thread(target=hasher._run, args=(release.wait, 10))
+               for _ in range(hasher.workers + hasher.max_queue)]
+    for holder in holders:
+        holder.start()
+    try:
+        deadline = time.time() + 5
+        while hasher.stats()['pending'] < len(holders) and time.time() < deadline:
+            time.sleep(0.01)
+        assert hasher.stats()['pending'] == len(holders)
+        # 至少还剩一个请求线程，此时再来的登录立即被拒绝
+        assert len(holders) < threads
+        started_at = time.perf_counter()
+        try:
+            hasher.hash('password')
+        except HashingBusy as e:
+            assert e.retry_after >= 1
+        else:
+            raise AssertionError('hash() should be rejected when the pool is full')
+        assert time.perf_counter() - started_at < 0.5
+        assert hasher.stats()['rejected'] == 1
+    finally:
+        release.set()
+        for holder in holders:
+            holder.join(5)
+
+
+if __name__ == '__main__':
+    test_hash_limits_leave_a_request_thread_free()
+    test_default_config_sheds_load()
+    print('ok')
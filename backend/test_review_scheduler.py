@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+复习调度测试 - SM-2 间隔序列、答错重新学习、每日复习量均衡，以及听写检查接口写入的复习计划
+"""
+
+import datetime
+
+from app import db, ReviewItem
+from review_scheduler import (DEFAULT_EASE, MIN_EASE, RELEARN_MINUTES, answer_quality, balance_due_dates,
+                              sm2_update)
+
+NOW = datetime.datetime(2026, 3, 1, 12, 0)
+
+
+def test_sm2_interval_sequence():
+    ease, interval, repetitions = DEFAULT_EASE, 0.0, 0
+    intervals = []
+    for _ in range(4):
+        ease, interval, repetitions, due_at = sm2_update(ease, interval, repetitions, 4, NOW)
+        intervals.append(interval)
+        assert due_at == NOW + datetime.timedelta(days=interval)
+    # 质量4不改变难度系数：1天、6天，之后每次乘以 ease
+    assert ease == DEFAULT_EASE
+    assert intervals == [1.0, 6.0, 15.0, 37.5]
+    assert repetitions == 4
+
+    # 答错后重新学习：间隔和次数清零，RELEARN_MINUTES 分钟后再出现，难度系数下降
+    ease, interval, repetitions, due_at = sm2_update(ease, interval, repetitions, 2, NOW)
+    assert (interval, repetitions) == (0.0, 0)
+    assert due_at == NOW + datetime.timedelta(minutes=RELEARN_MINUTES)
+    assert round(ease, 2) == 2.18
+
+    for _ in range(10):
+        ease = sm2_update(ease, 0.0, 0, 0, NOW)[0]
+    assert ease == MIN_EASE
+
+
+def test_answer_quality():
+    assert answer_quality({'exact': True, 'correct': True, 'score': 100}) == 5
+    assert answer_quality({'exact': False, 'correct': True, 'score': 100}) == 4
+    assert answer_quality({'exact': False, 'correct': False, 'score': 85}) == 3
+    assert answer_quality({'exact': False, 'correct': False, 'score': 60}) == 2
+    assert answer_quality({'exact': False, 'correct': False, 'score': 10}) == 1
+    assert answer_quality({'exact': False, 'correct': False, 'score': 0}) == 0
+
+
+def test_balance_due_dates_moves_longest_intervals():
+    today = NOW.replace(hour=0)
+    items = [
+        (1, today - datetime.timedelta(days=2), 0.0),  # 已过期，算作今天
+        (2, today + datetime.timedelta(hours=9), 6.0),
+        (3, today + datetime.timedelta(hours=15), 30.0),
+        (4, today + datetime.timedelta(days=1, hours=8), 1.0),
+    ]
+    moved = dict(balance_due_dates(items, NOW, daily_limit=2, horizon_days=7))
+    # 今天超出一项：间隔最长的3号顺延一天、时刻不变；明天变成2项，不再顺延
+    assert moved == {3: today + datetime.timedelta(days=1, hours=15)}
+
+    # 同一天内再次运行不再修改
+    balanced = [(item_id, moved.get(item_id, due_at), interval) for item_id, due_at, interval in items]
+    assert balance_due_dates(balanced, NOW, daily_limit=2, horizon_days=7) == []
+
+
+def test_wrong_answer_schedules_review(app, client, make_user, make_course):
+    _, headers = make_user()
+    course_id, sentence_ids = make_course([('The weather is lovely today.', 0, 2000),
+                                           ('I would like a cup of coffee.', 2000, 4000)])
+
+    before = datetime.datetime.utcnow()
+    body = client.post(f'/api/sentences/{sentence_ids[0]}/check', json={'answer': 'nothing matches here'},
+                       headers=headers).get_json()
+    assert not body['correct']
+    due_at = datetime.datetime.fromisoformat(body['review_due_at'])
+    relearn = datetime.timedelta(minutes=RELEARN_MINUTES)
+    assert before + relearn <= due_at <= datetime.datetime.utcnow() + relearn
+
+    # 第一次就完全正确的句子不进入复习
+    body = client.post(f'/api/sentences/{sentence_ids[1]}/check', json={'answer': 'I would like a cup of coffee.'},
+                       headers=headers).get_json()
+    assert body['exact'] and body['review_due_at'] is None
+
+    # 未到期时返回下一次到期时间
+    body = client.get('/api/review/next', headers=headers).get_json()
+    assert body['sentences'] == [] and body['due_count'] == 0
+    assert datetime.datetime.fromisoformat(body['next_due_at']) == due_at
+
+    with app.app_context():
+        item = ReviewItem.query.filter_by(sentence_id=sentence_ids[0]).one()
+        assert (item.course_id, item.lapses, item.repetitions) == (course_id, 1, 0)
+        item.due_at = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+        db.session.commit()
+
+    body = client.get('/api/review/next', headers=headers).get_json()
+    assert [s['sentence_id'] for s in body['sentences']] == [sentence_ids[0]]
+    assert body['due_count'] == 1 and body['next_due_at'] is None
+
+    # 复习时答对后按 SM-2 安排到一天后
+    body = client.post(f'/api/sentences/{sentence_ids[0]}/check', json={'answer': 'The weather is lovely today.'},
+                       headers=headers).get_json()
+    assert datetime.datetime.fromisoformat(body['review_due_at']) - datetime.datetime.utcnow() > \
+        datetime.timedelta(hours=23)
+
+
+def test_anonymous_checks_are_not_recorded(client, make_course):
+    _, sentence_ids = make_course([('Anonymous answer.', 0, 1000)])
+    body = client.post(f'/api/sentences/{sentence_ids[0]}/check', json={'answer': 'wrong'}).get_json()
+    assert 'review_due_at' not in body
+    assert client.get('/api/review/next').status_code == 401
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+搜索接口测试 - 游标分页不重复不遗漏、排序窗口截断标记、按课程过滤和汇总
+"""
+
+import uuid
+
+import app as app_module
+
+
+def unique_word():
+    # 测试共用一个数据库，每个测试搜索只在自己的课程中出现的词
+    return 'w' + uuid.uuid4().hex[:10]
+
+
+def search_all(client, query, limit):
+    """按 X-Next-Cursor 翻完所有页，返回 (句子ID列表, 页数, 最后一页的响应)"""
+    ids, pages, cursor = [], 0, None
+    while True:
+        url = f'/api/search?q={query}&limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url)
+        assert response.status_code == 200
+        ids += [hit['sentence_id'] for hit in response.get_json()]
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            return ids, pages, response
+
+
+def test_cursor_paging_covers_every_hit_once(client, make_course):
+    word = unique_word()
+    _, first_ids = make_course([(f'{word} line {i}.', i * 1000, i * 1000 + 800) for i in range(7)])
+    _, second_ids = make_course([(f'Another {word} {word} sentence {i}.', i * 1000, i * 1000 + 800)
+                                 for i in range(6)])
+    ids, pages, last = search_all(client, word, 5)
+    assert sorted(ids) == sorted(first_ids + second_ids)
+    assert pages == 3
+    assert 'X-Search-Truncated' not in last.headers
+
+    hit = client.get(f'/api/search?q={word}&limit=1').get_json()[0]
+    assert '<mark>' in hit['snippet']
+
+
+def test_rank_window_truncation_is_flagged(client, make_course, monkeypatch):
+    word = unique_word()
+    _, sentence_ids = make_course([(f'{word} number {i}.', i * 1000, i * 1000 + 800) for i in range(10)])
+    monkeypatch.setattr(app_module, 'SEARCH_RANK_WINDOW', 4)
+
+    # 截断时所有分页都在最新的4条命中中排序，翻页结果不重复且每页都带截断标记
+    first = client.get(f'/api/search?q={word}&limit=3')
+    assert first.headers['X-Search-Truncated'] == '1'
+    ids, pages, last = search_all(client, word, 3)
+    assert sorted(ids) == sorted(sentence_ids)[-4:]
+    assert pages == 2
+    assert last.headers['X-Search-Truncated'] == '1'
+
+
+def test_course_filter_and_grouping(client, make_course):
+    word = unique_word()
+    first_course, first_ids = make_course([(f'{word} alpha {i}.', i * 1000, i * 1000 + 800) for i in range(3)])
+    second_course, _ = make_course([(f'{word} beta.', 0, 800)])
+
+    hits = client.get(f'/api/search?q={word}&course_id={first_course}&limit=10').get_json()
+    assert sorted(hit['sentence_id'] for hit in hits) == sorted(first_ids)
+    assert {hit['course_id'] for hit in hits} == {first_course}
+
+    groups = client.get(f'/api/search?q={word}&group=course').get_json()
+    assert [(g['course_id'], g['matches']) for g in groups] == [(first_course, 3), (second_course, 1)]
+
+
+def test_invalid_search_parameters(client):
+    assert client.get('/api/search').status_code == 400
+    assert client.get('/api/search?q=hello&limit=0').status_code == 400
+    assert client.get('/api/search?q=hello&cursor=abc').status_code == 400
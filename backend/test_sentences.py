@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+句子接口测试 - SRT回退与Sentence表结果一致、句子缓存的ETag/304和失效
+"""
+
+import os
+import tempfile
+
+from app import db, Sentence, load_sentences_from_db, load_sentences_from_srt
+
+SRT = """1
+00:00:01,500 --> 00:00:03,250
+Hello there.
+
+2
+00:00:04,000 --> 00:00:05,000
+How are you?
+"""
+
+
+def test_srt_fallback_matches_database_shape(app, make_course):
+    with tempfile.NamedTemporaryFile('w', suffix='.srt', delete=False, encoding='utf-8') as f:
+        f.write(SRT)
+    try:
+        course_id, sentence_ids = make_course([('Hello there.', 1500, 3250), ('How are you?', 4000, 5000)])
+        with app.app_context():
+            from_db = load_sentences_from_db(course_id)
+        from_srt = load_sentences_from_srt(f.name)
+    finally:
+        os.remove(f.name)
+
+    assert [s['sentence_id'] for s in from_db] == sentence_ids
+    assert [s['sentence_id'] for s in from_srt] == [None, None]
+    assert [dict(s, sentence_id=None) for s in from_db] == from_srt
+    assert from_srt[0] == {'id': 1, 'sentence_id': None, 'text': 'Hello there.', 'start_time': 1.5, 'end_time': 3.25}
+
+
+def test_sentence_cache_etag_and_invalidation(app, client, make_user, make_course):
+    course_id, sentence_ids = make_course([('First line.', 0, 1000), ('Second line.', 1000, 2000)])
+    url = f'/api/courses/{course_id}/sentences'
+    first = client.get(url)
+    assert first.status_code == 200
+    assert [s['text'] for s in first.get_json()] == ['First line.', 'Second line.']
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    # 直接改库不经过失效时仍然返回缓存内容；通过接口修改课程后缓存失效
+    with app.app_context():
+        db.session.get(Sentence, sentence_ids[0]).text = 'Changed line.'
+        db.session.commit()
+    assert client.get(url).get_json()[0]['text'] == 'First line.'
+
+    _, admin_headers = make_user(is_admin=True)
+    assert client.put(f'/api/courses/{course_id}', data={'title': 'Renamed'}, headers=admin_headers).status_code == 200
+    refreshed = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert refreshed.status_code == 200
+    assert refreshed.get_json()[0]['text'] == 'Changed line.'
+
+
+def test_sentence_window_keeps_positions(client, make_course):
+    course_id, sentence_ids = make_course([(f'Line {i}.', i * 1000, i * 1000 + 800) for i in range(10)])
+    window = client.get(f'/api/courses/{course_id}/sentences?from=3.5&to=6').get_json()
+    # 3.5秒时第4句（3~3.8秒）正在播放，也包含在结果中；序号与完整列表一致
+    assert [(s['id'], s['sentence_id']) for s in window] == [(4, sentence_ids[3]), (5, sentence_ids[4]),
+                                                             (6, sentence_ids[5])]
+    window = client.get(f'/api/courses/{course_id}/sentences?from=3.9&to=5').get_json()
+    assert [s['id'] for s in window] == [5]
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+分块上传接口测试 - 断点续传、offset校验、finalize的完整性检查、用upload_id创建课程
+"""
+
+import hashlib
+import os
+
+from app import db, Course, Sentence
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+
+
+def read_sample(name, size=None):
+    with open(os.path.join(SAMPLE_DIR, name), 'rb') as f:
+        return f.read(size) if size else f.read()
+
+
+def start_upload(client, headers, kind, filename, data):
+    response = client.post('/api/uploads', json={'kind': kind, 'filename': filename, 'size': len(data)},
+                           headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+
+def put_chunk(client, headers, upload_id, offset, chunk):
+    return client.put(f'/api/uploads/{upload_id}', data=chunk,
+                      headers=dict(headers, **{'Upload-Offset': str(offset)}))
+
+
+def test_upload_resume_and_finalize(client, make_user):
+    _, headers = make_user(is_vip=True)
+    data = read_sample('englishpod_B0001pb.mp3', 300 * 1024)
+    upload_id = start_upload(client, headers, 'audio', 'lesson.mp3', data)
+
+    assert put_chunk(client, headers, upload_id, 0, data[:100000]).get_json()['offset'] == 100000
+    # 断线后先查询已接收的字节数，再从该位置继续
+    assert client.get(f'/api/uploads/{upload_id}', headers=headers).get_json()['offset'] == 100000
+
+    # offset不一致时返回409和服务端的offset，不写入任何内容
+    response = put_chunk(client, headers, upload_id, 50000, data[50000:150000])
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 100000
+
+    # 未传完时不能finalize
+    response = client.post(f'/api/uploads/{upload_id}/finalize', json={}, headers=headers)
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 100000
+
+    assert put_chunk(client, headers, upload_id, 100000, data[100000:]).get_json()['offset'] == len(data)
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    response = client.post(f'/api/uploads/{upload_id}/finalize', json={'sha256': '0' * 64}, headers=headers)
+    assert response.status_code == 422
+    assert response.get_json()['sha256'] == sha256
+
+    response = client.post(f'/api/uploads/{upload_id}/finalize', json={'sha256': sha256.upper()}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'complete'
+
+    # 已finalize的上传不能再追加
+    assert put_chunk(client, headers, upload_id, len(data), b'x').status_code == 409
+
+
+def test_upload_rejects_invalid_audio_and_other_users(client, make_user):
+    _, headers = make_user(is_vip=True)
+    upload_id = start_upload(client, headers, 'audio', 'fake.mp3', b'not an mp3 file' * 100)
+    assert put_chunk(client, headers, upload_id, 0, b'not an mp3 file' * 100).status_code == 415
+
+    _, other_headers = make_user(is_vip=True)
+    assert client.get(f'/api/uploads/{upload_id}', headers=other_headers).status_code == 404
+
+    _, free_headers = make_user()
+    response = client.post('/api/uploads', json={'kind': 'audio', 'filename': 'a.mp3', 'size': 10},
+                           headers=free_headers)
+    assert response.status_code == 403
+
+
+def test_create_course_from_uploads(app, client, make_user):
+    _, headers = make_user(is_vip=True)
+    audio = read_sample('englishpod_B0001pb.mp3', 200 * 1024)
+    subtitle = read_sample('englishpod_B0001pb.srt')
+    upload_ids = {}
+    for kind, filename, data in (('audio', 'lesson.mp3', audio), ('subtitle', 'lesson.srt', subtitle)):
+        upload_id = start_upload(client, headers, kind, filename, data)
+        assert put_chunk(client, headers, upload_id, 0, data).status_code == 200
+        assert client.post(f'/api/uploads/{upload_id}/finalize', json={}, headers=headers).status_code == 200
+        upload_ids[kind] = upload_id
+
+    response = client.post('/api/courses', json={'title': 'Uploaded course', 'audio_upload_id': upload_ids['audio'],
+                                                  'subtitle_upload_id': upload_ids['subtitle']}, headers=headers)
+    assert response.status_code == 201
+    course_id = response.get_json()['course_id']
+
+    with app.app_context():
+        course = db.session.get(Course, course_id)
+        assert os.path.basename(course.original_audio_path) == hashlib.sha256(audio).hexdigest() + '.mp3'
+        with open(course.original_audio_path, 'rb') as f:
+            assert f.read() == audio
+        assert Sentence.query.filter_by(course_id=course_id).count() > 0
+
+    # 上传会话在创建课程后被删除
+    assert client.get(f'/api/uploads/{upload_ids["audio"]}', headers=headers).status_code == 404
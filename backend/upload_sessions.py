@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+分块断点续传上传 - init / 追加分块 / finalize
+
+每个上传会话在 <root>/<upload_id>/ 下保存 data（已接收的数据）和 meta.json。
+分块直接从请求流写入磁盘，不在内存中缓存整个文件；已接收的字节数以 data 文件大小为准，
+客户端中断后用 GET 查询 offset 即可从断点继续。SHA-256 随分块增量计算，
+分块落到其它worker或进程重启后，finalize 时从磁盘重新计算。
+"""
+
+import codecs
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import srt
+
+# 从请求流读取时每次读取的字节数
+STREAM_BLOCK_SIZE = 64 * 1024
+# 用于校验文件格式的开头字节数
+HEAD_BYTES = 512
+
+UPLOAD_KINDS = ('audio', 'subtitle')
+
+# 常见音频格式的文件头
+_AUDIO_SIGNATURES = (
+    (0, b'ID3'),    # 带ID3标签的MP3
+    (0, b'RIFF'),   # WAV
+    (0, b'OggS'),   # OGG/Opus
+    (0, b'fLaC'),   # FLAC
+    (4, b'ftyp'),   # M4A/MP4
+)
+
+
+class UploadError(Exception):
+    """上传请求不合法，status 为对应的HTTP状态码"""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+def validate_audio_head(head):
+    """检查音频文件开头，不是支持的格式时抛出 UploadError"""
+    for offset, signature in _AUDIO_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return
+    # 没有ID3标签的MP3直接以帧同步字开头
+    if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0:
+        return
+    raise UploadError('Unsupported audio format', 415)
+
+
+def validate_subtitle_head(head):
+    """检查字幕文件开头：UTF-8编码，第一行是字幕序号"""
+    try:
+        text = codecs.getincrementaldecoder('utf-8-sig')().decode(head, final=False)
+    except UnicodeDecodeError:
+        raise UploadError('Subtitle file must be UTF-8 encoded', 415)
+    lines = text.lstrip().splitlines()
+    # 第一块太短、还没读到完整的第一行时不做判断
+    if len(lines) > 1 and not lines[0].strip().isdigit():
+        raise UploadError('Subtitle file is not in SRT format', 415)
+
+
+def validate_subtitle_file(path):
+    """完整解析SRT，返回字幕条数"""
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            count = sum(1 for _ in srt.parse(f.read()))
+    except (UnicodeDecodeError, srt.SRTParseError) as e:
+        raise UploadError(f'Invalid subtitle file: {e}', 415)
+    if count == 0:
+        raise UploadError('Subtitle file has no cues', 415)
+    return count
+
+
+def _read_at_least(stream, size):
+    """请求流的一次read可能返回较少的字节，读到size字节或流结束为止"""
+    data = b''
+    while len(data) < size:
+        block = stream.read(size - len(data))
+        if not block:
+            break
+        data += block
+    return data
+
+
+class UploadStore:
+    def __init__(self, root, max_bytes, ttl):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # 本进程内的增量哈希 {upload_id: (已哈希字节数, hasher)}
+        self._hashers = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, upload_id):
+        # upload_id 由服务端生成，只允许十六进制字符，防止路径穿越
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            raise UploadError('Upload not found', 404)
+        return os.path.join(self.root, upload_id)
+
+    def data_path(self, upload_id):
+        return os.path.join(self._dir(upload_id), 'data')
+
+    def _write_meta(self, upload_id, meta):
+        path = os.path.join(self._dir(upload_id), 'meta.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def create(self, user_id, kind, filename, size):
+        if kind not in UPLOAD_KINDS:
+            raise UploadError(f'kind must be one of {", ".join(UPLOAD_KINDS)}')
+        if not filename:
+            raise UploadError('filename is required')
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('size must be a positive integer')
+        if size > self.max_bytes:
+            raise UploadError(f'File is larger than {self.max_bytes} bytes', 413)
+
+        self.purge_expired()
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._dir(upload_id))
+        open(self.data_path(upload_id), 'wb').close()
+        meta = {
+            'upload_id': upload_id,
+            'user_id': user_id,
+            'kind': kind,
+            'filename': filename,
+            'size': size,
+            'status': 'uploading',
+            'sha256': None,
+            'created_at': time.time(),
+        }
+        self._write_meta(upload_id, meta)
+        return dict(meta, offset=0)
+
+    def get(self, upload_id):
+        try:
+            with open(os.path.join(self._dir(upload_id), 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError('Upload not found', 404)
+        meta['offset'] = os.path.getsize(self.data_path(upload_id))
+        return meta
+
+    def append(self, upload_id, offset, stream):
+        """把请求流写到 offset 处，返回新的 offset
+
+        调用方负责保证同一上传同一时间只有一个追加请求（见 app.py 中的上传锁）。
+        """
+        meta = self.get(upload_id)
+        if meta['status'] != 'uploading':
+            raise UploadError('Upload is already finalized', 409, offset=meta['offset'])
+        if offset != meta['offset']:
+            raise UploadError('Offset mismatch', 409, offset=meta['offset'])
+
+        if offset == 0:
+            hasher = hashlib.sha256()
+            # 第一块开头就校验文件格式，不合法的文件不必传完
+            head = _read_at_least(stream, HEAD_BYTES)
+            self._validate_head(meta['kind'], head)
+            blocks = itertools.chain([head], iter(lambda: stream.read(STREAM_BLOCK_SIZE), b''))
+        else:
+            with self._lock:
+                hashed, hasher = self._hashers.pop(upload_id, (0, None))
+            if hashed != offset:
+                hasher = None  # 之前的分块不是本进程接收的，finalize时再从磁盘计算
+            blocks = iter(lambda: stream.read(STREAM_BLOCK_SIZE), b'')
+
+        written = offset
+        with open(self.data_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            for block in blocks:
+                if written + len(block) > meta['size']:
+                    # 丢弃本次写入的内容，客户端可以从原 offset 重试
+                    f.truncate(offset)
+                    raise UploadError('Chunk exceeds the declared file size', 400, offset=offset)
+                f.write(block)
+                if hasher is not None:
+                    hasher.update(block)
+                written += len(block)
+
+        if hasher is not None:
+            with self._lock:
+                self._hashers[upload_id] = (written, hasher)
+        return written
+
+    def _validate_head(self, kind, head):
+        if kind == 'audio':
+            validate_audio_head(head)
+        else:
+            validate_subtitle_head(head)
+
+    def finalize(self, upload_id, expected_sha256=None):
+        """检查数据完整性，计算SHA-256并把会话标记为 complete"""
+        meta = self.get(upload_id)
+        if meta['status'] == 'complete':
+            return meta
+        if meta['offset'] != meta['size']:
+            raise UploadError('Upload is incomplete', 409, offset=meta['offset'])
+
+        with self._lock:
+            hashed, hasher = self._hashers.pop(upload_id, (0, None))
+        if hasher is None or hashed != meta['size']:
+            hasher = hashlib.sha256()
+            with open(self.data_path(upload_id), 'rb') as f:
+                for block in iter(lambda: f.read(STREAM_BLOCK_SIZE), b''):
+                    hasher.update(block)
+        sha256 = hasher.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise UploadError('Checksum mismatch', 422, sha256=sha256)
+
+        if meta['kind'] == 'subtitle':
+            meta['cue_count'] = validate_subtitle_file(self.data_path(upload_id))
+
+        meta['status'] = 'complete'
+        meta['sha256'] = sha256
+        self._write_meta(upload_id, {k: v for k, v in meta.items() if k != 'offset'})
+        return meta
+
+    def discard(self, upload_id):
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+    def purge_expired(self, now=None):
+        """删除超过 ttl 未完成使用的上传会话，返回删除的个数"""
+        now = now or time.time()
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for upload_id in os.listdir(self.root):
+            if not all(c in '0123456789abcdef' for c in upload_id):
+                continue
+            meta_path = os.path.join(self.root, upload_id, 'meta.json')
+            try:
+                expired = now - os.path.getmtime(meta_path) > self.ttl and \
+                    now - os.path.getmtime(os.path.join(self.root, upload_id, 'data')) > self.ttl
+            except OSError:
+                expired = True
+            if expired:
+                self.discard(upload_id)
+                removed += 1
+        return removed
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+WSGI入口 - 生产环境使用: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import create_app
+
+app = create_app()
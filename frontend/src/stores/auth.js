@@ -51,14 +51,14 @@ export const useAuthStore = defineStore('auth', {
         return false;
       }
     },
-    async register(username, password) {
+    async register(username, password, captchaId, captchaText) {
       try {
         const response = await fetch(buildApiUrl('/register'), {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
           },
-          body: JSON.stringify({ username, password }),
+          body: JSON.stringify({ username, password, captcha_id: captchaId, captcha_text: captchaText }),
         });
   
         const data = await response.json();